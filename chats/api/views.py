@@ -112,3 +112,33 @@ def api_chat_send(request, chat_id):
     chat.atualizado_em = timezone.now()
     chat.save(update_fields=["atualizado_em"])
     return Response({"ok": True, "data": _mensagem_to_dict(msg, request.user.id)}, status=201)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def api_chat_search(request):
+    """Busca nas mensagens dos chats do usuário (índice full-text, chats/busca.py), com trecho e paginação."""
+    from chats.busca import buscar_mensagens
+
+    q = (request.GET.get("q") or "").strip()
+    if not q:
+        return Response({"ok": False, "detail": "Informe o termo de busca (q)."}, status=400)
+    chat_id = request.GET.get("chat")
+    try:
+        chat_id = int(chat_id) if chat_id else None
+        page = max(1, int(request.GET.get("page", 1)))
+        per_page = min(50, max(1, int(request.GET.get("per_page", 20))))
+    except (TypeError, ValueError):
+        return Response({"ok": False, "detail": "Parâmetros inválidos."}, status=400)
+
+    encontradas, has_more = buscar_mensagens(request.user, q, (page - 1) * per_page, per_page, chat_id=chat_id)
+    results = [
+        dict(
+            _mensagem_to_dict(msg, request.user.id),
+            chat_id=msg.chat_id,
+            item_titulo=msg.chat.item.titulo if msg.chat.item else "Item removido",
+            trecho=trecho,
+        )
+        for msg, trecho in encontradas
+    ]
+    return Response({"ok": True, "results": results, "page": page, "has_more": has_more})
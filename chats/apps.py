@@ -5,3 +5,8 @@ class ChatsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chats'
     verbose_name = 'Sistema de Chat'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from chats.busca import sincronizar_apos_migrate
+        post_migrate.connect(sincronizar_apos_migrate, sender=self)
@@ -0,0 +1,131 @@
+"""
+Busca textual nas mensagens dos chats de um usuário.
+
+Segue a busca de itens (items/busca_texto.py):
+- SQLite: tabela FTS5 `find_mensagem_fts` (rowid = id da mensagem), sem acentos,
+  mantida por gatilhos em mainpage_mensagem e recriada no post_migrate;
+- MySQL: índice FULLTEXT em `conteudo`, consultado em modo booleano;
+- outros bancos, ou SQLite sem FTS5: `icontains`.
+
+Cada palavra da consulta é um prefixo obrigatório. A busca é sempre restrita aos
+chats de que o usuário participa, mais recentes primeiro, e cada resultado traz
+um trecho da mensagem (HTML escapado) com as palavras encontradas em <mark>.
+"""
+import html
+import re
+import unicodedata
+
+from django.db import connection, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from items.busca_texto import BuscaTextoFullText, criar_gatilhos_faltando, tem_fts5
+from items.texto import normalizar
+
+TABELA_MENSAGENS = "mainpage_mensagem"
+TABELA_FTS = "find_mensagem_fts"
+GATILHOS_FTS5 = {
+    f"{TABELA_FTS}_ai": f"""AFTER INSERT ON {TABELA_MENSAGENS} BEGIN
+        INSERT INTO {TABELA_FTS}(rowid, conteudo) VALUES (new.id, new.conteudo);
+    END""",
+    f"{TABELA_FTS}_ad": f"""AFTER DELETE ON {TABELA_MENSAGENS} BEGIN
+        DELETE FROM {TABELA_FTS} WHERE rowid = old.id;
+    END""",
+    f"{TABELA_FTS}_au": f"""AFTER UPDATE OF conteudo ON {TABELA_MENSAGENS} BEGIN
+        DELETE FROM {TABELA_FTS} WHERE rowid = old.id;
+        INSERT INTO {TABELA_FTS}(rowid, conteudo) VALUES (new.id, new.conteudo);
+    END""",
+}
+TAMANHO_TRECHO = 80
+
+
+def reconstruir(conexao=None):
+    """Refaz o índice FTS5 das mensagens. Retorna quantas foram indexadas."""
+    with (conexao or connection).cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABELA_FTS}")
+        cursor.execute(f"INSERT INTO {TABELA_FTS}(rowid, conteudo) SELECT id, conteudo FROM {TABELA_MENSAGENS}")
+        cursor.execute(f"SELECT count(*) FROM {TABELA_FTS}")
+        return cursor.fetchone()[0]
+
+
+def garantir_gatilhos(conexao=None):
+    """Cria os gatilhos FTS5 que faltarem (e reindexa nesse caso). Retorna True se criou algum."""
+    conexao = conexao or connection
+    if not tem_fts5(conexao, TABELA_FTS):
+        return False
+    if criar_gatilhos_faltando(conexao, TABELA_MENSAGENS, GATILHOS_FTS5):
+        reconstruir(conexao)
+        return True
+    return False
+
+
+def sincronizar_apos_migrate(sender=None, using="default", **kwargs):
+    garantir_gatilhos(connections[using])
+
+
+def filtro_mensagens(q):
+    """Q das mensagens que contêm todas as palavras de `q` (como prefixos)."""
+    palavras = normalizar(q).split()
+    if not palavras:
+        return Q(pk__in=[])
+    if tem_fts5(tabela=TABELA_FTS):
+        expressao = " ".join(f'"{palavra}"*' for palavra in palavras)
+        return Q(pk__in=RawSQL(f"SELECT rowid FROM {TABELA_FTS} WHERE {TABELA_FTS} MATCH %s", [expressao]))
+    filtro = Q()
+    if connection.vendor == "mysql":
+        longas = [p for p in palavras if len(p) >= BuscaTextoFullText.MINIMO]
+        if longas:
+            expressao = " ".join(f"+{palavra}*" for palavra in longas)
+            filtro &= Q(pk__in=RawSQL(
+                f"SELECT id FROM {TABELA_MENSAGENS} WHERE MATCH(conteudo) AGAINST (%s IN BOOLEAN MODE)", [expressao]
+            ))
+        palavras = [p for p in palavras if len(p) < BuscaTextoFullText.MINIMO]
+    for palavra in palavras:
+        filtro &= Q(conteudo__icontains=palavra)
+    return filtro
+
+
+def _dobrar(texto):
+    """Minúsculas sem acento, caractere a caractere (mesmo tamanho do original)."""
+    return "".join(
+        (unicodedata.normalize("NFKD", c).encode("ascii", "ignore").decode("ascii").lower() or c)[:1] for c in texto
+    )
+
+
+def trecho(conteudo, q, tamanho=TAMANHO_TRECHO):
+    """Trecho de até `tamanho` caracteres em volta da primeira palavra encontrada, com <mark>."""
+    palavras = normalizar(q).split()
+    dobrado = _dobrar(conteudo)
+    marcas = []
+    for palavra in palavras:
+        marcas += [m.span() for m in re.finditer(rf"(?<![a-z0-9]){re.escape(palavra)}[a-z0-9]*", dobrado)]
+    marcas.sort()
+
+    inicio = max(0, marcas[0][0] - tamanho // 3) if marcas else 0
+    fim = min(len(conteudo), inicio + tamanho)
+    partes, pos = [], inicio
+    for a, b in marcas:
+        if a < pos or b > fim:
+            continue
+        partes += [html.escape(conteudo[pos:a]), f"<mark>{html.escape(conteudo[a:b])}</mark>"]
+        pos = b
+    partes.append(html.escape(conteudo[pos:fim]))
+    return ("…" if inicio > 0 else "") + "".join(partes) + ("…" if fim < len(conteudo) else "")
+
+
+def buscar_mensagens(usuario, q, inicio=0, quantidade=20, chat_id=None):
+    """
+    Mensagens dos chats de `usuario` (opcionalmente só de `chat_id`) que casam com `q`,
+    mais recentes primeiro. Retorna ([(Mensagem, trecho)], tem_mais).
+    """
+    from chats.models import Mensagem
+
+    mensagens = Mensagem.objects.filter(
+        Q(chat__criado_por=usuario) | Q(chat__dono_item=usuario), filtro_mensagens(q),
+    )
+    if chat_id is not None:
+        mensagens = mensagens.filter(chat_id=chat_id)
+    pagina = list(
+        mensagens.select_related("remetente", "chat__item").order_by("-id")[inicio:inicio + quantidade + 1]
+    )
+    return [(msg, trecho(msg.conteudo, q)) for msg in pagina[:quantidade]], len(pagina) > quantidade
@@ -0,0 +1,45 @@
+# Generated by Django 6.0.3 on 2026-10-19 11:40
+
+from django.db import OperationalError, migrations
+
+FTS5_CRIAR = (
+    "CREATE VIRTUAL TABLE find_mensagem_fts USING fts5("
+    "conteudo, tokenize='unicode61 remove_diacritics 2')"
+)
+FULLTEXT_CRIAR = "ALTER TABLE mainpage_mensagem ADD FULLTEXT INDEX mensagem_busca_fulltext (conteudo)"
+
+
+def criar_indice(apps, schema_editor):
+    from chats.busca import garantir_gatilhos
+
+    conexao = schema_editor.connection
+    if conexao.vendor == "sqlite":
+        try:
+            schema_editor.execute(FTS5_CRIAR)
+        except OperationalError:
+            return  # SQLite compilado sem FTS5: a busca usa icontains (chats/busca.py)
+        garantir_gatilhos(conexao)  # cria os gatilhos e preenche o índice
+    elif conexao.vendor == "mysql":
+        schema_editor.execute(FULLTEXT_CRIAR)
+
+
+def remover_indice(apps, schema_editor):
+    conexao = schema_editor.connection
+    if conexao.vendor == "sqlite":
+        for sufixo in ("ai", "ad", "au"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS find_mensagem_fts_{sufixo}")
+        schema_editor.execute("DROP TABLE IF EXISTS find_mensagem_fts")
+    elif conexao.vendor == "mysql":
+        schema_editor.execute("ALTER TABLE mainpage_mensagem DROP INDEX mensagem_busca_fulltext")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0001_initial'),
+        ('mainpage', '0006_move_models_to_apps'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
@@ -215,3 +215,58 @@ class TestApiChatSend:
             "conteudo": "Pode vir buscar!",
         }, format="json")
         assert resp.status_code == 201
+
+
+# ──────────────────────────────────────────────────────────────
+# Buscar mensagens
+# ──────────────────────────────────────────────────────────────
+class TestApiChatSearch:
+
+    @pytest.fixture
+    def mensagens(self, chat, dono, interessado):
+        textos = [
+            (interessado, "Oi, acho que o relógio é meu"),
+            (dono, "Qual a cor da pulseira?"),
+            (interessado, "A pulseira é de couro marrom, com um arranhão perto do fecho"),
+        ]
+        return [Mensagem.objects.create(chat=chat, remetente=r, conteudo=t) for r, t in textos]
+
+    def test_busca_com_trecho_sem_acento(self, auth_dono, mensagens, chat):
+        resp = auth_dono.get("/api/chats/buscar/", {"q": "relogio"})
+        assert resp.status_code == 200
+        resultado, = resp.data["results"]
+        assert resultado["chat_id"] == chat.id
+        assert resultado["item_titulo"] == "Relógio Fossil"
+        assert resultado["trecho"] == "Oi, acho que o <mark>relógio</mark> é meu"
+
+    def test_prefixos_recentes_primeiro_e_paginacao(self, auth_interessado, mensagens):
+        resp = auth_interessado.get("/api/chats/buscar/", {"q": "pulse", "per_page": 1})
+        assert [r["id"] for r in resp.data["results"]] == [mensagens[2].id]
+        assert resp.data["has_more"] is True
+        resp = auth_interessado.get("/api/chats/buscar/", {"q": "pulse", "per_page": 1, "page": 2})
+        assert [r["id"] for r in resp.data["results"]] == [mensagens[1].id]
+        assert resp.data["has_more"] is False
+        resp = auth_interessado.get("/api/chats/buscar/", {"q": "couro fecho"})
+        assert "<mark>couro</mark>" in resp.data["results"][0]["trecho"]
+
+    def test_so_chats_do_usuario(self, auth_terceiro, auth_dono, mensagens, chat):
+        assert auth_terceiro.get("/api/chats/buscar/", {"q": "pulseira"}).data["results"] == []
+        assert auth_dono.get("/api/chats/buscar/", {"q": "pulseira", "chat": chat.id + 1}).data["results"] == []
+        assert auth_dono.get("/api/chats/buscar/", {"q": ""}).status_code == 400
+
+    def test_indice_acompanha_edicao_e_remocao(self, auth_dono, mensagens):
+        mensagens[0].conteudo = "Oi, perdi uma carteira"
+        mensagens[0].save()
+        mensagens[1].delete()
+        assert auth_dono.get("/api/chats/buscar/", {"q": "relogio"}).data["results"] == []
+        assert len(auth_dono.get("/api/chats/buscar/", {"q": "carteira"}).data["results"]) == 1
+        assert len(auth_dono.get("/api/chats/buscar/", {"q": "pulseira"}).data["results"]) == 1
+
+
+def test_trecho_longo_e_escapado():
+    from chats.busca import trecho
+
+    texto = "x" * 100 + " <b>chave</b> " + "y" * 100
+    resultado = trecho(texto, "chave", tamanho=40)
+    assert resultado.startswith("…") and resultado.endswith("…")
+    assert "&lt;b&gt;<mark>chave</mark>&lt;/b&gt;" in resultado
@@ -2,8 +2,10 @@
 Configuração global do pytest para o projeto Find.
 - Usa FileSystemStorage em vez do DatabaseStorage (evita travamento nos testes)
 - Desabilita processamento de imagem no Profile (evita I/O pesado)
+- Limpa o cache e os índices em memória a cada teste (buscas em cache não vazam entre testes)
 """
 import django
+import pytest
 from django.conf import settings
 
 
@@ -22,6 +24,25 @@ def pytest_configure(config):
     settings.PASSWORD_HASHERS = [
         'django.contrib.auth.hashers.MD5PasswordHasher',
     ]
+    # Cache em memória nos testes: as contagens de consultas não incluem a tabela de cache
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+    # Busca visual sem pool de processos nos testes (spawn é lento e não enxerga a transação)
+    settings.BUSCA_VISUAL_WORKERS = 0
+
+
+@pytest.fixture(autouse=True)
+def cache_limpo():
+    from django.core.cache import cache
+    from items import categorizacao, indice_visual
+
+    cache.clear()
+    indice_visual.descartar()  # o banco volta ao estado inicial entre os testes
+    categorizacao.descartar()
+    yield
 
 
 def pytest_collection_modifyitems(config, items):
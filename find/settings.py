@@ -115,6 +115,26 @@ else:
         }
     }
 
+# ─── Cache ────────────────────────────────────────────────────
+# Compartilhado entre os workers do gunicorn (versão das buscas em cache, resultados
+# da busca visual): Redis com REDIS_URL, senão uma tabela no próprio banco
+# (criada por `manage.py createcachetable` no start.sh).
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'find_cache',
+        }
+    }
+
 # ─── CORS ─────────────────────────────────────────────────────
 CORS_ALLOW_ALL_ORIGINS = True   # permite o app mobile se conectar
 CORS_ALLOW_CREDENTIALS = True
@@ -210,3 +230,82 @@ SOCIALACCOUNT_PROVIDERS = {
 # ─── Gemini API (Busca Visual Inteligente) ──────────────────────
 GEMINI_API_KEY = config('GEMINI_API_KEY', default='')
 
+# Orçamento total (s) da busca visual; se o Gemini não responder a tempo, usa o resultado local
+BUSCA_VISUAL_ORCAMENTO = config('BUSCA_VISUAL_ORCAMENTO', default=3.0, cast=float)
+# Cache de resultados da busca visual (s); a chave inclui a versão do catálogo
+BUSCA_VISUAL_CACHE_TTL = config('BUSCA_VISUAL_CACHE_TTL', default=300, cast=int)
+# Resultados calculados por consulta (as páginas seguintes saem do cache)
+BUSCA_VISUAL_MAX_RESULTADOS = config('BUSCA_VISUAL_MAX_RESULTADOS', default=100, cast=int)
+# Pool de processos da busca visual: workers, consultas extras na fila e Retry-After (s) quando lotado
+BUSCA_VISUAL_WORKERS = config('BUSCA_VISUAL_WORKERS', default=2, cast=int)
+BUSCA_VISUAL_FILA = config('BUSCA_VISUAL_FILA', default=8, cast=int)
+BUSCA_VISUAL_RETRY_AFTER = config('BUSCA_VISUAL_RETRY_AFTER', default=5, cast=int)
+# Buscas visuais em andamento somando todos os processos web (0 = workers + fila) e
+# validade (s) do contador compartilhado, para vagas presas por um processo que morreu
+BUSCA_VISUAL_LIMITE_GLOBAL = config('BUSCA_VISUAL_LIMITE_GLOBAL', default=0, cast=int)
+BUSCA_VISUAL_ADMISSAO_TTL = config('BUSCA_VISUAL_ADMISSAO_TTL', default=60, cast=int)
+# Fotos aceitas por requisição na busca visual em lote (triagem dos bolsistas)
+BUSCA_VISUAL_LOTE_MAX = config('BUSCA_VISUAL_LOTE_MAX', default=20, cast=int)
+# Fotos de um lote no pool ao mesmo tempo (o resto do pool fica para as buscas avulsas)
+BUSCA_VISUAL_LOTE_PARALELO = config('BUSCA_VISUAL_LOTE_PARALELO', default=max(1, BUSCA_VISUAL_WORKERS // 2), cast=int)
+# Tempo máximo (s) para decodificar todas as fotos de um lote (acima disso: 503)
+BUSCA_VISUAL_LOTE_ORCAMENTO = config('BUSCA_VISUAL_LOTE_ORCAMENTO', default=10.0, cast=float)
+GEMINI_TIMEOUT = config('GEMINI_TIMEOUT', default=4.0, cast=float)
+GEMINI_MAX_LADO = config('GEMINI_MAX_LADO', default=768, cast=int)
+# Disjuntor: após N falhas/lentidões seguidas, pausa as chamadas ao Gemini por X segundos
+GEMINI_DISJUNTOR_FALHAS = config('GEMINI_DISJUNTOR_FALHAS', default=3, cast=int)
+GEMINI_DISJUNTOR_PAUSA = config('GEMINI_DISJUNTOR_PAUSA', default=60, cast=int)
+
+# ─── Índice visual local (items/indice_visual.py) ────────────────
+# A partir de quantos itens com descritor o índice passa a usar IVF (k-means) em vez de varredura
+INDICE_IVF_MINIMO = config('INDICE_IVF_MINIMO', default=2000, cast=int)
+INDICE_IVF_NPROBE = config('INDICE_IVF_NPROBE', default=8, cast=int)
+# Intervalo (s) entre as checagens da versão do catálogo pelo índice de cada processo
+INDICE_VISUAL_INTERVALO = config('INDICE_VISUAL_INTERVALO', default=5, cast=int)
+# Margem (s) ao reler itens alterados: cobre transações confirmadas com atualizado_em anterior à última leitura
+INDICE_VISUAL_FOLGA = config('INDICE_VISUAL_FOLGA', default=60, cast=int)
+# Detecção de duplicatas: distância máxima de pHash (0-256) e de descritor (0-2)
+DUPLICATA_LIMIAR_HASH = config('DUPLICATA_LIMIAR_HASH', default=40, cast=int)
+DUPLICATA_LIMIAR_DESCRITOR = config('DUPLICATA_LIMIAR_DESCRITOR', default=0.2, cast=float)
+
+# ─── Busca textual (items/busca_texto.py) ───────────────────────
+# Caminho de um backend alternativo; vazio = FTS5 no SQLite, FULLTEXT no MySQL
+BUSCA_TEXTO_BACKEND = config('BUSCA_TEXTO_BACKEND', default='')
+# Fração mínima dos trigramas da consulta que um item precisa ter na busca tolerante a erros
+BUSCA_TRIGRAMA_MINIMA = config('BUSCA_TRIGRAMA_MINIMA', default=0.7, cast=float)
+# Ranking da busca textual: quantos candidatos repontuar, meia-vida (dias) da recência
+# e bônus para itens perdidos/achados sobre os já devolvidos
+BUSCA_RANKING_CANDIDATOS = config('BUSCA_RANKING_CANDIDATOS', default=200, cast=int)
+BUSCA_RANKING_MEIA_VIDA_DIAS = config('BUSCA_RANKING_MEIA_VIDA_DIAS', default=30, cast=int)
+BUSCA_RANKING_BONUS_ABERTO = config('BUSCA_RANKING_BONUS_ABERTO', default=1.25, cast=float)
+# Validade (s) das listas de ids em cache por busca + filtros + página (items/cache_busca.py)
+BUSCA_CACHE_TTL = config('BUSCA_CACHE_TTL', default=300, cast=int)
+# Máximo de buscas salvas (alertas de itens novos, items/alertas.py) por usuário
+BUSCAS_SALVAS_MAX = config('BUSCAS_SALVAS_MAX', default=20, cast=int)
+# Sugestões do menu: intervalo (s) entre checagens de itens alterados por outros processos
+SUGESTOES_INTERVALO = config('SUGESTOES_INTERVALO', default=5, cast=int)
+
+# ─── Correspondência perdido↔achado (items/correspondencia.py) ───
+CORRESPONDENCIA_JANELA_DIAS = config('CORRESPONDENCIA_JANELA_DIAS', default=60, cast=int)
+CORRESPONDENCIA_MAX_CANDIDATOS = config('CORRESPONDENCIA_MAX_CANDIDATOS', default=500, cast=int)
+CORRESPONDENCIA_TOP = config('CORRESPONDENCIA_TOP', default=10, cast=int)
+CORRESPONDENCIA_MINIMA = config('CORRESPONDENCIA_MINIMA', default=35, cast=float)
+
+# ─── Tags das fotos (items/tags.py, comando gerar_tags) ──────────
+TAGS_DESCRITOR = config('TAGS_DESCRITOR', default='items.tags.DescritorGemini')
+TAGS_POR_MINUTO = config('TAGS_POR_MINUTO', default=30, cast=int)
+TAGS_TENTATIVAS = config('TAGS_TENTATIVAS', default=3, cast=int)
+TAGS_ESPERA_BASE = config('TAGS_ESPERA_BASE', default=1.0, cast=float)
+TAGS_TIMEOUT = config('TAGS_TIMEOUT', default=15.0, cast=float)
+TAGS_MAXIMO = config('TAGS_MAXIMO', default=12, cast=int)
+
+# ─── Sugestão de categoria (items/categorizacao.py) ─────────────
+CATEGORIA_K = config('CATEGORIA_K', default=7, cast=int)
+CATEGORIA_SIMILARIDADE_MINIMA = config('CATEGORIA_SIMILARIDADE_MINIMA', default=0.2, cast=float)
+CATEGORIA_SUGESTAO_MINIMA = config('CATEGORIA_SUGESTAO_MINIMA', default=0.6, cast=float)
+# Intervalo (s) entre as checagens de itens categorizados alterados por outros processos
+CATEGORIA_INTERVALO = config('CATEGORIA_INTERVALO', default=5, cast=int)
+
+# ─── Itens parecidos (items/similares.py) ────────────────────────
+SIMILARES_TOP = config('SIMILARES_TOP', default=8, cast=int)
+SIMILARES_MINIMA = config('SIMILARES_MINIMA', default=0.3, cast=float)
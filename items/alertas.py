@@ -0,0 +1,88 @@
+"""
+Alertas de buscas salvas por percolação (busca reversa).
+
+Em vez de rodar todas as buscas salvas a cada item novo, cada BuscaSalva guarda
+uma `chave` com o seu critério mais seletivo:
+- a palavra mais longa do texto (ou, sem texto, do local), como "t:<palavra>";
+- senão a categoria ("categoria:<id>") ou a cor ("cor:<cor>").
+
+Um item novo gera todas as chaves que poderia satisfazer: os prefixos das palavras
+de título, descrição e local (as palavras da busca casam por prefixo, como na busca
+textual), a categoria e as cores da foto. Uma consulta pelo índice (chave, status)
+traz só as buscas candidatas, e cada uma é conferida por inteiro em Python. O custo
+por item depende das buscas plausíveis, não do total de buscas salvas.
+"""
+from items.correspondencia import STATUS_ACHADOS
+from items.texto import normalizar
+
+TAMANHO_CHAVE = 50
+
+
+def _palavras(texto):
+    return normalizar(texto or "").split()
+
+
+def chave_percolacao(q="", local="", categoria_id=None, cor=""):
+    """Critério mais seletivo da busca; "" se a busca não tem critério nenhum."""
+    for texto in (q, local):
+        palavras = _palavras(texto)
+        if palavras:
+            return "t:" + max(palavras, key=len)[:TAMANHO_CHAVE]
+    if categoria_id:
+        return f"categoria:{categoria_id}"
+    if cor:
+        return f"cor:{cor}"
+    return ""
+
+
+def chaves_do_item(palavras, categoria_id, cores):
+    """Todas as chaves que uma busca satisfeita por este item poderia ter."""
+    chaves = {f"t:{palavra[:tamanho]}" for palavra in palavras
+              for tamanho in range(1, min(len(palavra), TAMANHO_CHAVE) + 1)}
+    if categoria_id:
+        chaves.add(f"categoria:{categoria_id}")
+    chaves.update(f"cor:{cor}" for cor in cores)
+    return chaves
+
+
+def _casa_palavras(consulta, palavras):
+    return all(any(palavra.startswith(termo) for palavra in palavras) for termo in consulta)
+
+
+def casa(busca, item, cores):
+    """A busca salva aceita o item? (todos os critérios, não só a chave)"""
+    if busca.categoria_id and busca.categoria_id != item.categoria_id:
+        return False
+    if busca.cor and busca.cor not in cores:
+        return False
+    if not _casa_palavras(_palavras(busca.local), _palavras(item.local)):
+        return False
+    return _casa_palavras(_palavras(busca.q), item.texto_normalizado.split())
+
+
+def grupo_de_status(status):
+    """Status de BuscaSalva que um item com `status` pode satisfazer."""
+    if status in STATUS_ACHADOS:
+        return "achado"
+    if status == "perdido":
+        return "perdido"
+    return None
+
+
+def percolar(item):
+    """Cria os AlertaBusca das buscas salvas (de outros usuários) que casam com o item novo."""
+    from items.models import AlertaBusca, BuscaSalva
+
+    grupo = grupo_de_status(item.status)
+    if grupo is None:
+        return []
+    cores = set(item.cores.values_list("cor", flat=True)) if item.imagem else set()
+    palavras = set(item.texto_normalizado.split())
+    candidatas = (
+        BuscaSalva.objects
+        .filter(status=grupo, ativa=True, chave__in=chaves_do_item(palavras, item.categoria_id, cores))
+        .exclude(usuario_id=item.usuario_id)
+    )
+    alertas = [AlertaBusca(busca=busca, item=item) for busca in candidatas if casa(busca, item, cores)]
+    AlertaBusca.objects.bulk_create(alertas, ignore_conflicts=True)
+    return alertas
@@ -13,6 +13,14 @@ urlpatterns = [
     path("stats/", views.api_stats, name="api_stats"),
     path("categorias/", views.api_categories, name="api_categories"),
     path("items/busca-visual/", views.api_search_by_image, name="api_search_by_image"),
+    path("items/busca-visual/lote/", views.api_search_by_image_lote, name="api_search_by_image_lote"),
+    path("items/busca-visual/metricas/", views.api_busca_visual_metricas, name="api_busca_visual_metricas"),
+
+    # Buscas salvas e alertas
+    path("buscas-salvas/", views.api_buscas_salvas, name="api_buscas_salvas"),
+    path("buscas-salvas/<int:busca_id>/deletar/", views.api_busca_salva_deletar, name="api_busca_salva_deletar"),
+    path("alertas/", views.api_alertas, name="api_alertas"),
+    path("alertas/lidos/", views.api_alertas_marcar_lidos, name="api_alertas_marcar_lidos"),
 
     # QR Code
     path("items/qr/<slug:slug>/imagem/", views.api_item_qr_image, name="api_item_qr_image"),
@@ -23,4 +31,6 @@ urlpatterns = [
     path("bolsista/<int:item_id>/confirmar/", views.api_bolsista_confirmar, name="api_bolsista_confirmar"),
     path("bolsista/<int:item_id>/devolver/", views.api_bolsista_devolver, name="api_bolsista_devolver"),
     path("bolsista/meu-log/", views.api_bolsista_meu_log, name="api_bolsista_meu_log"),
+    path("bolsista/duplicatas/", views.api_bolsista_duplicatas, name="api_bolsista_duplicatas"),
+    path("bolsista/duplicatas/<int:par_id>/resolver/", views.api_bolsista_resolver_duplicata, name="api_bolsista_resolver_duplicata"),
 ]
@@ -1,12 +1,18 @@
 """API views para itens e categorias."""
 import datetime
-from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from items import cache_busca
+from items.busca_texto import filtro_texto, ranquear
+from items.categorizacao import aplicar_sugestao
+from items.descritores import CORES
+from items.duplicatas import verificar_foto
+from items.facetas import contar_facetas, filtro_mes
 from items.models import Item, Categoria
-from accounts.permissoes import IsBolsistaOuAdmin
+from items.tags import filtro_tags
+from accounts.permissoes import IsBolsistaOuAdmin, check_admin
 
 
 def _item_to_dict(item, request=None):
@@ -40,6 +46,8 @@ def api_items(request):
     q = (request.GET.get("q") or "").strip()
     status = (request.GET.get("status") or "todos").strip().lower()
     categoria_id = request.GET.get("categoria")
+    cor = (request.GET.get("cor") or "").strip().lower()
+    mes = (request.GET.get("mes") or "").strip()
     try:
         page = max(1, int(request.GET.get("page", 1)))
         per_page = min(100, max(1, int(request.GET.get("per_page", 20))))
@@ -48,18 +56,51 @@ def api_items(request):
 
     qs = Item.objects.select_related("usuario", "categoria").order_by("-id")
     if q:
-        qs = qs.filter(Q(titulo__icontains=q) | Q(descricao__icontains=q) | Q(local__icontains=q))
-    if status in ["perdido", "achado", "devolvido"]:
+        qs = qs.filter(filtro_texto(q) | filtro_tags(q))
+    if cor in CORES:
+        qs = qs.filter(cores__cor=cor)
+    categoria_id = int(categoria_id) if categoria_id and str(categoria_id).isdigit() else None
+    status = status if status in ["perdido", "achado", "devolvido"] else ""
+    # tudo o que, além de q, muda o resultado: chave do cache de buscas (items/cache_busca.py)
+    filtros = {"status": status, "categoria": categoria_id, "cor": cor if cor in CORES else "", "mes": mes}
+    base = qs
+
+    if status:
         qs = qs.filter(status=status)
-    if categoria_id and str(categoria_id).isdigit():
-        qs = qs.filter(categoria_id=int(categoria_id))
+    if categoria_id is not None:
+        qs = qs.filter(categoria_id=categoria_id)
+    qs = qs.filter(filtro_mes(mes))
 
     start = (page - 1) * per_page
-    items_page = list(qs[start:start + per_page + 1])
-    has_more = len(items_page) > per_page
-    items_page = items_page[:per_page]
 
-    return Response({"ok": True, "results": [_item_to_dict(i, request) for i in items_page], "page": page, "has_more": has_more})
+    def calcular():
+        if q:
+            # relevância: peso por campo no índice, recência e bônus para casos em aberto
+            return ranquear(qs, q, start, per_page)
+        pagina = list(qs[start:start + per_page + 1])
+        return pagina[:per_page], len(pagina) > per_page
+
+    items_page, has_more = cache_busca.paginar("api", q, filtros, start, per_page, calcular)
+    results = [_item_to_dict(i, request) for i in items_page]
+    if q:
+        for resultado, item in zip(results, items_page):
+            resultado["relevancia"] = item.relevancia
+
+    # facetas da busca (status, categoria, mês) antes dos filtros de faceta, numa consulta
+    # agrupada; as páginas seguintes da mesma busca não as recalculam
+    facetas = None
+    if page == 1:
+        facetas = cache_busca.lembrar("api_facetas", q, filtros, lambda: contar_facetas(
+            base, status=status, categoria_id=categoria_id, mes=mes,
+        ))
+
+    return Response({
+        "ok": True,
+        "results": results,
+        "page": page,
+        "has_more": has_more,
+        "facetas": facetas,
+    })
 
 
 @api_view(["GET"])
@@ -69,7 +110,19 @@ def api_item_detail(request, item_id):
         item = Item.objects.select_related("usuario", "categoria").get(id=item_id)
     except Item.DoesNotExist:
         return Response({"ok": False, "detail": "Item não encontrado."}, status=404)
-    return Response({"ok": True, "data": _item_to_dict(item, request)})
+    data = _item_to_dict(item, request)
+    data["tags"] = list(item.tags.values_list("tag", flat=True))
+    correspondencias = item.correspondencias.select_related("candidato__usuario", "candidato__categoria")[:10]
+    data["correspondencias"] = [
+        {**_item_to_dict(c.candidato, request), "pontuacao": c.pontuacao, "detalhes": c.detalhes}
+        for c in correspondencias
+    ]
+    similares = item.similares.select_related("similar__usuario", "similar__categoria")[:8]
+    data["similares"] = [
+        {**_item_to_dict(s.similar, request), "pontuacao": s.pontuacao}
+        for s in similares
+    ]
+    return Response({"ok": True, "data": data})
 
 
 @api_view(["POST"])
@@ -96,12 +149,32 @@ def api_create_item(request):
             pass
 
     imagem = request.FILES.get("imagem")
-    item = Item.objects.create(
+    # foto quase idêntica a um item já publicado: avisa (ou, com exigir_confirmacao=1,
+    # só cadastra depois que o cliente reenviar com confirmar_duplicata=1)
+    caracteristicas, duplicatas = verificar_foto(imagem)
+    duplicatas_data = [
+        dict(_item_to_dict(outro, request), similaridade=similaridade) for outro, similaridade in duplicatas
+    ]
+    exigir = str(data.get("exigir_confirmacao", "")).lower() in ("1", "true")
+    confirmado = str(data.get("confirmar_duplicata", "")).lower() in ("1", "true")
+    if duplicatas and exigir and not confirmado:
+        return Response({
+            "ok": False,
+            "detail": "Já existe um item com foto muito parecida. Reenvie com confirmar_duplicata=1 para cadastrar mesmo assim.",
+            "possiveis_duplicatas": duplicatas_data,
+        }, status=409)
+
+    item = Item(
         titulo=titulo, descricao=descricao, local=local,
         status=status, categoria=categoria, usuario=request.user,
         data=data_item, imagem=imagem,
     )
-    return Response({"ok": True, "data": _item_to_dict(item, request)}, status=201)
+    item._caracteristicas = caracteristicas
+    item.save()
+    sugerida = aplicar_sugestao(item) if categoria is None else None
+    data = _item_to_dict(item, request)
+    data["categoria_sugerida"] = sugerida is not None
+    return Response({"ok": True, "data": data, "possiveis_duplicatas": duplicatas_data}, status=201)
 
 
 @api_view(["PUT", "PATCH"])
@@ -307,31 +380,134 @@ def api_categories(request):
     return Response({"ok": True, "results": list(cats)})
 
 
+def _filtros_busca_visual(params):
+    """
+    Lê os filtros da busca visual: status (lista separada por vírgula ou 'abertos'),
+    categoria, data_inicio/data_fim (AAAA-MM-DD) e cor. Levanta ValueError se inválidos.
+    """
+    status_validos = [valor for valor, _ in Item.STATUS_CHOICES]
+    status = (params.get("status") or "").strip().lower()
+    if status == "abertos":
+        status = [s for s in status_validos if s != "devolvido"]
+    else:
+        status = [s.strip() for s in status.split(",") if s.strip() in status_validos]
+
+    categoria = str(params.get("categoria") or "")
+    cor = (params.get("cor") or "").strip().lower()
+    data_inicio, data_fim = params.get("data_inicio"), params.get("data_fim")
+    return {
+        "status": status,
+        "categoria": int(categoria) if categoria.isdigit() else None,
+        "data_inicio": datetime.date.fromisoformat(data_inicio) if data_inicio else None,
+        "data_fim": datetime.date.fromisoformat(data_fim) if data_fim else None,
+        "cor": cor if cor in CORES else None,
+    }
+
+
 @api_view(["POST"])
 @permission_classes([AllowAny])
 def api_search_by_image(request):
-    """Busca itens visualmente similares a uma foto enviada (AI visual search)."""
+    """
+    Busca itens visualmente similares a uma foto enviada (AI visual search).
+    Filtros opcionais: status, categoria, data_inicio, data_fim, cor; paginação: page, per_page.
+    Administradores podem pedir o modo trace (?trace=1 ou cabeçalho X-Busca-Trace: 1),
+    que devolve em "trace" os tempos por etapa e qual estratégia respondeu.
+    """
     imagem = request.FILES.get("imagem") or request.FILES.get("image")
     if not imagem:
         return Response({"ok": False, "detail": "Envie uma imagem no campo 'imagem'."}, status=400)
 
+    from items.busca_visual import BuscaVisualSaturada, Rastreio, buscar_pagina
+
+    pediu_trace = request.query_params.get("trace") == "1" or request.headers.get("X-Busca-Trace") == "1"
+    rastreio = Rastreio() if pediu_trace and check_admin(request.user) else None
+
+    params = request.POST if request.POST else request.data
     try:
-        resultados = Item.buscar_por_imagem(imagem)
+        filtros = _filtros_busca_visual(params)
+        page = max(1, int(params.get("page", 1)))
+        per_page = min(50, max(1, int(params.get("per_page", 20))))
+    except (TypeError, ValueError):
+        return Response({"ok": False, "detail": "Filtros ou paginação inválidos."}, status=400)
+
+    try:
+        resultados, has_more = buscar_pagina(imagem, inicio=(page - 1) * per_page, limite=per_page,
+                                             filtros=filtros, rastreio=rastreio)
         items_data = []
         for item, similaridade in resultados:
             d = _item_to_dict(item, request)
             d["similaridade"] = similaridade
             items_data.append(d)
 
-        return Response({
+        resposta = {
             "ok": True,
             "total": len(items_data),
             "results": items_data,
-        })
+            "page": page,
+            "has_more": has_more,
+        }
+        if rastreio is not None:
+            resposta["trace"] = rastreio.resumo()
+        return Response(resposta)
+    except BuscaVisualSaturada as e:
+        return Response({"ok": False, "detail": str(e)}, status=503,
+                        headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         return Response({"ok": False, "detail": f"Erro ao processar imagem: {str(e)}"}, status=500)
 
 
+@api_view(["POST"])
+@permission_classes([IsAuthenticated, IsBolsistaOuAdmin])
+def api_search_by_image_lote(request):
+    """
+    Busca visual em lote para a triagem: várias fotos no campo 'imagens', cada uma
+    com seus itens parecidos. Aceita os mesmos filtros da busca visual e 'limite'
+    (resultados por foto).
+    """
+    from django.conf import settings
+    from items.busca_visual import BuscaVisualSaturada, buscar_lote
+
+    imagens = request.FILES.getlist("imagens")
+    maximo = getattr(settings, "BUSCA_VISUAL_LOTE_MAX", 20)
+    if not imagens:
+        return Response({"ok": False, "detail": "Envie as fotos no campo 'imagens'."}, status=400)
+    if len(imagens) > maximo:
+        return Response({"ok": False, "detail": f"Envie no máximo {maximo} fotos por lote."}, status=400)
+
+    params = request.POST if request.POST else request.data
+    try:
+        filtros = _filtros_busca_visual(params)
+        limite = min(20, max(1, int(params.get("limite", 5))))
+    except (TypeError, ValueError):
+        return Response({"ok": False, "detail": "Filtros ou limite inválidos."}, status=400)
+
+    try:
+        por_foto = buscar_lote(imagens, limite=limite, filtros=filtros)
+    except BuscaVisualSaturada as e:
+        return Response({"ok": False, "detail": str(e)}, status=503,
+                        headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        return Response({"ok": False, "detail": f"Erro ao processar imagens: {str(e)}"}, status=500)
+
+    results = []
+    for posicao, (imagem, resultados) in enumerate(zip(imagens, por_foto)):
+        entrada = {"indice": posicao, "nome": imagem.name, "ok": resultados is not None, "results": []}
+        for item, similaridade in resultados or []:
+            d = _item_to_dict(item, request)
+            d["similaridade"] = similaridade
+            entrada["results"].append(d)
+        results.append(entrada)
+    return Response({"ok": True, "total": len(results), "results": results})
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, IsBolsistaOuAdmin])
+def api_busca_visual_metricas(request):
+    """Métricas do pool de busca visual deste processo (ocupação, rejeições, espera na fila)."""
+    from items.busca_visual import admissao
+    return Response({"ok": True, "data": admissao.metricas()})
+
+
 def _get_client_ip(request):
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
     if x_forwarded_for:
@@ -487,3 +663,146 @@ def api_bolsista_meu_log(request):
             "ip_origem": log.ip_origem
         })
     return Response({"ok": True, "results": results})
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, IsBolsistaOuAdmin])
+def api_bolsista_duplicatas(request):
+    from items.duplicatas import grupos_pendentes
+    try:
+        page = max(1, int(request.GET.get("page", 1)))
+        per_page = min(100, max(1, int(request.GET.get("per_page", 20))))
+    except (TypeError, ValueError):
+        page, per_page = 1, 20
+
+    grupos, has_more = grupos_pendentes(inicio=(page - 1) * per_page, limite=per_page)
+    results = []
+    for grupo in grupos:
+        results.append({
+            "grupo": grupo["grupo"],
+            "itens": [_item_to_dict(i, request) for i in grupo["itens"]],
+            "pares": [{
+                "id": par.id,
+                "item_a_id": par.item_a_id,
+                "item_b_id": par.item_b_id,
+                "similaridade": par.similaridade,
+                "distancia_hash": par.distancia_hash,
+            } for par in grupo["pares"]],
+        })
+    return Response({"ok": True, "results": results, "page": page, "has_more": has_more})
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated, IsBolsistaOuAdmin])
+def api_bolsista_resolver_duplicata(request, par_id):
+    from items.duplicatas import resolver_par
+    from items.models import ParDuplicado
+
+    resolver_par(get_object_or_404(ParDuplicado, id=par_id))
+    return Response({"ok": True, "detail": "Par marcado como resolvido."})
+
+
+# -----------------------------
+# Buscas salvas e alertas (items/alertas.py)
+# -----------------------------
+def _busca_salva_to_dict(busca):
+    return {
+        "id": busca.id,
+        "q": busca.q,
+        "categoria_id": busca.categoria_id,
+        "cor": busca.cor,
+        "local": busca.local,
+        "status": busca.status,
+        "ativa": busca.ativa,
+        "criado_em": busca.criado_em.isoformat() if busca.criado_em else "",
+    }
+
+
+@api_view(["GET", "POST"])
+@permission_classes([IsAuthenticated])
+def api_buscas_salvas(request):
+    from django.conf import settings
+    from items.alertas import chave_percolacao
+    from items.models import BuscaSalva
+
+    if request.method == "GET":
+        buscas = BuscaSalva.objects.filter(usuario=request.user)
+        return Response({"ok": True, "results": [_busca_salva_to_dict(b) for b in buscas]})
+
+    data = request.data
+    q = (data.get("q") or "").strip()[:100]
+    local = (data.get("local") or "").strip()[:45]
+    cor = (data.get("cor") or "").strip().lower()
+    status = (data.get("status") or "achado").strip().lower()
+    categoria_id = str(data.get("categoria") or "").strip()
+    categoria = None
+    if categoria_id:
+        categoria = Categoria.objects.filter(id=categoria_id).first() if categoria_id.isdigit() else None
+        if categoria is None:
+            return Response({"ok": False, "detail": "Categoria inválida."}, status=400)
+    if cor and cor not in CORES:
+        return Response({"ok": False, "detail": "Cor inválida."}, status=400)
+    if status not in ["achado", "perdido"]:
+        return Response({"ok": False, "detail": "Status deve ser 'achado' ou 'perdido'."}, status=400)
+    if not chave_percolacao(q, local, categoria.id if categoria else None, cor):
+        return Response({"ok": False, "detail": "Informe texto, local, categoria ou cor."}, status=400)
+    if BuscaSalva.objects.filter(usuario=request.user).count() >= getattr(settings, "BUSCAS_SALVAS_MAX", 20):
+        return Response({"ok": False, "detail": "Limite de buscas salvas atingido."}, status=400)
+
+    busca = BuscaSalva.objects.create(
+        usuario=request.user, q=q, local=local, cor=cor, status=status, categoria=categoria
+    )
+    return Response({"ok": True, "data": _busca_salva_to_dict(busca)}, status=201)
+
+
+@api_view(["DELETE"])
+@permission_classes([IsAuthenticated])
+def api_busca_salva_deletar(request, busca_id):
+    from items.models import BuscaSalva
+
+    busca = get_object_or_404(BuscaSalva, id=busca_id, usuario=request.user)
+    busca.delete()
+    return Response({"ok": True, "detail": "Busca salva removida."})
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def api_alertas(request):
+    from items.models import AlertaBusca
+
+    try:
+        page = max(1, int(request.GET.get("page", 1)))
+        per_page = min(100, max(1, int(request.GET.get("per_page", 20))))
+    except (TypeError, ValueError):
+        page, per_page = 1, 20
+    qs = AlertaBusca.objects.filter(busca__usuario=request.user)
+    nao_lidos = qs.filter(lido=False).count()
+    if request.GET.get("nao_lidos") in ("1", "true"):
+        qs = qs.filter(lido=False)
+    start = (page - 1) * per_page
+    alertas = list(qs.select_related("item__usuario", "item__categoria")[start:start + per_page + 1])
+    has_more = len(alertas) > per_page
+    results = [{
+        "id": alerta.id,
+        "busca_id": alerta.busca_id,
+        "lido": alerta.lido,
+        "criado_em": alerta.criado_em.isoformat(),
+        "item": _item_to_dict(alerta.item, request),
+    } for alerta in alertas[:per_page]]
+    return Response({"ok": True, "results": results, "nao_lidos": nao_lidos, "page": page, "has_more": has_more})
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def api_alertas_marcar_lidos(request):
+    """Marca como lidos os alertas em `ids` (lista) ou, sem `ids`, todos do usuário."""
+    from items.models import AlertaBusca
+
+    qs = AlertaBusca.objects.filter(busca__usuario=request.user, lido=False)
+    ids = request.data.get("ids")
+    if ids is not None:
+        if not isinstance(ids, list) or not all(str(i).isdigit() for i in ids):
+            return Response({"ok": False, "detail": "ids deve ser uma lista de inteiros."}, status=400)
+        qs = qs.filter(id__in=[int(i) for i in ids])
+    marcados = qs.update(lido=True)
+    return Response({"ok": True, "marcados": marcados})
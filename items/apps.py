@@ -5,3 +5,29 @@ class ItemsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'items'
     verbose_name = 'Itens e Categorias'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_migrate, post_save
+        from items import cache_busca, categorizacao, indice_visual, sugestoes
+        from items.busca_texto import sincronizar_apos_migrate
+        post_migrate.connect(sincronizar_apos_migrate, sender=self)
+
+        # índice de sugestões da busca do menu (items/sugestoes.py)
+        Item, Categoria = self.get_model('Item'), self.get_model('Categoria')
+        post_save.connect(sugestoes.item_salvo, sender=Item)
+        post_delete.connect(sugestoes.item_removido, sender=Item)
+        post_save.connect(sugestoes.descartar, sender=Categoria)
+        post_delete.connect(sugestoes.descartar, sender=Categoria)
+
+        # índice visual em memória (items/indice_visual.py): confere a versão na próxima busca
+        post_save.connect(indice_visual.catalogo_alterado, sender=Item)
+        post_delete.connect(indice_visual.catalogo_alterado, sender=Item)
+
+        # índice de categorias (items/categorizacao.py): confere a versão na próxima sugestão
+        post_save.connect(categorizacao.item_alterado, sender=Item)
+        post_delete.connect(categorizacao.item_alterado, sender=Item)
+
+        # cache das listas de ids das buscas (items/cache_busca.py): nova versão a cada mudança
+        for sinal in (post_save, post_delete):
+            sinal.connect(cache_busca.invalidar, sender=Item)
+            sinal.connect(cache_busca.invalidar, sender=Categoria)
@@ -0,0 +1,332 @@
+"""
+Busca textual de itens (título, descrição e local) com índice full-text plugável.
+
+`filtro_texto(q)` devolve um Q para compor com os demais filtros das views. O backend
+é escolhido por BUSCA_TEXTO_BACKEND (caminho importável) ou, se vazio, pelo banco:
+- SQLite: tabela virtual FTS5 `find_item_fts` (rowid = id do item), sem acentos,
+  mantida por gatilhos de insert/update/delete em mainpage_item. Migrações que recriam
+  a tabela de itens no SQLite descartam os gatilhos, então garantir_gatilhos roda
+  também no post_migrate;
+- MySQL: índice FULLTEXT (titulo, descricao, local) consultado com MATCH ... AGAINST
+  em modo booleano; o próprio InnoDB mantém o índice;
+- outros bancos, ou SQLite sem FTS5: `icontains` nos três campos.
+
+Cada palavra da consulta vira um prefixo obrigatório ("guarda chu" acha
+"Guarda-chuva"), então o custo da busca depende do índice e não do tamanho da tabela.
+
+Para tolerar erros de digitação e pedaços de palavra ("garafa termica", "chuva"),
+filtro_texto também aceita itens que compartilham ao menos BUSCA_TRIGRAMA_MINIMA dos
+trigramas da consulta (tabela TrigramaItem, indexada por trigrama e mantida no
+Item.save). ordenar_por_similaridade ordena por essa fração.
+
+ranquear pagina por relevância: o backend pontua o texto no próprio índice, com peso
+por campo (título > descrição > local; bm25 ponderado no FTS5), e as
+BUSCA_RANKING_CANDIDATOS melhores ganham em Python um fator de recência (meia-vida
+pela data do item) e um bônus para casos em aberto.
+"""
+import datetime
+import math
+
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Case, Count, F, FloatField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Cast, Coalesce
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from items.texto import normalizar, trigramas
+
+TABELA_ITENS = "mainpage_item"
+TABELA_FTS = "find_item_fts"
+PESOS_CAMPOS = {"titulo": 10.0, "descricao": 4.0, "local": 1.0}
+GATILHOS_FTS5 = {
+    f"{TABELA_FTS}_ai": f"""AFTER INSERT ON {TABELA_ITENS} BEGIN
+        INSERT INTO {TABELA_FTS}(rowid, titulo, descricao, local) VALUES (new.id, new.titulo, new.descricao, new.local);
+    END""",
+    f"{TABELA_FTS}_ad": f"""AFTER DELETE ON {TABELA_ITENS} BEGIN
+        DELETE FROM {TABELA_FTS} WHERE rowid = old.id;
+    END""",
+    f"{TABELA_FTS}_au": f"""AFTER UPDATE OF titulo, descricao, local ON {TABELA_ITENS} BEGIN
+        DELETE FROM {TABELA_FTS} WHERE rowid = old.id;
+        INSERT INTO {TABELA_FTS}(rowid, titulo, descricao, local) VALUES (new.id, new.titulo, new.descricao, new.local);
+    END""",
+}
+
+
+class BuscaTextoBackend:
+    """
+    Interface: `filtro(q)` -> Q sobre Item; `relevancia(q)` -> expressão com a
+    pontuação textual (maior = melhor, 0 se não casa); `reconstruir()` refaz o índice.
+    """
+    nome = "icontains"
+
+    def palavras(self, q):
+        return normalizar(q).split()
+
+    def filtro(self, q):
+        return Q(titulo__icontains=q) | Q(descricao__icontains=q) | Q(local__icontains=q)
+
+    def relevancia(self, q):
+        """Soma dos pesos dos campos que contêm cada palavra."""
+        total = Value(0.0)
+        for palavra in q.split():
+            for campo, peso in PESOS_CAMPOS.items():
+                total = total + Case(
+                    When(Q(**{f"{campo}__icontains": palavra}), then=Value(peso)),
+                    default=Value(0.0), output_field=FloatField(),
+                )
+        return total
+
+    def reconstruir(self, conexao=None):
+        return 0
+
+
+class BuscaTextoFTS5(BuscaTextoBackend):
+    """SQLite FTS5 (tokenizer unicode61 sem diacríticos)."""
+    nome = "fts5"
+
+    def filtro(self, q):
+        palavras = self.palavras(q)
+        if not palavras:
+            return Q(pk__in=[])
+        expressao = " ".join(f'"{palavra}"*' for palavra in palavras)
+        return Q(pk__in=RawSQL(f"SELECT rowid FROM {TABELA_FTS} WHERE {TABELA_FTS} MATCH %s", [expressao]))
+
+    def relevancia(self, q):
+        """bm25 do FTS5 com peso por coluna (o FTS5 devolve negativo: menor = melhor)."""
+        palavras = self.palavras(q)
+        if not palavras:
+            return Value(0.0)
+        expressao = " ".join(f'"{palavra}"*' for palavra in palavras)
+        pesos = ", ".join(str(peso) for peso in PESOS_CAMPOS.values())
+        return Coalesce(RawSQL(
+            f"SELECT -bm25({TABELA_FTS}, {pesos}) FROM {TABELA_FTS} "
+            f"WHERE {TABELA_FTS} MATCH %s AND rowid = {TABELA_ITENS}.id",
+            [expressao], output_field=FloatField(),
+        ), Value(0.0))
+
+    def reconstruir(self, conexao=None):
+        with (conexao or connection).cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABELA_FTS}")
+            cursor.execute(
+                f"INSERT INTO {TABELA_FTS}(rowid, titulo, descricao, local) "
+                f"SELECT id, titulo, descricao, local FROM {TABELA_ITENS}"
+            )
+            cursor.execute(f"INSERT INTO {TABELA_FTS}({TABELA_FTS}) VALUES ('optimize')")
+            cursor.execute(f"SELECT count(*) FROM {TABELA_FTS}")
+            return cursor.fetchone()[0]
+
+
+class BuscaTextoFullText(BuscaTextoBackend):
+    """MySQL FULLTEXT em modo booleano; palavras abaixo do tamanho mínimo do InnoDB usam icontains."""
+    nome = "fulltext"
+    MINIMO = 3  # innodb_ft_min_token_size padrão
+
+    def filtro(self, q):
+        palavras = self.palavras(q)
+        if not palavras:
+            return Q(pk__in=[])
+        longas = [p for p in palavras if len(p) >= self.MINIMO]
+        filtro = Q()
+        if longas:
+            expressao = " ".join(f"+{palavra}*" for palavra in longas)
+            filtro &= Q(pk__in=RawSQL(
+                f"SELECT id FROM {TABELA_ITENS} WHERE MATCH(titulo, descricao, local) AGAINST (%s IN BOOLEAN MODE)",
+                [expressao],
+            ))
+        for palavra in palavras:
+            if len(palavra) < self.MINIMO:
+                filtro &= super().filtro(palavra)
+        return filtro
+
+    def relevancia(self, q):
+        """Relevância do MATCH (um índice só para os três campos) + pesos por campo."""
+        longas = [p for p in self.palavras(q) if len(p) >= self.MINIMO]
+        if not longas:
+            return super().relevancia(q)
+        expressao = " ".join(f"{palavra}*" for palavra in longas)
+        return super().relevancia(q) + RawSQL(
+            "MATCH(titulo, descricao, local) AGAINST (%s IN BOOLEAN MODE)", [expressao], output_field=FloatField()
+        )
+
+    def reconstruir(self, conexao=None):
+        with (conexao or connection).cursor() as cursor:
+            cursor.execute(f"OPTIMIZE TABLE {TABELA_ITENS}")
+            cursor.execute(f"SELECT count(*) FROM {TABELA_ITENS}")
+            return cursor.fetchone()[0]
+
+
+_fts5_por_banco = {}
+
+
+def tem_fts5(conexao=None, tabela=TABELA_FTS):
+    """
+    A tabela FTS5 existe neste banco? (a migração a pula se o SQLite não tiver FTS5)
+    A resposta, positiva ou negativa, fica memorizada até o próximo post_migrate.
+    """
+    conexao = conexao or connection
+    if conexao.vendor != "sqlite":
+        return False
+    chave = (conexao.settings_dict["NAME"], tabela)
+    if chave not in _fts5_por_banco:
+        with conexao.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [tabela])
+            _fts5_por_banco[chave] = cursor.fetchone() is not None
+    return _fts5_por_banco[chave]
+
+
+def criar_gatilhos_faltando(conexao, tabela, gatilhos):
+    """Cria em `tabela` os gatilhos de `gatilhos` ({nome: definição}) que não existem. Retorna quantos."""
+    with conexao.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s", [tabela])
+        existentes = {linha[0] for linha in cursor.fetchall()}
+        faltando = [nome for nome in gatilhos if nome not in existentes]
+        for nome in faltando:
+            cursor.execute(f"CREATE TRIGGER {nome} {gatilhos[nome]}")
+    return len(faltando)
+
+
+def garantir_gatilhos(conexao=None):
+    """
+    Cria os gatilhos FTS5 que estiverem faltando; se faltava algum, o conteúdo do
+    índice pode estar desatualizado e é reconstruído. Retorna True nesse caso.
+    """
+    conexao = conexao or connection
+    if not tem_fts5(conexao):
+        return False
+    faltando = criar_gatilhos_faltando(conexao, TABELA_ITENS, GATILHOS_FTS5)
+    if faltando:
+        BuscaTextoFTS5().reconstruir(conexao)
+    return bool(faltando)
+
+
+def sincronizar_apos_migrate(sender=None, using="default", **kwargs):
+    _fts5_por_banco.clear()  # a migração pode ter criado (ou removido) as tabelas FTS5
+    garantir_gatilhos(connections[using])
+
+
+def obter_backend():
+    caminho = getattr(settings, "BUSCA_TEXTO_BACKEND", "")
+    if caminho:
+        return import_string(caminho)()
+    if tem_fts5():
+        return BuscaTextoFTS5()
+    if connection.vendor == "mysql":
+        return BuscaTextoFullText()
+    return BuscaTextoBackend()
+
+
+def _trigramas_em_comum(trigramas_consulta):
+    """Subconsulta (item_id, n) com quantos trigramas da consulta cada item tem."""
+    from items.models import TrigramaItem
+
+    return TrigramaItem.objects.filter(trigrama__in=trigramas_consulta).values('item_id').annotate(n=Count('id'))
+
+
+def filtro_trigramas(q):
+    """Q dos itens com ao menos BUSCA_TRIGRAMA_MINIMA dos trigramas de `q`."""
+    trigramas_consulta = trigramas(q)
+    if not trigramas_consulta:
+        return Q(pk__in=[])
+    minimo = math.ceil(len(trigramas_consulta) * getattr(settings, "BUSCA_TRIGRAMA_MINIMA", 0.7))
+    ids = _trigramas_em_comum(trigramas_consulta).filter(n__gte=max(1, minimo)).values('item_id')
+    return Q(pk__in=ids)
+
+
+def _similaridade(trigramas_consulta):
+    """Expressão 0-1: fração dos trigramas da consulta presentes no item."""
+    comum = _trigramas_em_comum(trigramas_consulta).filter(item_id=OuterRef('pk')).values('n')
+    return Cast(Coalesce(Subquery(comum), 0), FloatField()) / Value(float(len(trigramas_consulta)))
+
+
+def ordenar_por_similaridade(qs, q):
+    """Anota `similaridade_texto` (0-1, fração dos trigramas de `q` no item) e ordena por ela."""
+    trigramas_consulta = trigramas(q)
+    if not trigramas_consulta:
+        return qs
+    return qs.annotate(
+        similaridade_texto=_similaridade(trigramas_consulta)
+    ).order_by(F('similaridade_texto').desc(), '-id')
+
+
+# -----------------------------
+# Ranking por relevância
+# -----------------------------
+STATUS_ABERTOS = ("perdido", "achado")
+PESO_INDICE = 0.7  # o resto é a similaridade por trigramas (erros de digitação)
+
+
+def pontuar(relevancia, maior_relevancia, similaridade, data, status, hoje=None):
+    """
+    Pontuação 0-100: texto (relevância do índice normalizada pela maior entre os
+    candidatos + trigramas) x recência (meia-vida BUSCA_RANKING_MEIA_VIDA_DIAS, a
+    partir de 60%) x bônus BUSCA_RANKING_BONUS_ABERTO para itens ainda não devolvidos.
+    """
+    texto = PESO_INDICE * (relevancia / maior_relevancia if maior_relevancia else 0.0)
+    texto += (1 - PESO_INDICE) * (similaridade or 0.0)
+    idade = max(0, ((hoje or datetime.date.today()) - data).days) if data else 0
+    meia_vida = getattr(settings, "BUSCA_RANKING_MEIA_VIDA_DIAS", 30)
+    recencia = 0.6 + 0.4 * 0.5 ** (idade / meia_vida) if meia_vida > 0 else 1.0
+    bonus = getattr(settings, "BUSCA_RANKING_BONUS_ABERTO", 1.25)
+    fator_status = 1.0 if status in STATUS_ABERTOS else 1.0 / bonus
+    return 100 * texto * recencia * fator_status
+
+
+def ranquear(qs, q, inicio, quantidade):
+    """
+    Itens [inicio, inicio + quantidade) de `qs` (já filtrado) por relevância para `q`,
+    cada um com `.relevancia` (0-100), e se há mais. Só as BUSCA_RANKING_CANDIDATOS
+    melhores pela pontuação do índice são repontuadas; as seguintes mantêm essa ordem
+    e ficam com `.relevancia = None`.
+    """
+    trigramas_consulta = trigramas(q)
+    similaridade = _similaridade(trigramas_consulta) if trigramas_consulta else Value(0.0)
+    ordenado = qs.order_by().annotate(
+        relevancia_texto=obter_backend().relevancia(q), similaridade_texto=similaridade,
+    ).order_by(F('relevancia_texto').desc(), F('similaridade_texto').desc(), '-id')
+
+    limite = getattr(settings, "BUSCA_RANKING_CANDIDATOS", 200)
+    candidatos = list(ordenado.values_list("id", "relevancia_texto", "similaridade_texto", "data", "status")[:limite])
+    maior = max((c[1] for c in candidatos), default=0.0)
+    pontos = {c[0]: pontuar(c[1], maior, c[2], c[3], c[4]) for c in candidatos}
+    ids = sorted(pontos, key=lambda item_id: (-pontos[item_id], -item_id))
+
+    fim = inicio + quantidade + 1  # um a mais para saber se há próxima página
+    pagina = ids[inicio:fim]
+    if fim > limite and len(candidatos) == limite:
+        pagina += list(ordenado.values_list("id", flat=True)[max(inicio, limite):fim])
+
+    por_id = qs.order_by().in_bulk(pagina)
+    itens = []
+    for item_id in pagina[:quantidade]:
+        item = por_id[item_id]
+        item.relevancia = round(pontos[item_id], 1) if item_id in pontos else None
+        itens.append(item)
+    return itens, len(pagina) > quantidade
+
+
+def reconstruir_trigramas():
+    """Recalcula texto_normalizado e trigramas de todos os itens. Retorna quantos."""
+    from items.models import Item, TrigramaItem
+
+    total = 0
+    lote = {}
+    for item in Item.objects.only('id', 'titulo', 'descricao', 'local', 'texto_normalizado').iterator(chunk_size=500):
+        texto = normalizar(f"{item.titulo} {item.descricao} {item.local}")
+        if texto != item.texto_normalizado:
+            Item.objects.filter(pk=item.pk).update(texto_normalizado=texto)
+        lote[item.pk] = texto
+        total += 1
+        if len(lote) >= 500:
+            TrigramaItem.substituir(lote)
+            lote = {}
+    TrigramaItem.substituir(lote)
+    return total
+
+
+def filtro_texto(q):
+    """
+    Q que casa os itens cujo título, descrição ou local contêm as palavras de `q`
+    (índice full-text) ou se parecem com elas (trigramas).
+    """
+    return obter_backend().filtro(q) | filtro_trigramas(q)
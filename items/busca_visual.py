@@ -0,0 +1,730 @@
+"""
+Busca visual de itens.
+
+Orquestra as duas estratégias de busca por imagem:
+- Gemini: descreve a foto e faz busca textual pelas palavras-chave retornadas.
+- Local: pHash + descritor visual compacto num índice em memória (items/indice_visual.py).
+
+A chamada ao Gemini roda em paralelo com a busca local e só é usada se responder
+dentro do orçamento de latência (BUSCA_VISUAL_ORCAMENTO). Um disjuntor suspende
+as chamadas quando a API fica lenta ou falha repetidamente.
+
+Os resultados (ids + similaridade) ficam em cache pelo SHA-256 dos bytes da foto
+(consultado antes de decodificar e da admissão) e pelo pHash, mais parâmetros e
+versão do catálogo. Consultas simultâneas com a mesma foto no mesmo processo são
+agrupadas: só uma ocupa vaga e calcula, as outras esperam o resultado dela.
+
+A decodificação da foto (PIL/NumPy) roda num pool de processos dedicado
+(BUSCA_VISUAL_WORKERS) em cada processo web; a thread da requisição espera o
+resultado. A admissão tem dois limites: o do processo (workers + BUSCA_VISUAL_FILA,
+a capacidade do pool dele) e o global, somado entre todos os processos num contador
+do cache compartilhado (BUSCA_VISUAL_LIMITE_GLOBAL). Acima de qualquer um a busca
+falha rápido com BuscaVisualSaturada (503 + Retry-After nas views). Para que mais de
+uma busca por processo chegue à fila, o gunicorn roda com workers gthread (start.sh).
+
+A busca em lote (buscar_lote, usada na triagem dos bolsistas) reserva uma vaga de
+admissão por foto que pode ter no pool ao mesmo tempo (BUSCA_VISUAL_LOTE_PARALELO),
+decodifica as fotos nessas vagas dentro de um orçamento próprio para o lote inteiro
+(BUSCA_VISUAL_LOTE_ORCAMENTO) e consulta um único snapshot do índice.
+
+Com um Rastreio (modo trace, só para administradores), buscar_pagina registra o tempo
+de cada etapa (leitura, fila, decodificação, índice, pontuação, Gemini, hidratação),
+bytes lidos, linhas pontuadas e qual estratégia respondeu.
+"""
+import base64
+import hashlib
+import multiprocessing
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+GEMINI_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent"
+GEMINI_PROMPT = (
+    "Identifique o objeto principal desta imagem. Retorne apenas uma descrição curta "
+    "com o nome do objeto, cor principal e material em português. Exemplo: 'mochila preta de nylon'."
+)
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="gemini")
+_sessao = None
+_sessao_lock = threading.Lock()
+
+
+# -----------------------------
+# HTTP / Gemini
+# -----------------------------
+def _sessao_http():
+    """Retorna uma requests.Session compartilhada (reaproveita conexões TLS)."""
+    global _sessao
+    if _sessao is None:
+        with _sessao_lock:
+            if _sessao is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                sessao = requests.Session()
+                adapter = HTTPAdapter(pool_connections=2, pool_maxsize=8)
+                sessao.mount("https://", adapter)
+                _sessao = sessao
+    return _sessao
+
+
+class DisjuntorGemini:
+    """
+    Circuit breaker simples para a API do Gemini.
+    Após `limite_falhas` falhas/lentidões consecutivas, fica aberto por `pausa` segundos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._falhas = 0
+        self._aberto_ate = 0.0
+
+    def permite(self):
+        with self._lock:
+            return time.monotonic() >= self._aberto_ate
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self._falhas = 0
+            self._aberto_ate = 0.0
+
+    def registrar_falha(self):
+        limite = getattr(settings, "GEMINI_DISJUNTOR_FALHAS", 3)
+        pausa = getattr(settings, "GEMINI_DISJUNTOR_PAUSA", 60)
+        with self._lock:
+            self._falhas += 1
+            if self._falhas >= limite:
+                self._aberto_ate = time.monotonic() + pausa
+                self._falhas = 0
+
+
+disjuntor = DisjuntorGemini()
+
+
+def descrever_com_gemini(jpeg, api_key, prompt=GEMINI_PROMPT, timeout=None):
+    """Envia a imagem (JPEG já reduzido) ao Gemini e retorna o texto da resposta ao `prompt`."""
+    img_base64 = base64.b64encode(jpeg).decode("utf-8")
+    payload = {
+        "contents": [{
+            "parts": [
+                {"text": prompt},
+                {"inlineData": {"mimeType": "image/jpeg", "data": img_base64}}
+            ]
+        }]
+    }
+    headers = {"Content-Type": "application/json", "x-goog-api-key": api_key}
+    timeout = timeout or getattr(settings, "GEMINI_TIMEOUT", 4.0)
+
+    response = _sessao_http().post(GEMINI_URL, headers=headers, json=payload, timeout=(2, timeout))
+    response.raise_for_status()
+    res = response.json()
+    return res['candidates'][0]['content']['parts'][0]['text'].strip()
+
+
+def _chamar_gemini_monitorado(jpeg, api_key, orcamento):
+    """Executa a chamada ao Gemini alimentando o disjuntor com o resultado."""
+    inicio = time.monotonic()
+    try:
+        descricao = descrever_com_gemini(jpeg, api_key)
+    except Exception:
+        disjuntor.registrar_falha()
+        raise
+    if time.monotonic() - inicio > orcamento:
+        disjuntor.registrar_falha()  # respondeu, mas tarde demais para ser usada
+    else:
+        disjuntor.registrar_sucesso()
+    return descricao
+
+
+# -----------------------------
+# Modo trace
+# -----------------------------
+class Rastreio:
+    """Tempos por etapa (ms) e contadores de uma busca visual, para diagnóstico."""
+
+    def __init__(self):
+        self._inicio = time.perf_counter()
+        self.etapas = {}
+        self.dados = {}
+
+    @contextmanager
+    def etapa(self, nome):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(nome, time.perf_counter() - inicio)
+
+    def registrar(self, nome, segundos):
+        self.etapas[nome] = round(self.etapas.get(nome, 0.0) + max(0.0, segundos) * 1000, 2)
+
+    def anotar(self, **dados):
+        self.dados.update(dados)
+
+    def resumo(self):
+        return {
+            "total_ms": round((time.perf_counter() - self._inicio) * 1000, 2),
+            "etapas_ms": dict(self.etapas),
+            **self.dados,
+        }
+
+
+# -----------------------------
+# Pool de processos e controle de admissão
+# -----------------------------
+CHAVE_ADMISSAO = "busca_visual:admissao"
+
+
+class BuscaVisualSaturada(Exception):
+    """Há mais buscas visuais em andamento do que o pool + fila comportam."""
+
+    def __init__(self, retry_after=5):
+        super().__init__("Busca visual sobrecarregada, tente novamente em instantes.")
+        self.retry_after = retry_after
+
+
+class ControleAdmissao:
+    """
+    Limita quantas buscas visuais podem estar em andamento (no pool ou na fila),
+    neste processo e somando todos os processos, e guarda métricas de espera na fila.
+
+    O contador global fica no cache `default` (CHAVE_ADMISSAO), atômico com Redis.
+    Ele expira em BUSCA_VISUAL_ADMISSAO_TTL segundos sem novas reservas, então as
+    vagas presas por um processo que morreu no meio de uma busca se recuperam sozinhas.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ativas = 0
+        self.admitidas = 0
+        self.rejeitadas = 0
+        self.esperas = deque(maxlen=500)
+
+    def limite(self):
+        workers = max(1, getattr(settings, "BUSCA_VISUAL_WORKERS", 2))
+        return workers + max(0, getattr(settings, "BUSCA_VISUAL_FILA", 8))
+
+    def limite_global(self):
+        return getattr(settings, "BUSCA_VISUAL_LIMITE_GLOBAL", 0) or self.limite()
+
+    def _reservar_global(self, vagas):
+        cache.add(CHAVE_ADMISSAO, 0, getattr(settings, "BUSCA_VISUAL_ADMISSAO_TTL", 60))
+        try:
+            ocupadas = cache.incr(CHAVE_ADMISSAO, vagas)
+        except ValueError:  # expirou entre o add e o incr
+            cache.add(CHAVE_ADMISSAO, vagas, getattr(settings, "BUSCA_VISUAL_ADMISSAO_TTL", 60))
+            ocupadas = vagas
+        if ocupadas > self.limite_global():
+            self._liberar_global(vagas)
+            return False
+        return True
+
+    def _liberar_global(self, vagas):
+        try:
+            cache.decr(CHAVE_ADMISSAO, vagas)
+        except ValueError:  # expirou: nada a devolver
+            pass
+
+    def entrar(self, vagas=1):
+        """Reserva `vagas` (um lote reserva uma por foto que pode ter no pool ao mesmo tempo)."""
+        with self._lock:
+            if self.ativas + vagas > self.limite() or not self._reservar_global(vagas):
+                self.rejeitadas += 1
+                raise BuscaVisualSaturada(getattr(settings, "BUSCA_VISUAL_RETRY_AFTER", 5))
+            self.ativas += vagas
+            self.admitidas += 1
+
+    def sair(self, vagas=1):
+        with self._lock:
+            self.ativas -= vagas
+        self._liberar_global(vagas)
+
+    def registrar_espera(self, segundos):
+        with self._lock:
+            self.esperas.append(max(0.0, segundos))
+
+    def metricas(self):
+        with self._lock:
+            esperas = sorted(self.esperas)
+            ativas, admitidas, rejeitadas = self.ativas, self.admitidas, self.rejeitadas
+
+        def percentil(p):
+            if not esperas:
+                return 0.0
+            return round(esperas[min(len(esperas) - 1, int(len(esperas) * p))] * 1000, 1)
+
+        return {
+            "ativas": ativas,
+            "limite": self.limite(),
+            "ativas_global": cache.get(CHAVE_ADMISSAO, 0),
+            "limite_global": self.limite_global(),
+            "admitidas": admitidas,
+            "rejeitadas": rejeitadas,
+            "espera_fila_p50_ms": percentil(0.50),
+            "espera_fila_p95_ms": percentil(0.95),
+            "espera_fila_max_ms": round(esperas[-1] * 1000, 1) if esperas else 0.0,
+        }
+
+
+admissao = ControleAdmissao()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _pool_processos():
+    """Pool de processos da busca visual (None com BUSCA_VISUAL_WORKERS=0: roda na própria thread)."""
+    global _pool
+    workers = getattr(settings, "BUSCA_VISUAL_WORKERS", 2)
+    if workers <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: os filhos não herdam a conexão com o banco nem threads do processo web
+                _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _descartar_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _executar_no_pool(funcao, *args, rastreio=None):
+    """
+    Roda `funcao(*args)` no pool de processos (ou na própria thread sem pool) e mede
+    a espera na fila. Se a espera estourar o orçamento, levanta BuscaVisualSaturada.
+    """
+    from items.descritores import executar_medindo
+
+    pool = _pool_processos()
+    enviado = time.time()
+    if pool is None:
+        inicio, resultado = executar_medindo(funcao, *args)
+    else:
+        try:
+            futuro = pool.submit(executar_medindo, funcao, *args)
+            inicio, resultado = futuro.result(timeout=getattr(settings, "BUSCA_VISUAL_ORCAMENTO", 3.0))
+        except FuturesTimeout:
+            futuro.cancel()
+            raise BuscaVisualSaturada(getattr(settings, "BUSCA_VISUAL_RETRY_AFTER", 5))
+        except BrokenProcessPool:
+            # um worker morreu: recria o pool na próxima busca e atende esta aqui mesmo
+            _descartar_pool()
+            inicio, resultado = executar_medindo(funcao, *args)
+    admissao.registrar_espera(inicio - enviado)
+    if rastreio is not None:
+        rastreio.registrar("fila", inicio - enviado)
+        rastreio.registrar("decodificacao", time.time() - inicio)
+    return resultado
+
+
+def analisar_consulta(dados, com_gemini=False, rastreio=None):
+    """
+    Decodifica a foto no pool de processos e retorna (pHash hex, descritor, JPEG
+    reduzido ou None, impressão multi-hash), ou None se a imagem for ilegível. Deve ser chamada com a
+    admissão já concedida; se a espera na fila estourar o orçamento, levanta
+    BuscaVisualSaturada.
+    """
+    from items.descritores import analisar_consulta as analisar
+
+    max_lado = getattr(settings, "GEMINI_MAX_LADO", 768) if com_gemini else 0
+    return _executar_no_pool(analisar, dados, max_lado, rastreio=rastreio)
+
+
+def extrair_caracteristicas(dados):
+    """
+    Características completas da foto de um cadastro (descritores.extrair_caracteristicas)
+    calculadas no pool de processos, com admissão própria. Retorna None se a imagem
+    for ilegível; levanta BuscaVisualSaturada se o pool estiver lotado.
+    """
+    from items.descritores import extrair_caracteristicas_ou_erro
+
+    admissao.entrar()
+    try:
+        caracteristicas = _executar_no_pool(extrair_caracteristicas_ou_erro, dados)
+    finally:
+        admissao.sair()
+    return None if 'erro' in caracteristicas else caracteristicas
+
+
+def vagas_lote(quantidade):
+    """
+    Quantas fotos de um lote podem estar no pool ao mesmo tempo: no máximo
+    BUSCA_VISUAL_LOTE_PARALELO (padrão: metade dos workers), para sobrar worker
+    para as buscas avulsas.
+    """
+    workers = max(1, getattr(settings, "BUSCA_VISUAL_WORKERS", 2))
+    paralelo = getattr(settings, "BUSCA_VISUAL_LOTE_PARALELO", max(1, workers // 2))
+    return max(1, min(quantidade, paralelo, workers))
+
+
+def analisar_lote(lista_dados):
+    """
+    Como analisar_consulta (sem Gemini), mas para várias fotos de uma vez. Só
+    vagas_lote(n) fotos ficam no pool ao mesmo tempo; cada uma que termina libera a
+    vez da próxima. Deve ser chamada com essas vagas já reservadas na admissão.
+    Retorna a lista de consultas (None para fotos ilegíveis); se o lote inteiro não
+    terminar em BUSCA_VISUAL_LOTE_ORCAMENTO segundos, levanta BuscaVisualSaturada.
+    """
+    from items.descritores import analisar_consulta as analisar, executar_medindo
+
+    pool = _pool_processos()
+    if pool is None or len(lista_dados) < 2:
+        return [analisar_consulta(dados) for dados in lista_dados]
+
+    vagas = vagas_lote(len(lista_dados))
+    # orçamento próprio do lote inteiro, independente de quantas rodadas as vagas fazem
+    prazo = time.monotonic() + getattr(settings, "BUSCA_VISUAL_LOTE_ORCAMENTO", 10.0)
+    pendentes = deque()
+    consultas = []
+    try:
+        for dados in lista_dados:
+            if len(pendentes) >= vagas:
+                consultas.append(_resultado_lote(*pendentes.popleft(), prazo))
+            pendentes.append((pool.submit(executar_medindo, analisar, dados, 0), time.time()))
+        while pendentes:
+            consultas.append(_resultado_lote(*pendentes.popleft(), prazo))
+    except FuturesTimeout:
+        for futuro, _ in pendentes:
+            futuro.cancel()
+        raise BuscaVisualSaturada(getattr(settings, "BUSCA_VISUAL_RETRY_AFTER", 5))
+    except BrokenProcessPool:
+        _descartar_pool()
+        return [analisar(dados) for dados in lista_dados]
+    return consultas
+
+
+def _resultado_lote(futuro, enviado, prazo):
+    inicio, resultado = futuro.result(timeout=max(0.0, prazo - time.monotonic()))
+    admissao.registrar_espera(inicio - enviado)
+    return resultado
+
+
+# -----------------------------
+# Estratégias de busca
+# -----------------------------
+def filtrar_queryset(qs, filtros=None, prefixo=""):
+    """Aplica os filtros da busca visual (status, categoria, datas, cor) a um queryset."""
+    filtros = filtros or {}
+    condicoes = {}
+    if filtros.get("status"):
+        condicoes[f"{prefixo}status__in"] = filtros["status"]
+    if filtros.get("categoria") is not None:
+        condicoes[f"{prefixo}categoria_id"] = filtros["categoria"]
+    if filtros.get("data_inicio"):
+        condicoes[f"{prefixo}data__gte"] = filtros["data_inicio"]
+    if filtros.get("data_fim"):
+        condicoes[f"{prefixo}data__lte"] = filtros["data_fim"]
+    if filtros.get("cor"):
+        condicoes[f"{prefixo}cores__cor"] = filtros["cor"]
+    return qs.filter(**condicoes) if condicoes else qs
+
+
+def buscar_por_descricao(descricao_ia, limite=20, filtros=None):
+    """
+    Busca textual a partir da descrição retornada pela IA: casa as palavras com o
+    texto dos itens e com as tags geradas das fotos (TagItem, consulta indexada).
+    """
+    from django.db.models import Count
+    from items.busca_texto import filtro_texto
+    from items.models import Item, TagItem
+    from items.texto import tokens
+
+    # Remove palavras curtas (de, com, em, um, uma, o, a)
+    palavras = [p.lower() for p in descricao_ia.split() if len(p) > 2]
+    if not palavras:
+        return []
+
+    # todas as palavras no título/descrição/local, pelo índice full-text
+    query = filtro_texto(" ".join(palavras))
+
+    # itens cujas tags cobrem ao menos metade das palavras da descrição
+    palavras_tags = tokens(descricao_ia)
+    por_tags = {}
+    if palavras_tags:
+        tags_qs = filtrar_queryset(TagItem.objects.filter(tag__in=palavras_tags), filtros, prefixo="item__")
+        por_tags = dict(
+            tags_qs.values('item_id').annotate(n=Count('id'))
+            .filter(n__gte=max(1, len(palavras_tags) // 2)).order_by('-n')
+            .values_list('item_id', 'n')[:limite]
+        )
+
+    itens_encontrados = filtrar_queryset(Item.objects.filter(query | Q(pk__in=list(por_tags))), filtros)
+    itens_encontrados = itens_encontrados.select_related('usuario', 'categoria')[:limite]
+
+    # Similaridade: fração das palavras-chave que deram match no texto ou nas tags
+    resultados = []
+    for item in itens_encontrados:
+        texto_item = f"{item.titulo} {item.descricao} {item.local}".lower()
+        matches = sum(1 for palavra in palavras if palavra in texto_item)
+        sim_txt = (matches / len(palavras)) * 100
+        if item.pk in por_tags:
+            sim_txt = max(sim_txt, por_tags[item.pk] / len(palavras_tags) * 100)
+        resultados.append((item, round(sim_txt, 1)))
+
+    resultados.sort(key=lambda x: x[1], reverse=True)
+    return resultados
+
+
+def _permitidos_por_cor(filtros):
+    """Ids dos itens da cor filtrada (consulta indexada em CorItem), ou None sem filtro de cor."""
+    from items.models import CorItem
+
+    if not (filtros or {}).get("cor"):
+        return None
+    return list(CorItem.objects.filter(cor=filtros["cor"]).values_list('item_id', flat=True))
+
+
+def _buscar_ids_local(consulta, limite, filtros=None, indice=None, permitidos=None, rastreio=None):
+    """
+    Busca local no índice em memória. `indice` e `permitidos` podem vir prontos
+    (busca em lote); senão são obtidos aqui.
+    """
+    from items.descritores import impressao_para_bits
+    from items.indice_visual import obter_indice
+
+    if consulta is None:
+        return []
+    rastreio = rastreio or Rastreio()
+    filtros = filtros or {}
+    if permitidos is None:
+        # pré-filtro por cor, sem decodificar imagens
+        with rastreio.etapa("filtro_cor"):
+            permitidos = _permitidos_por_cor(filtros)
+    if permitidos is not None and not permitidos:
+        return []
+    _, descritor, _, impressao = consulta
+    if indice is None:
+        with rastreio.etapa("indice"):
+            indice = obter_indice()
+    # status/categoria/datas viram máscara no índice, antes da pontuação
+    with rastreio.etapa("pontuacao"):
+        return indice.buscar(descritor, impressao_para_bits(impressao), limite=limite,
+                             permitidos=permitidos, filtros=filtros, rastreio=rastreio)
+
+
+def _hidratar(pontuados):
+    """[(id, similaridade)] -> [(Item, similaridade)] numa única consulta, mantendo a ordem."""
+    from items.models import Item
+
+    if not pontuados:
+        return []
+    itens = Item.objects.select_related('usuario', 'categoria').in_bulk([item_id for item_id, _ in pontuados])
+    return [(itens[item_id], sim) for item_id, sim in pontuados if item_id in itens]
+
+
+def buscar_local(dados, limite=20):
+    """
+    Busca local: pHash + descritor visual compacto contra o índice em memória.
+    Nenhuma imagem do catálogo é decodificada durante a consulta.
+    """
+    from items.descritores import analisar_consulta as analisar
+
+    return _hidratar(_buscar_ids_local(analisar(dados), limite))
+
+
+# -----------------------------
+# Cache e agrupamento de consultas
+# -----------------------------
+_em_andamento = {}
+_em_andamento_lock = threading.Lock()
+
+
+def chave_cache(foto, limite, versao, filtros=None):
+    """Chave do cache: identificação da foto (pHash ou SHA-256 dos bytes) + parâmetros/filtros da busca + versão do catálogo."""
+    parametros = repr((limite, sorted((filtros or {}).items()), versao))
+    return f"busca_visual:{foto}:{hashlib.md5(parametros.encode()).hexdigest()}"
+
+
+def _agrupar(chave, calcular, espera):
+    """
+    Executa `calcular()` uma só vez por chave: chamadas simultâneas com a mesma
+    chave esperam (até `espera` segundos) o resultado da primeira.
+    """
+    with _em_andamento_lock:
+        futuro = _em_andamento.get(chave)
+        responsavel = futuro is None
+        if responsavel:
+            futuro = Future()
+            _em_andamento[chave] = futuro
+
+    if not responsavel:
+        return futuro.result(timeout=espera)
+
+    try:
+        resultado = calcular()
+        futuro.set_result(resultado)
+        return resultado
+    except BaseException as e:
+        futuro.set_exception(e)
+        raise
+    finally:
+        with _em_andamento_lock:
+            _em_andamento.pop(chave, None)
+
+
+def _calcular(consulta, limite, filtros=None, rastreio=None):
+    """
+    Executa a busca respeitando o orçamento de latência e retorna [(id, similaridade)].
+
+    Se houver GEMINI_API_KEY e o disjuntor estiver fechado, a chamada ao Gemini é
+    disparada em segundo plano enquanto a busca local roda na thread da requisição.
+    A resposta do Gemini só é usada se chegar dentro do orçamento; caso contrário
+    retorna o resultado local.
+    """
+    api_key = getattr(settings, 'GEMINI_API_KEY', '')
+    orcamento = getattr(settings, 'BUSCA_VISUAL_ORCAMENTO', 3.0)
+    rastreio = rastreio or Rastreio()
+    inicio = time.monotonic()
+
+    futuro = None
+    if consulta[2] is not None and disjuntor.permite():
+        futuro = _executor.submit(_chamar_gemini_monitorado, consulta[2], api_key, orcamento)
+        rastreio.anotar(gemini="enviado", bytes_gemini=len(consulta[2]))
+    else:
+        rastreio.anotar(gemini="desligado" if not api_key else "disjuntor_aberto")
+
+    resultados_locais = _buscar_ids_local(consulta, limite, filtros, rastreio=rastreio)
+
+    if futuro is not None:
+        restante = max(0.0, orcamento - (time.monotonic() - inicio))
+        try:
+            with rastreio.etapa("gemini_espera"):
+                descricao_ia = futuro.result(timeout=restante)
+            with rastreio.etapa("busca_texto"):
+                resultados_ia = buscar_por_descricao(descricao_ia, limite, filtros)
+            rastreio.anotar(gemini="ok", resultados_gemini=len(resultados_ia))
+            if resultados_ia:
+                rastreio.anotar(estrategia="gemini")
+                return [(item.pk, sim) for item, sim in resultados_ia]
+        except FuturesTimeout:
+            rastreio.anotar(gemini="timeout")  # Gemini lento: responde com o resultado local
+        except Exception:
+            rastreio.anotar(gemini="erro")  # Se falhar a API por qualquer motivo, fica com o resultado local
+
+    rastreio.anotar(estrategia="local")
+    return resultados_locais
+
+
+def buscar_pagina(imagem_file, inicio=0, limite=20, filtros=None, rastreio=None):
+    """
+    Busca visual paginada e com cache. Retorna ([(Item, similaridade)], has_more).
+
+    Uma janela de BUSCA_VISUAL_MAX_RESULTADOS resultados é calculada e guardada em
+    cache pelo SHA-256 dos bytes da foto + filtros + versão do catálogo: a mesma foto
+    (páginas seguintes, reenvios) sai do cache sem decodificar nem ocupar vaga de
+    admissão. Fotos diferentes com o mesmo pHash reaproveitam o cache pela chave do
+    pHash depois de decodificadas. Só a primeira de várias consultas simultâneas com a
+    mesma foto entra na admissão e calcula; as outras esperam o resultado dela.
+    Levanta BuscaVisualSaturada se o pool de busca estiver lotado. Com `rastreio`
+    (modo trace) o cache não é lido, para que todas as etapas rodem e sejam medidas.
+    """
+    from items.indice_visual import versao_catalogo
+
+    filtros = {chave: valor for chave, valor in (filtros or {}).items() if valor not in (None, "", [])}
+    janela = max(getattr(settings, 'BUSCA_VISUAL_MAX_RESULTADOS', 100), inicio + limite + 1)
+
+    medicao = rastreio or Rastreio()  # sem trace as medições são descartadas
+
+    with medicao.etapa("leitura"):
+        imagem_file.seek(0)
+        dados = imagem_file.read()
+    medicao.anotar(bytes_lidos=len(dados))
+
+    versao = versao_catalogo()
+    chave_bytes = chave_cache(f"sha256-{hashlib.sha256(dados).hexdigest()}", janela, versao, filtros)
+    ttl = getattr(settings, 'BUSCA_VISUAL_CACHE_TTL', 300)
+
+    def calcular():
+        admissao.entrar()
+        try:
+            api_key = getattr(settings, 'GEMINI_API_KEY', '')
+            consulta = analisar_consulta(dados, com_gemini=bool(api_key) and disjuntor.permite(), rastreio=medicao)
+            if consulta is None:
+                return None
+            if rastreio is not None:
+                rastreio.anotar(cache="ignorado")
+                return _calcular(consulta, janela, filtros, rastreio)
+            chave_phash = chave_cache(consulta[0], janela, versao, filtros)
+            resultado = cache.get(chave_phash)
+            if resultado is None:
+                resultado = _calcular(consulta, janela, filtros)
+                cache.set(chave_phash, resultado, ttl)
+            cache.set(chave_bytes, resultado, ttl)
+            return resultado
+        finally:
+            admissao.sair()
+
+    if rastreio is not None:
+        pontuados = calcular()
+    else:
+        pontuados = cache.get(chave_bytes)
+        if pontuados is None:
+            espera = getattr(settings, 'BUSCA_VISUAL_ORCAMENTO', 3.0) + 5
+            try:
+                pontuados = _agrupar(chave_bytes, calcular, espera)
+            except FuturesTimeout:
+                # a consulta idêntica que estamos esperando não terminou a tempo
+                raise BuscaVisualSaturada(getattr(settings, "BUSCA_VISUAL_RETRY_AFTER", 5))
+    if pontuados is None:
+        medicao.anotar(estrategia="imagem_invalida")
+        return [], False
+    with medicao.etapa("hidratacao"):
+        return _hidratar(pontuados[inicio:inicio + limite]), len(pontuados) > inicio + limite
+
+
+def buscar_lote(imagens, limite=5, filtros=None):
+    """
+    Busca visual local de várias fotos numa chamada (triagem de bolsistas).
+    Retorna uma lista, na ordem das fotos, com [(Item, similaridade)] ou None se a
+    foto for ilegível. Sem Gemini: índice, filtro de cor e hidratação são feitos uma
+    vez para o lote inteiro. Levanta BuscaVisualSaturada se o pool estiver lotado.
+    """
+    from items.indice_visual import obter_indice
+    from items.models import Item
+
+    filtros = {chave: valor for chave, valor in (filtros or {}).items() if valor not in (None, "", [])}
+    lista_dados = []
+    for imagem_file in imagens:
+        imagem_file.seek(0)
+        lista_dados.append(imagem_file.read())
+
+    vagas = vagas_lote(len(lista_dados))
+    admissao.entrar(vagas)
+    try:
+        consultas = analisar_lote(lista_dados)
+    finally:
+        admissao.sair(vagas)
+
+    indice = obter_indice()
+    permitidos = _permitidos_por_cor(filtros)
+    pontuados = [
+        None if consulta is None else _buscar_ids_local(consulta, limite, filtros, indice, permitidos)
+        for consulta in consultas
+    ]
+
+    ids = {item_id for lista in pontuados if lista for item_id, _ in lista}
+    itens = Item.objects.select_related('usuario', 'categoria').in_bulk(ids)
+    return [
+        None if lista is None else [(itens[item_id], sim) for item_id, sim in lista if item_id in itens]
+        for lista in pontuados
+    ]
+
+
+def buscar(imagem_file, limite=20, cor=None, filtros=None, rastreio=None):
+    """Primeira página da busca visual (ver buscar_pagina)."""
+    filtros = dict(filtros or {})
+    if cor is not None:
+        filtros["cor"] = cor
+    return buscar_pagina(imagem_file, inicio=0, limite=limite, filtros=filtros, rastreio=rastreio)[0]
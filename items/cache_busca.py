@@ -0,0 +1,87 @@
+"""
+Cache das buscas de itens (api_items e páginas de listagem).
+
+Cada página de resultado é guardada só como lista de ids (com a relevância, quando
+há busca textual) pela chave consulta normalizada + filtros + página + versão. Um
+acerto custa um get no cache e uma consulta por chave primária. As facetas da busca
+(items/facetas.py) ficam em cache pela mesma chave, sem a página.
+
+A versão é um contador no cache `default`, incrementado por `invalidar`: nos sinais
+de save/delete do Item (items/apps.py) e quando cores ou tags de um item são
+regravadas. Esse cache precisa ser compartilhado entre os processos (CACHES em
+find/settings.py: Redis ou a tabela do banco); com um cache local por processo, um
+worker do gunicorn não veria a invalidação feita por outro. As entradas antigas
+deixam de ser lidas e expiram em BUSCA_CACHE_TTL.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from items.texto import normalizar
+
+CHAVE_VERSAO = "busca_itens:versao"
+
+
+def versao():
+    atual = cache.get(CHAVE_VERSAO)
+    if atual is None:
+        # contador começa no relógio: se a chave for despejada, não repete versões antigas
+        cache.add(CHAVE_VERSAO, int(time.time() * 1000), None)
+        atual = cache.get(CHAVE_VERSAO)
+    return atual
+
+
+def invalidar(sender=None, **kwargs):
+    """Muda a versão das buscas (assinatura de receptor de sinal)."""
+    try:
+        cache.incr(CHAVE_VERSAO)
+    except ValueError:
+        versao()
+
+
+def chave(escopo, q, filtros, inicio, quantidade):
+    partes = repr((escopo, normalizar(q), sorted(filtros.items()), inicio, quantidade, versao()))
+    return f"busca_itens:{hashlib.md5(partes.encode()).hexdigest()}"
+
+
+def _limpar(filtros):
+    return {nome: valor for nome, valor in filtros.items() if valor not in (None, "")}
+
+
+def lembrar(escopo, q, filtros, calcular):
+    """Resultado pequeno e serializável (ex.: facetas) de uma busca, em cache."""
+    chave_valor = chave(escopo, q, _limpar(filtros), 0, 0)
+    valor = cache.get(chave_valor)
+    if valor is None:
+        valor = calcular()
+        cache.set(chave_valor, valor, getattr(settings, "BUSCA_CACHE_TTL", 300))
+    return valor
+
+
+def paginar(escopo, q, filtros, inicio, quantidade, calcular):
+    """
+    Página [inicio, inicio + quantidade) de uma busca. `calcular()` -> ([Item], tem_mais)
+    só roda sem acerto no cache. `filtros` é um dict com tudo o que, além de `q`,
+    muda o resultado.
+    """
+    from items.models import Item
+
+    chave_pagina = chave(escopo, q, _limpar(filtros), inicio, quantidade)
+    guardado = cache.get(chave_pagina)
+    if guardado is None:
+        itens, tem_mais = calcular()
+        ids = [(item.pk, getattr(item, "relevancia", None)) for item in itens]
+        cache.set(chave_pagina, (ids, tem_mais), getattr(settings, "BUSCA_CACHE_TTL", 300))
+        return itens, tem_mais
+
+    ids, tem_mais = guardado
+    por_id = Item.objects.select_related("usuario", "categoria").in_bulk([item_id for item_id, _ in ids])
+    itens = []
+    for item_id, relevancia in ids:
+        if item_id in por_id:
+            item = por_id[item_id]
+            item.relevancia = relevancia
+            itens.append(item)
+    return itens, tem_mais
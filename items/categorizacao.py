@@ -0,0 +1,198 @@
+"""
+Sugestão automática de categoria por vizinhos mais próximos (k-NN).
+
+Os itens já categorizados formam um índice em memória (por processo) com:
+- o descritor visual gravado (items/descritores.py), e
+- um vetor de texto (titulo + descricao) por hashing de palavras, normalizado.
+
+Um item sem categoria é comparado com todos por produto de matrizes; os k vizinhos
+mais parecidos votam (peso = similaridade) e a categoria vencedora é sugerida se
+tiver a maioria ponderada.
+
+A versão do índice considera só os itens categorizados, então cadastrar um item sem
+categoria não o invalida. Ela é conferida no máximo a cada CATEGORIA_INTERVALO
+segundos, ou logo depois de um save/delete de Item neste processo. Quando muda, os itens categorizados alterados desde a
+última versão (`atualizado_em`) entram no índice sem reconstruí-lo; remoções
+(contagem divergente) o reconstroem.
+"""
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+
+from items.descritores import DIMENSAO, bytes_para_descritor
+from items.texto import DIMENSAO_TEXTO, vetor_texto
+
+
+class IndiceCategorias:
+
+    def __init__(self, ids, categorias, textos, descritores, tem_descritor):
+        self.ids = ids
+        self.categorias = categorias
+        self.textos = textos
+        self.descritores = descritores
+        self.tem_descritor = tem_descritor
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def construir(cls, linhas):
+        """Monta o índice a partir de (id, categoria_id, titulo, descricao, descritor)."""
+        ids, categorias, textos, descritores, tem_descritor = [], [], [], [], []
+        for item_id, categoria_id, titulo, descricao, descritor in linhas:
+            vetor = bytes_para_descritor(descritor)
+            ids.append(item_id)
+            categorias.append(categoria_id)
+            textos.append(vetor_texto(f"{titulo} {descricao}"))
+            tem_descritor.append(vetor is not None)
+            descritores.append(vetor if vetor is not None else np.zeros(DIMENSAO, dtype=np.float32))
+        n = len(ids)
+        return cls(
+            np.array(ids, dtype=np.int64),
+            np.array(categorias, dtype=np.int64),
+            np.array(textos, dtype=np.float32).reshape(n, DIMENSAO_TEXTO),
+            np.array(descritores, dtype=np.float32).reshape(n, DIMENSAO),
+            np.array(tem_descritor, dtype=bool),
+        )
+
+    def atualizar(self, linhas):
+        """Novo índice com as linhas (formato de construir) inseridas ou substituídas."""
+        novos = IndiceCategorias.construir(linhas)
+        if not len(novos):
+            return self
+        manter = ~np.isin(self.ids, novos.ids)
+        return IndiceCategorias(
+            np.concatenate([self.ids[manter], novos.ids]),
+            np.concatenate([self.categorias[manter], novos.categorias]),
+            np.concatenate([self.textos[manter], novos.textos]),
+            np.concatenate([self.descritores[manter], novos.descritores]),
+            np.concatenate([self.tem_descritor[manter], novos.tem_descritor]),
+        )
+
+    def sugerir(self, texto, descritor=None, excluir_id=None, k=None):
+        """Retorna (categoria_id, confianca 0-1) ou (None, 0.0)."""
+        if not len(self):
+            return None, 0.0
+        k = k or getattr(settings, "CATEGORIA_K", 7)
+
+        sim_texto = self.textos @ vetor_texto(texto)
+        if descritor is not None:
+            sim_imagem = np.clip(1 - np.linalg.norm(self.descritores - descritor, axis=1), 0, 1)
+            # sem descritor no vizinho, vale só o texto
+            similaridade = np.where(self.tem_descritor, 0.5 * sim_texto + 0.5 * sim_imagem, sim_texto)
+        else:
+            similaridade = sim_texto
+        if excluir_id is not None:
+            similaridade = np.where(self.ids == excluir_id, -1.0, similaridade)
+
+        k = min(k, len(self))
+        vizinhos = np.argpartition(-similaridade, k - 1)[:k]
+        vizinhos = vizinhos[similaridade[vizinhos] >= getattr(settings, "CATEGORIA_SIMILARIDADE_MINIMA", 0.2)]
+        if not len(vizinhos):
+            return None, 0.0
+
+        votos = {}
+        for linha in vizinhos:
+            votos[int(self.categorias[linha])] = votos.get(int(self.categorias[linha]), 0.0) + float(similaridade[linha])
+        categoria, peso = max(votos.items(), key=lambda x: x[1])
+        return categoria, round(peso / sum(votos.values()), 3)
+
+
+# -----------------------------
+# Cache por processo
+# -----------------------------
+_lock = threading.Lock()
+_indice = None
+_versao = None  # (contagem, maior id, último atualizado_em) dos itens categorizados
+_verificado_em = 0.0
+
+
+def _categorizados():
+    from items.models import Item
+
+    return Item.objects.filter(categoria__isnull=False)
+
+
+def _linhas(qs):
+    return qs.values_list("id", "categoria_id", "titulo", "descricao", "descritor").iterator(chunk_size=2000)
+
+
+def versao_categorizados():
+    """Versão barata dos itens categorizados: itens novos sem categoria não a mudam."""
+    agregado = _categorizados().aggregate(n=Count("id"), maior_id=Max("id"), ultimo=Max("atualizado_em"))
+    return (agregado["n"], agregado["maior_id"], agregado["ultimo"])
+
+
+def obter_indice():
+    """
+    Índice de categorias do processo; se passou CATEGORIA_INTERVALO desde a última
+    checagem, confere a versão e traz de forma incremental os itens categorizados alterados.
+    """
+    global _indice, _versao, _verificado_em
+
+    intervalo = getattr(settings, "CATEGORIA_INTERVALO", 5)
+    if _indice is not None and time.monotonic() - _verificado_em < intervalo:
+        return _indice
+    with _lock:
+        if _indice is not None and time.monotonic() - _verificado_em < intervalo:
+            return _indice
+        versao = versao_categorizados()
+        if _indice is None:
+            _indice = IndiceCategorias.construir(_linhas(_categorizados()))
+        elif versao != _versao:
+            alterados = _categorizados()
+            if _versao[2] is not None:
+                alterados = alterados.filter(atualizado_em__gte=_versao[2])
+            indice = _indice.atualizar(_linhas(alterados))
+            if len(indice) != versao[0]:
+                # item removido ou que perdeu a categoria: reconstrói
+                indice = IndiceCategorias.construir(_linhas(_categorizados()))
+            _indice = indice
+        _versao = versao
+        _verificado_em = time.monotonic()
+    return _indice
+
+
+def item_alterado(sender=None, **kwargs):
+    """post_save/post_delete do Item: a próxima sugestão deste processo confere a versão."""
+    global _verificado_em
+    _verificado_em = 0.0
+
+
+def descartar():
+    """Esquece o índice do processo; o próximo obter_indice o reconstrói."""
+    global _indice, _versao
+    with _lock:
+        _indice = _versao = None
+
+
+def sugerir_categoria(item, indice=None):
+    """Sugere (categoria_id, confianca) para um item a partir dos vizinhos já categorizados."""
+    indice = indice or obter_indice()
+    return indice.sugerir(f"{item.titulo} {item.descricao}", bytes_para_descritor(item.descritor),
+                          excluir_id=item.pk)
+
+
+def aplicar_sugestao(item):
+    """
+    Preenche a categoria de um item sem categoria quando a sugestão tem confiança
+    suficiente (CATEGORIA_SUGESTAO_MINIMA). Retorna a Categoria aplicada ou None.
+    """
+    from items.alertas import percolar
+    from items.models import Categoria
+
+    if item.categoria_id:
+        return None
+    categoria_id, confianca = sugerir_categoria(item)
+    if categoria_id is None or confianca < getattr(settings, "CATEGORIA_SUGESTAO_MINIMA", 0.6):
+        return None
+    item.categoria = Categoria.objects.filter(pk=categoria_id).first()
+    if item.categoria is None:
+        return None
+    item.save(update_fields=["categoria", "atualizado_em"])
+    # a percolação do cadastro rodou sem categoria: buscas salvas pela categoria só casam agora
+    percolar(item)
+    return item.categoria
@@ -0,0 +1,186 @@
+"""
+Motor de correspondência automática entre itens perdidos e achados.
+
+Sempre que um item é salvo, ele é comparado com candidatos do status oposto e as
+melhores correspondências vão para a tabela Correspondencia, nos dois sentidos.
+Páginas e API leem essa tabela com uma única consulta indexada.
+
+Geração de candidatos (bloqueio) usa só filtros indexados: status oposto, data
+dentro da janela (índice status+data) e mesma categoria (ou sem categoria).
+A pontuação combina texto, imagem, categoria, local e proximidade de data.
+"""
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from items.indice_visual import similaridade_par
+from items.texto import jaccard, tokens
+
+STATUS_ACHADOS = ["achado", "pendente_confirmacao", "confirmado"]
+
+PESOS = {"texto": 0.35, "imagem": 0.25, "categoria": 0.15, "local": 0.10, "data": 0.15}
+
+
+def status_opostos(status):
+    if status == "perdido":
+        return STATUS_ACHADOS
+    if status in STATUS_ACHADOS:
+        return ["perdido"]
+    return []
+
+
+def _como_data(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    try:
+        return date.fromisoformat(str(valor)[:10])
+    except (TypeError, ValueError):
+        return None
+
+
+def pontuar(item, candidato, janela_dias):
+    """
+    Pontua (0-100) um par de itens. `item` e `candidato` são dicionários com
+    titulo, descricao, local, categoria_id, data, image_hash e descritor.
+    Componentes indisponíveis (ex.: sem foto) são ignorados na média ponderada.
+    """
+    componentes = {
+        "texto": jaccard(tokens(f"{item['titulo']} {item['descricao']}"),
+                         tokens(f"{candidato['titulo']} {candidato['descricao']}")),
+        "local": jaccard(tokens(item["local"]), tokens(candidato["local"])),
+    }
+
+    if item["categoria_id"] and candidato["categoria_id"]:
+        componentes["categoria"] = 1.0 if item["categoria_id"] == candidato["categoria_id"] else 0.0
+    else:
+        componentes["categoria"] = 0.5
+
+    data_a, data_b = _como_data(item["data"]), _como_data(candidato["data"])
+    if data_a and data_b:
+        componentes["data"] = max(0.0, 1 - abs((data_a - data_b).days) / janela_dias)
+
+    sim_imagem = similaridade_par(item["image_hash"], item["descritor"], candidato["image_hash"], candidato["descritor"])
+    if sim_imagem is not None:
+        componentes["imagem"] = sim_imagem / 100
+
+    peso_total = sum(PESOS[nome] for nome in componentes)
+    pontuacao = sum(PESOS[nome] * valor for nome, valor in componentes.items()) / peso_total * 100
+    return round(pontuacao, 1), {nome: round(valor * 100, 1) for nome, valor in componentes.items()}
+
+
+CAMPOS = ["id", "titulo", "descricao", "local", "categoria_id", "data", "image_hash", "descritor", "usuario_id"]
+
+
+def _candidatos(item, opostos, janela_dias):
+    """
+    Candidatos do status oposto na janela de datas (e mesma categoria ou sem categoria).
+    Acima de CORRESPONDENCIA_MAX_CANDIDATOS, ficam os mais próximos em data do item,
+    não os mais novos: a proximidade de data pesa na pontuação.
+    """
+    from items.models import Item
+
+    data_item = _como_data(item.data) or date.today()
+    qs = (
+        Item.objects
+        .filter(status__in=opostos, data__range=(data_item - timedelta(days=janela_dias),
+                                                 data_item + timedelta(days=janela_dias)))
+        .exclude(pk=item.pk)
+        .exclude(usuario_id=item.usuario_id)
+    )
+    if item.categoria_id:
+        qs = qs.filter(Q(categoria_id=item.categoria_id) | Q(categoria__isnull=True))
+    limite = getattr(settings, "CORRESPONDENCIA_MAX_CANDIDATOS", 500)
+    # os mais próximos de cada lado da data, pelo índice status+data
+    antes = list(qs.filter(data__lte=data_item).order_by("-data", "-id").values(*CAMPOS)[:limite])
+    depois = list(qs.filter(data__gt=data_item).order_by("data", "id").values(*CAMPOS)[:limite])
+    candidatos = sorted(antes + depois, key=lambda c: abs((_como_data(c["data"]) - data_item).days))
+    return candidatos[:limite]
+
+
+def _pontuados(item, janela, minima):
+    """[(pontuacao, candidato_id, detalhes)] dos candidatos acima da mínima, melhores primeiro."""
+    opostos = status_opostos(item.status)
+    if not opostos:
+        return []
+    dados_item = {campo: getattr(item, campo) for campo in CAMPOS}
+    pontuados = []
+    for candidato in _candidatos(item, opostos, janela):
+        pontuacao, detalhes = pontuar(dados_item, candidato, janela)
+        if pontuacao >= minima:
+            pontuados.append((pontuacao, candidato["id"], detalhes))
+    pontuados.sort(key=lambda x: (-x[0], -x[1]))
+    return pontuados
+
+
+def _gravar_lista(item_id, pontuados, top):
+    """Substitui as correspondências do próprio item pelas `top` melhores."""
+    from items.models import Correspondencia
+
+    Correspondencia.objects.filter(item_id=item_id).delete()
+    Correspondencia.objects.bulk_create(
+        [Correspondencia(item_id=item_id, candidato_id=cid, pontuacao=p, detalhes=d) for p, cid, d in pontuados[:top]]
+    )
+
+
+def _atualizar_reversas(item_id, pontuados, top):
+    """
+    Lado reverso: o item entra na lista de cada candidato em que fica entre os `top`
+    (o candidato perde a pior correspondência se a lista estiver cheia) e sai das
+    listas dos candidatos com que não corresponde mais. Retorna os ids desses
+    últimos, cujas listas ficaram com uma vaga.
+    """
+    from items.models import Correspondencia
+
+    listas = {}
+    for corresp_id, cid, pontuacao in (
+        Correspondencia.objects.filter(item_id__in=[cid for _, cid, _ in pontuados])
+        .exclude(candidato_id=item_id).order_by("-pontuacao", "-id")
+        .values_list("id", "item_id", "pontuacao")
+    ):
+        listas.setdefault(cid, []).append((pontuacao, corresp_id))
+
+    entram, excedentes = [], []
+    for pontuacao, cid, detalhes in pontuados:
+        lista = listas.get(cid, [])
+        if len(lista) >= top and pontuacao <= lista[top - 1][0]:
+            continue
+        entram.append(Correspondencia(item_id=cid, candidato_id=item_id, pontuacao=pontuacao, detalhes=detalhes))
+        excedentes += [corresp_id for _, corresp_id in lista[top - 1:]]
+
+    saem = Correspondencia.objects.filter(candidato_id=item_id).exclude(
+        item_id__in=[corresp.item_id for corresp in entram]
+    )
+    sem_o_item = list(saem.values_list("item_id", flat=True))
+    saem.delete()
+    if excedentes:
+        Correspondencia.objects.filter(id__in=excedentes).delete()
+    Correspondencia.objects.bulk_create(
+        entram, update_conflicts=True, unique_fields=["item", "candidato"],
+        update_fields=["pontuacao", "detalhes", "atualizado_em"],
+    )
+    return sem_o_item
+
+
+def atualizar_correspondencias(item):
+    """
+    Recalcula as correspondências de um item e o lugar dele nas listas dos candidatos.
+    Os candidatos que perderam o item têm a própria lista recalculada (só a lista
+    deles, sem propagar para os vizinhos).
+    """
+    from items.models import Item
+
+    janela = getattr(settings, "CORRESPONDENCIA_JANELA_DIAS", 60)
+    top = getattr(settings, "CORRESPONDENCIA_TOP", 10)
+    minima = getattr(settings, "CORRESPONDENCIA_MINIMA", 35)
+
+    pontuados = _pontuados(item, janela, minima)
+    with transaction.atomic():
+        _gravar_lista(item.pk, pontuados, top)
+        sem_o_item = _atualizar_reversas(item.pk, pontuados, top)
+        for antigo in Item.objects.filter(id__in=sem_o_item).only(*CAMPOS, "status"):
+            _gravar_lista(antigo.pk, _pontuados(antigo, janela, minima), top)
+    return len(pontuados[:top])
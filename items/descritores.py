@@ -0,0 +1,238 @@
+"""
+Descritores visuais compactos para a busca local (apenas CPU, sem rede).
+
+Cada imagem vira um vetor float de 89 dimensões, normalizado (L2):
+- momentos de cor HSV (média, desvio e assimetria por canal) ........ 9
+- histograma de orientação de bordas em grade 2x2 (8 direções) ...... 32
+- grade espacial de cores 4x4 (RGB médio por célula) ................. 48
+
+Também extrai as cores dominantes com nome (preto, azul, ...) para filtro indexado
+e uma impressão digital com vários hashes perceptuais empacotados (IMPRESSAO).
+"""
+import numpy as np
+
+LADO = 64
+DIMENSAO = 89
+
+
+def _momentos_de_cor(hsv):
+    canais = hsv.reshape(-1, 3) / 255.0
+    media = canais.mean(axis=0)
+    desvio = canais.std(axis=0)
+    assimetria = np.cbrt(((canais - media) ** 3).mean(axis=0))
+    return np.concatenate([media, desvio, assimetria])
+
+
+def _histograma_de_bordas(cinza, bins=8):
+    gy, gx = np.gradient(cinza)
+    magnitude = np.hypot(gx, gy)
+    # orientação sem sentido (0..pi): bordas claro→escuro e escuro→claro contam igual
+    angulo = np.mod(np.arctan2(gy, gx), np.pi)
+    indice = np.minimum((angulo / np.pi * bins).astype(np.int32), bins - 1)
+
+    meio = cinza.shape[0] // 2
+    blocos = []
+    for linhas in (slice(0, meio), slice(meio, None)):
+        for colunas in (slice(0, meio), slice(meio, None)):
+            hist = np.bincount(
+                indice[linhas, colunas].ravel(),
+                weights=magnitude[linhas, colunas].ravel(),
+                minlength=bins,
+            )
+            total = hist.sum()
+            blocos.append(hist / total if total > 0 else hist)
+    return np.concatenate(blocos)
+
+
+def _grade_de_cores(rgb, celulas=4):
+    passo = rgb.shape[0] // celulas
+    grade = rgb[:passo * celulas, :passo * celulas].reshape(celulas, passo, celulas, passo, 3)
+    return (grade.mean(axis=(1, 3)) / 255.0).ravel()
+
+
+def calcular_descritor(img):
+    """Calcula o descritor de uma imagem PIL já aberta."""
+    img = img.convert("RGB").resize((LADO, LADO))
+    rgb = np.asarray(img, dtype=np.float32)
+    hsv = np.asarray(img.convert("HSV"), dtype=np.float32)
+    cinza = np.asarray(img.convert("L"), dtype=np.float32)
+
+    # cada bloco é normalizado à parte para que nenhum domine a distância
+    partes = []
+    for parte in (_momentos_de_cor(hsv), _histograma_de_bordas(cinza), _grade_de_cores(rgb)):
+        norma = np.linalg.norm(parte)
+        partes.append(parte / norma if norma > 0 else parte)
+
+    vetor = np.concatenate(partes).astype(np.float32)
+    norma = np.linalg.norm(vetor)
+    return vetor / norma if norma > 0 else vetor
+
+
+CORES = [
+    "preto", "branco", "cinza", "vermelho", "laranja", "amarelo",
+    "verde", "azul", "roxo", "rosa", "marrom", "bege",
+]
+
+
+def _nomear_cores(hsv):
+    """Classifica cada pixel HSV (PIL, 0-255) no índice da cor com nome em CORES."""
+    h = hsv[..., 0] * (360 / 255)
+    s = hsv[..., 1] / 255
+    v = hsv[..., 2] / 255
+    vermelho = (h < 15) | (h >= 345)
+    condicoes = [
+        v < 0.2,
+        (s < 0.15) & (v > 0.85),
+        s < 0.15,
+        (s < 0.35) & (v > 0.7) & (h >= 20) & (h < 60),
+        vermelho & (s < 0.5) & (v > 0.7),
+        vermelho,
+        (h < 40) & (v < 0.6),
+        h < 40,
+        (h < 70) & (v < 0.5),
+        h < 70,
+        h < 170,
+        h < 260,
+        h < 290,
+    ]
+    nomes = ["preto", "branco", "cinza", "bege", "rosa", "vermelho", "marrom", "laranja",
+             "marrom", "amarelo", "verde", "azul", "roxo"]
+    indices = [CORES.index(nome) for nome in nomes]
+    return np.select(condicoes, indices, default=CORES.index("rosa"))
+
+
+def cores_dominantes(img, maximo=3, proporcao_minima=0.15):
+    """
+    Até `maximo` cores dominantes [(nome, proporção)], da mais para a menos presente.
+    Os pixels do centro pesam mais (o objeto costuma estar no centro, o fundo nas bordas).
+    """
+    lado = 32
+    hsv = np.asarray(img.convert("RGB").resize((lado, lado)).convert("HSV"), dtype=np.float32)
+    eixo = (np.arange(lado) - (lado - 1) / 2) / (lado * 0.22)
+    pesos = np.exp(-(eixo[:, None] ** 2 + eixo[None, :] ** 2) / 2)
+
+    soma = np.bincount(_nomear_cores(hsv).ravel(), weights=pesos.ravel(), minlength=len(CORES))
+    proporcoes = soma / soma.sum()
+    cores = []
+    for indice in np.argsort(-proporcoes, kind="stable")[:maximo]:
+        if cores and proporcoes[indice] < proporcao_minima:
+            break
+        cores.append((CORES[indice], round(float(proporcoes[indice]), 3)))
+    return cores
+
+
+# Impressão digital: hashes perceptuais concatenados (nome, bits). O pHash 16x16 vem
+# primeiro e é o mesmo do campo image_hash; os demais são calculados sobre uma cópia
+# 64x64 em tons de cinza. Pesos da distância combinada em PESOS_IMPRESSAO.
+IMPRESSAO = [("phash", 256), ("ahash", 64), ("dhash", 64), ("whash", 64)]
+BYTES_IMPRESSAO = sum(bits for _, bits in IMPRESSAO) // 8
+PESOS_IMPRESSAO = {"phash": 0.4, "ahash": 0.15, "dhash": 0.25, "whash": 0.2}
+
+
+def calcular_impressao(img, phash=None):
+    """Empacota pHash, aHash, dHash e wHash da imagem PIL em BYTES_IMPRESSAO bytes."""
+    import imagehash
+    from PIL import Image as PILImage
+
+    phash = phash or imagehash.phash(img, hash_size=16)
+    cinza = img.convert("L").resize((LADO, LADO), PILImage.LANCZOS)
+    hashes = [
+        phash,
+        imagehash.average_hash(cinza, hash_size=8),
+        imagehash.dhash(cinza, hash_size=8),
+        imagehash.whash(cinza, hash_size=8, image_scale=LADO),
+    ]
+    return b"".join(np.packbits(h.hash.flatten()).tobytes() for h in hashes)
+
+
+def impressao_para_bits(dados):
+    """Bytes da impressão (ou só os 32 do pHash) como array uint8; None se inválida."""
+    if not dados or len(dados) not in (BYTES_IMPRESSAO, IMPRESSAO[0][1] // 8):
+        return None
+    return np.frombuffer(bytes(dados), dtype=np.uint8)
+
+
+def descritor_para_bytes(vetor):
+    """Serializa o descritor em float16 (178 bytes por item)."""
+    return np.asarray(vetor, dtype=np.float16).tobytes()
+
+
+def bytes_para_descritor(dados):
+    if not dados or len(dados) != DIMENSAO * 2:
+        return None
+    return np.frombuffer(bytes(dados), dtype=np.float16).astype(np.float32)
+
+
+def hash_para_bits(hex_hash):
+    """Converte o pHash hexadecimal (256 bits) em 32 bytes para distância de Hamming vetorizada."""
+    return np.frombuffer(bytes.fromhex(hex_hash), dtype=np.uint8)
+
+
+def extrair_caracteristicas(dados):
+    """
+    Decodifica a imagem uma única vez e calcula tudo que a busca visual precisa.
+    Função pura (bytes -> dict) para poder rodar num pool de processos.
+    """
+    import hashlib
+    from io import BytesIO
+
+    import imagehash
+    from PIL import Image as PILImage
+
+    img = PILImage.open(BytesIO(dados))
+    img.load()
+    phash = imagehash.phash(img, hash_size=16)
+    return {
+        'imagem_digest': hashlib.sha256(dados).hexdigest(),
+        'image_hash': str(phash),
+        'impressao': calcular_impressao(img, phash),
+        'descritor': descritor_para_bytes(calcular_descritor(img)),
+        'cores': cores_dominantes(img),
+    }
+
+
+def extrair_caracteristicas_ou_erro(dados):
+    """Versão para pools de processos: devolve {'erro': ...} em vez de levantar exceção."""
+    try:
+        return extrair_caracteristicas(dados)
+    except Exception as e:
+        return {'erro': str(e)}
+
+
+def reduzir_para_jpeg(img, max_lado, qualidade=80):
+    """Reduz uma imagem PIL para caber em max_lado x max_lado e recodifica em JPEG."""
+    from io import BytesIO
+
+    img = img.convert("RGB")
+    img.thumbnail((max_lado, max_lado))
+    buffer = BytesIO()
+    img.save(buffer, format="JPEG", quality=qualidade, optimize=True)
+    return buffer.getvalue()
+
+
+def analisar_consulta(dados, max_lado_gemini=0):
+    """
+    Decodifica a foto de uma busca visual uma única vez e retorna
+    (pHash hex, descritor, JPEG reduzido para o Gemini ou None, impressão), ou None
+    se a imagem for ilegível. Função pura para rodar no pool de processos da busca.
+    """
+    from io import BytesIO
+
+    import imagehash
+    from PIL import Image as PILImage
+
+    try:
+        img = PILImage.open(BytesIO(dados))
+        img.load()
+        jpeg = reduzir_para_jpeg(img, max_lado_gemini) if max_lado_gemini else None
+        phash = imagehash.phash(img, hash_size=16)
+        return str(phash), calcular_descritor(img), jpeg, calcular_impressao(img, phash)
+    except Exception:
+        return None
+
+
+def executar_medindo(funcao, *args):
+    """Executa `funcao` no worker e devolve (instante de início, resultado) para medir a espera na fila."""
+    import time
+
+    return time.time(), funcao(*args)
@@ -0,0 +1,239 @@
+"""
+Detecção de fotos quase duplicadas no catálogo.
+
+Compara os pHashes de todos os itens em blocos vetorizados: os 256 bits viram uma
+matriz 0/1 e a distância de Hamming de um bloco contra o catálogo inteiro sai de um
+único produto de matrizes (|a| + |b| - 2·a·b). Só os pares abaixo do limiar de pHash
+têm o descritor visual comparado. Os pares encontrados vão para ParDuplicado e são
+agrupados por componente conectado (union-find).
+
+No modo incremental só os itens com `duplicatas_verificadas=False` (novos ou com
+imagem trocada) são comparados contra o catálogo.
+
+No cadastro, verificar_foto compara a foto enviada com o índice antes de criar o
+item (mesmos limiares) para avisar quem está cadastrando um objeto já publicado; a
+foto é decodificada no pool da busca visual (items/busca_visual.py).
+"""
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from items.indice_visual import BITS_HASH, obter_indice
+
+BLOCO = 256
+
+
+def _pares_no_indice(indice, linhas_novas, limiar_hash, limiar_descritor):
+    """Retorna arrays (linha_i, linha_j, distancia_hash, similaridade) dos pares próximos."""
+    bits = np.unpackbits(indice.hashes, axis=1).astype(np.float32)
+    contagem = bits.sum(axis=1)
+    eh_novo = np.zeros(len(indice), dtype=bool)
+    eh_novo[linhas_novas] = True
+
+    saida_i, saida_j, saida_d = [], [], []
+    for inicio in range(0, len(linhas_novas), BLOCO):
+        bloco = linhas_novas[inicio:inicio + BLOCO]
+        distancias = contagem[bloco][:, None] + contagem[None, :] - 2 * (bits[bloco] @ bits.T)
+        pos_i, j = np.nonzero(distancias <= limiar_hash)
+        i = bloco[pos_i]
+        # remove o próprio item e pares novo×novo repetidos (mantém só i < j)
+        manter = (i != j) & (~eh_novo[j] | (j > i))
+        saida_i.append(i[manter])
+        saida_j.append(j[manter])
+        saida_d.append(np.rint(distancias[pos_i[manter], j[manter]]).astype(np.int32))
+
+    if not saida_i:
+        vazio = np.array([], dtype=np.int64)
+        return vazio, vazio, vazio, np.array([], dtype=np.float32)
+
+    i, j, dist = np.concatenate(saida_i), np.concatenate(saida_j), np.concatenate(saida_d)
+
+    # confirma pela aparência quando os dois itens têm descritor
+    ambos = indice.tem_descritor[i] & indice.tem_descritor[j]
+    dist_desc = np.linalg.norm(indice.descritores[i] - indice.descritores[j], axis=1)
+    manter = ~ambos | (dist_desc <= limiar_descritor)
+    sim_hash = 100 - dist / BITS_HASH * 100
+    sim_desc = np.where(ambos, np.clip(100 * (1 - dist_desc), 0, 100), 50.0)
+    similaridade = sim_hash * 0.5 + sim_desc * 0.5
+    return i[manter], j[manter], dist[manter], similaridade[manter]
+
+
+def reagrupar(grupos=None):
+    """
+    Recalcula o campo `grupo` dos pares pendentes (union-find sobre os ids). Com
+    `grupos`, só os pares desses grupos são reagrupados: resolver um par só pode
+    dividir o componente dele, os outros não mudam.
+    """
+    from items.models import ParDuplicado
+
+    pendentes = ParDuplicado.objects.filter(resolvido=False)
+    if grupos is not None:
+        pendentes = pendentes.filter(grupo__in=grupos)
+    pares = list(pendentes.only('id', 'item_a_id', 'item_b_id', 'grupo'))
+    pai = {}
+
+    def raiz(x):
+        pai.setdefault(x, x)
+        while pai[x] != x:
+            pai[x] = pai[pai[x]]
+            x = pai[x]
+        return x
+
+    for par in pares:
+        a, b = raiz(par.item_a_id), raiz(par.item_b_id)
+        if a != b:
+            pai[max(a, b)] = min(a, b)
+
+    alterados = []
+    for par in pares:
+        grupo = raiz(par.item_a_id)
+        if par.grupo != grupo:
+            par.grupo = grupo
+            alterados.append(par)
+    ParDuplicado.objects.bulk_update(alterados, ['grupo'], batch_size=500)
+    return len({raiz(p.item_a_id) for p in pares})
+
+
+def resolver_par(par):
+    """Marca o par como resolvido e reagrupa só o componente de que ele fazia parte."""
+    with transaction.atomic():
+        par.resolvido = True
+        par.save(update_fields=['resolvido'])
+        reagrupar([par.grupo])
+
+
+def detectar_duplicatas(tudo=False):
+    """
+    Executa a detecção e grava os pares. Retorna um dicionário com estatísticas.
+    Com tudo=True recompara o catálogo inteiro.
+    """
+    from items.models import Item, ParDuplicado
+
+    limiar_hash = getattr(settings, 'DUPLICATA_LIMIAR_HASH', 40)
+    limiar_descritor = getattr(settings, 'DUPLICATA_LIMIAR_DESCRITOR', 0.2)
+
+    indice = obter_indice()
+    if tudo:
+        linhas_novas = np.arange(len(indice))
+    else:
+        pendentes = list(Item.objects.filter(duplicatas_verificadas=False).values_list('id', flat=True))
+        linhas_novas = np.flatnonzero(np.isin(indice.ids, pendentes))
+
+    ids_novos = [int(x) for x in indice.ids[linhas_novas]]
+    i, j, dist, similaridade = _pares_no_indice(indice, linhas_novas, limiar_hash, limiar_descritor)
+
+    novos_pares = []
+    for a, b, d, s in zip(indice.ids[i], indice.ids[j], dist, similaridade):
+        a, b = (int(a), int(b)) if a < b else (int(b), int(a))
+        novos_pares.append(ParDuplicado(item_a_id=a, item_b_id=b, distancia_hash=int(d), similaridade=round(float(s), 1)))
+
+    with transaction.atomic():
+        # pares pendentes antigos dos itens recomparados podem não valer mais (imagem trocada)
+        # (em lotes para não estourar o limite de parâmetros do SQLite)
+        for inicio in range(0, len(ids_novos), 500):
+            lote = ids_novos[inicio:inicio + 500]
+            ParDuplicado.objects.filter(resolvido=False).filter(
+                Q(item_a_id__in=lote) | Q(item_b_id__in=lote)
+            ).delete()
+            Item.objects.filter(id__in=lote).update(duplicatas_verificadas=True)
+        ParDuplicado.objects.bulk_create(novos_pares, batch_size=500, ignore_conflicts=True)
+        grupos = reagrupar()
+
+    return {'comparados': len(ids_novos), 'catalogo': len(indice), 'pares': len(novos_pares), 'grupos': grupos}
+
+
+def duplicatas_da_foto(caracteristicas, limite=3):
+    """
+    Itens já cadastrados com foto quase idêntica à descrita por `caracteristicas`
+    (saída de extrair_caracteristicas). Só os pHashes do índice em memória são
+    varridos; o descritor confirma os candidatos. Retorna [(Item, similaridade)].
+    """
+    from items.descritores import bytes_para_descritor, hash_para_bits
+    from items.models import Item
+
+    limiar_hash = getattr(settings, 'DUPLICATA_LIMIAR_HASH', 40)
+    limiar_descritor = getattr(settings, 'DUPLICATA_LIMIAR_DESCRITOR', 0.2)
+
+    indice = obter_indice()
+    if not len(indice):
+        return []
+    distancias = indice.distancias_phash(hash_para_bits(caracteristicas['image_hash']))
+    linhas = np.flatnonzero(distancias <= limiar_hash)
+    if not len(linhas):
+        return []
+
+    sim_hash = 100 - distancias[linhas] / BITS_HASH * 100
+    vetor = bytes_para_descritor(caracteristicas.get('descritor'))
+    if vetor is not None:
+        ambos = indice.tem_descritor[linhas]
+        dist_desc = np.linalg.norm(indice.descritores[linhas] - vetor, axis=1)
+        manter = ~ambos | (dist_desc <= limiar_descritor)
+        sim_desc = np.where(ambos, np.clip(100 * (1 - dist_desc), 0, 100), 50.0)
+    else:
+        manter = np.ones(len(linhas), dtype=bool)
+        sim_desc = np.full(len(linhas), 50.0)
+    similaridade = (sim_hash * 0.5 + sim_desc * 0.5)[manter]
+    linhas = linhas[manter]
+
+    ordem = np.argsort(-similaridade, kind="stable")[:limite]
+    pontuados = [(int(indice.ids[linhas[pos]]), round(float(similaridade[pos]), 1)) for pos in ordem]
+    itens = Item.objects.select_related('usuario', 'categoria').in_bulk([item_id for item_id, _ in pontuados])
+    return [(itens[item_id], sim) for item_id, sim in pontuados if item_id in itens]
+
+
+def verificar_foto(imagem_file, limite=3):
+    """
+    Checagem de duplicata no cadastro. Retorna (caracteristicas, [(Item, similaridade)]);
+    as características podem ser passadas ao item (Item._caracteristicas) para que o
+    save não decodifique a foto de novo. A decodificação roda no pool da busca visual,
+    sob a mesma admissão; com o pool lotado ou foto ilegível: (None, []) e o cadastro
+    segue sem o aviso.
+    """
+    from items import busca_visual
+
+    if not imagem_file:
+        return None, []
+    imagem_file.seek(0)
+    dados = imagem_file.read()
+    imagem_file.seek(0)
+    try:
+        caracteristicas = busca_visual.extrair_caracteristicas(dados)
+    except busca_visual.BuscaVisualSaturada:
+        return None, []
+    if caracteristicas is None:
+        return None, []
+    return caracteristicas, duplicatas_da_foto(caracteristicas, limite)
+
+
+def grupos_pendentes(inicio=0, limite=20):
+    """
+    Lista grupos de duplicatas ainda não resolvidos, do mais recente para o mais antigo.
+    Retorna ([{'grupo', 'itens', 'pares'}], has_more).
+    """
+    from items.models import ParDuplicado
+
+    grupos = list(
+        ParDuplicado.objects.filter(resolvido=False)
+        .order_by('-grupo').values_list('grupo', flat=True).distinct()[inicio:inicio + limite + 1]
+    )
+    has_more = len(grupos) > limite
+    grupos = grupos[:limite]
+
+    pares = (
+        ParDuplicado.objects.filter(resolvido=False, grupo__in=grupos)
+        .select_related('item_a__usuario', 'item_a__categoria', 'item_b__usuario', 'item_b__categoria')
+    )
+    por_grupo = {g: {'grupo': g, 'itens': {}, 'pares': []} for g in grupos}
+    for par in pares:
+        entrada = por_grupo[par.grupo]
+        entrada['pares'].append(par)
+        entrada['itens'][par.item_a_id] = par.item_a
+        entrada['itens'][par.item_b_id] = par.item_b
+
+    resultado = []
+    for g in grupos:
+        entrada = por_grupo[g]
+        entrada['itens'] = sorted(entrada['itens'].values(), key=lambda item: item.id)
+        resultado.append(entrada)
+    return resultado, has_more
@@ -0,0 +1,82 @@
+"""
+Contagens por faceta (status, categoria e mês) da busca atual, numa única consulta.
+
+A consulta base é a busca sem os filtros de faceta. O banco agrupa por
+(status, categoria, mês), o que devolve poucas linhas, e cada faceta é somada em
+Python aplicando só os filtros das *outras* facetas. Assim a contagem de "Perdidos"
+continua visível depois de filtrar por "Achados", sem um COUNT por faceta.
+"""
+import datetime
+
+from django.db.models import Count, Q
+from django.db.models.functions import TruncMonth
+
+STATUS_FILTRAVEIS = ("perdido", "achado", "devolvido")
+
+
+def _mes(mes):
+    """'AAAA-MM' -> date do primeiro dia do mês, ou None se inválido."""
+    try:
+        return datetime.datetime.strptime(mes or "", "%Y-%m").date()
+    except ValueError:
+        return None
+
+
+def filtro_mes(mes):
+    """Q dos itens com `data` no mês 'AAAA-MM'; Q vazio (sem filtro) se inválido."""
+    inicio = _mes(mes)
+    if inicio is None:
+        return Q()
+    return Q(data__year=inicio.year, data__month=inicio.month)
+
+
+def contar_facetas(qs, status="", categoria_id=None, mes=""):
+    """
+    `qs`: itens da busca sem os filtros de status/categoria/mês. Os filtros ativos
+    vêm nos argumentos. Retorna {"total", "status", "categoria", "mes"}; "total"
+    considera todos os filtros.
+    """
+    from items.models import Item
+
+    status = status if status in STATUS_FILTRAVEIS else ""
+    mes = mes if _mes(mes) else ""
+    linhas = (
+        qs.order_by()
+        .annotate(mes_item=TruncMonth("data"))
+        .values("status", "categoria_id", "categoria__nome", "mes_item")
+        .annotate(n=Count("id", distinct=True))
+    )
+
+    total = 0
+    por_status, por_categoria, por_mes, nomes = {}, {}, {}, {}
+    for linha in linhas:
+        n = linha["n"]
+        chave_mes = linha["mes_item"].strftime("%Y-%m") if linha["mes_item"] else ""
+        casa_status = not status or linha["status"] == status
+        casa_categoria = categoria_id is None or linha["categoria_id"] == categoria_id
+        casa_mes = not mes or chave_mes == mes
+        if casa_categoria and casa_mes:
+            por_status[linha["status"]] = por_status.get(linha["status"], 0) + n
+        if casa_status and casa_mes and linha["categoria_id"] is not None:
+            nomes[linha["categoria_id"]] = linha["categoria__nome"]
+            por_categoria[linha["categoria_id"]] = por_categoria.get(linha["categoria_id"], 0) + n
+        if casa_status and casa_categoria and chave_mes:
+            por_mes[chave_mes] = por_mes.get(chave_mes, 0) + n
+        if casa_status and casa_categoria and casa_mes:
+            total += n
+
+    return {
+        "total": total,
+        "status": [
+            {"valor": valor, "rotulo": rotulo, "total": por_status[valor], "ativo": valor == status}
+            for valor, rotulo in Item.STATUS_CHOICES if valor in por_status and valor in STATUS_FILTRAVEIS
+        ],
+        "categoria": [
+            {"id": cid, "nome": nomes[cid], "total": n, "ativo": cid == categoria_id}
+            for cid, n in sorted(por_categoria.items(), key=lambda par: (-par[1], nomes[par[0]]))
+        ],
+        "mes": [
+            {"valor": chave, "rotulo": f"{chave[5:]}/{chave[:4]}", "total": por_mes[chave], "ativo": chave == mes}
+            for chave in sorted(por_mes, reverse=True)
+        ],
+    }
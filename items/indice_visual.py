@@ -0,0 +1,423 @@
+"""
+Índice visual em memória (por processo) para a busca local.
+
+Mantém em arrays NumPy os pHashes (32 bytes) e os descritores (items/descritores.py)
+de todos os itens com imagem. Para catálogos grandes usa um índice IVF: os descritores
+são agrupados por k-means e cada consulta só compara as listas dos `nprobe`
+centróides mais próximos, mantendo o custo por consulta limitado.
+
+Quando a consulta traz a impressão completa (pHash + aHash + dHash + wHash, ver
+items/descritores.py), a parte estrutural da pontuação é a distância de Hamming
+normalizada de cada hash, ponderada por PESOS_IMPRESSAO; itens ainda sem impressão
+gravada são comparados só pelo pHash.
+
+A versão do catálogo (contagem, maior id e último `atualizado_em` dos itens com
+pHash, mais um contador de saves no cache compartilhado) é consultada no máximo a
+cada INDICE_VISUAL_INTERVALO segundos, ou logo depois de um save/delete de Item
+neste processo. Quando muda, só os itens alterados desde a última versão (com
+INDICE_VISUAL_FOLGA de margem, pelo índice de `atualizado_em`) são lidos e entram no
+índice, sem decodificar nenhuma imagem; remoções (contagem divergente) ou
+crescimento que pede novo treino do IVF reconstroem o índice.
+
+Status, categoria e data de cada item ficam em arrays paralelos, então os filtros
+da busca viram uma máscara booleana aplicada antes da pontuação.
+"""
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+
+from items.descritores import (
+    BYTES_IMPRESSAO, DIMENSAO, IMPRESSAO, PESOS_IMPRESSAO, bytes_para_descritor, hash_para_bits,
+)
+
+# popcount de um byte, para distância de Hamming vetorizada
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+BITS_HASH = 256
+BYTES_EXTRAS = BYTES_IMPRESSAO - BITS_HASH // 8
+SIMILARIDADE_MINIMA = 30
+_BLOCO = 8192
+
+
+def _distancias_quadradas(vetores, centroides):
+    """||v - c||² para todos os pares, em blocos para limitar memória."""
+    normas_c = (centroides ** 2).sum(axis=1)
+    saida = np.empty((len(vetores), len(centroides)), dtype=np.float32)
+    for inicio in range(0, len(vetores), _BLOCO):
+        bloco = vetores[inicio:inicio + _BLOCO]
+        saida[inicio:inicio + _BLOCO] = (
+            (bloco ** 2).sum(axis=1)[:, None] - 2 * bloco @ centroides.T + normas_c[None, :]
+        )
+    return saida
+
+
+def treinar_kmeans(vetores, k, iteracoes=8, semente=42):
+    rng = np.random.default_rng(semente)
+    centroides = vetores[rng.choice(len(vetores), size=k, replace=False)].copy()
+    for _ in range(iteracoes):
+        atribuicao = _distancias_quadradas(vetores, centroides).argmin(axis=1)
+        somas = np.zeros_like(centroides)
+        np.add.at(somas, atribuicao, vetores)
+        contagem = np.bincount(atribuicao, minlength=k)
+        nao_vazios = contagem > 0
+        centroides[nao_vazios] = somas[nao_vazios] / contagem[nao_vazios, None]
+    return centroides
+
+
+STATUS = ["", "achado", "perdido", "devolvido", "pendente_confirmacao", "confirmado"]
+COLUNAS = ("id", "image_hash", "descritor", "status", "categoria_id", "data", "impressao")
+
+
+class IndiceVisual:
+    """Snapshot imutável dos vetores do catálogo."""
+
+    def __init__(self, ids, hashes, descritores, tem_descritor, centroides=None, n_treino=0,
+                 status=None, categorias=None, datas=None, extras=None, listas=None, ignorados=None):
+        self.ids = ids
+        self.hashes = hashes
+        # aHash/dHash/wHash da impressão (após o pHash); linha zerada = sem impressão
+        self.extras = extras if extras is not None else np.zeros((len(ids), BYTES_EXTRAS), dtype=np.uint8)
+        self.tem_extras = self.extras.any(axis=1)
+        self.descritores = descritores
+        self.tem_descritor = tem_descritor
+        # metadados para filtros: código do status, categoria (-1 = sem) e data (ordinal, 0 = sem)
+        self.status = status if status is not None else np.zeros(len(ids), dtype=np.int8)
+        self.categorias = categorias if categorias is not None else np.full(len(ids), -1, dtype=np.int64)
+        self.datas = datas if datas is not None else np.zeros(len(ids), dtype=np.int32)
+        self.centroides = centroides
+        self.n_treino = n_treino
+        self.listas = listas
+        if listas is None and centroides is not None and len(ids):
+            self.listas = _distancias_quadradas(descritores, centroides).argmin(axis=1)
+        # ids com image_hash preenchido mas inválido (fora do índice), para conferir a contagem
+        self.ignorados = ignorados if ignorados is not None else np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def construir(cls, linhas, anterior=None, treinar=True, minimo_ivf=None):
+        """
+        Monta o índice a partir de linhas com as COLUNAS (id, image_hash, descritor e,
+        opcionalmente, status, categoria_id, data, impressao); reaproveita centróides se possível.
+        Com treinar=False não monta o IVF; `minimo_ivf` (padrão INDICE_IVF_MINIMO) é o
+        número de descritores a partir do qual ele é montado.
+        """
+        ids, hashes, descritores, tem_descritor = [], [], [], []
+        status, categorias, datas, extras, ignorados = [], [], [], [], []
+        sem_extras = bytes(BYTES_EXTRAS)
+        for linha in linhas:
+            item_id, image_hash, descritor = linha[:3]
+            status_item, categoria_id, data_item, impressao = (tuple(linha[3:7]) + (None,) * 4)[:4]
+            if not image_hash:
+                continue
+            try:
+                bits = hash_para_bits(image_hash)
+            except ValueError:
+                ignorados.append(item_id)
+                continue
+            if len(bits) != BITS_HASH // 8:
+                ignorados.append(item_id)
+                continue
+            vetor = bytes_para_descritor(descritor)
+            ids.append(item_id)
+            hashes.append(bits)
+            tem_descritor.append(vetor is not None)
+            descritores.append(vetor if vetor is not None else np.zeros(DIMENSAO, dtype=np.float32))
+            status.append(STATUS.index(status_item) if status_item in STATUS else 0)
+            categorias.append(categoria_id if categoria_id is not None else -1)
+            datas.append(data_item.toordinal() if isinstance(data_item, date) else 0)
+            impressao = bytes(impressao) if impressao else b""
+            extras.append(impressao[BITS_HASH // 8:] if len(impressao) == BYTES_IMPRESSAO else sem_extras)
+
+        n = len(ids)
+        ids = np.array(ids, dtype=np.int64)
+        hashes = np.array(hashes, dtype=np.uint8).reshape(n, BITS_HASH // 8)
+        descritores = np.array(descritores, dtype=np.float32).reshape(n, DIMENSAO)
+        tem_descritor = np.array(tem_descritor, dtype=bool)
+
+        centroides, n_treino = None, 0
+        if minimo_ivf is None:
+            minimo_ivf = getattr(settings, "INDICE_IVF_MINIMO", 2000)
+        com_descritor = descritores[tem_descritor]
+        if treinar and len(com_descritor) >= minimo_ivf:
+            if anterior is not None and anterior.centroides is not None and len(com_descritor) <= 2 * anterior.n_treino:
+                # crescimento pequeno: só redistribui nas listas existentes
+                centroides, n_treino = anterior.centroides, anterior.n_treino
+            else:
+                k = max(1, int(np.sqrt(len(com_descritor))))
+                centroides, n_treino = treinar_kmeans(com_descritor, k), len(com_descritor)
+
+        return cls(ids, hashes, descritores, tem_descritor, centroides, n_treino,
+                   status=np.array(status, dtype=np.int8), categorias=np.array(categorias, dtype=np.int64),
+                   datas=np.array(datas, dtype=np.int32),
+                   extras=np.frombuffer(b"".join(extras), dtype=np.uint8).reshape(n, BYTES_EXTRAS),
+                   ignorados=np.array(ignorados, dtype=np.int64))
+
+    def atualizar(self, linhas):
+        """
+        Novo índice com as linhas (formato de construir) inseridas ou substituídas; as
+        que ficaram sem pHash válido saem. Mantém os centróides do IVF.
+        """
+        linhas = list(linhas)
+        if not linhas:
+            return self
+        novos = IndiceVisual.construir(linhas, treinar=False)
+        alterados = np.array([linha[0] for linha in linhas], dtype=np.int64)
+        manter = ~np.isin(self.ids, alterados)
+
+        def juntar(antigo, novo):
+            return np.concatenate([antigo[manter], novo])
+
+        listas = None
+        if self.centroides is not None:
+            listas = juntar(self.listas, _distancias_quadradas(novos.descritores, self.centroides).argmin(axis=1))
+        return IndiceVisual(
+            juntar(self.ids, novos.ids), juntar(self.hashes, novos.hashes), juntar(self.descritores, novos.descritores),
+            juntar(self.tem_descritor, novos.tem_descritor), self.centroides, self.n_treino,
+            status=juntar(self.status, novos.status), categorias=juntar(self.categorias, novos.categorias),
+            datas=juntar(self.datas, novos.datas), extras=juntar(self.extras, novos.extras), listas=listas,
+            ignorados=np.concatenate([self.ignorados[~np.isin(self.ignorados, alterados)], novos.ignorados]),
+        )
+
+    def precisa_treinar(self):
+        """O IVF deve ser (re)treinado: passou do mínimo sem IVF ou mais que dobrou desde o treino."""
+        com_descritor = int(self.tem_descritor.sum())
+        if self.centroides is None:
+            return com_descritor >= getattr(settings, "INDICE_IVF_MINIMO", 2000)
+        return com_descritor > 2 * self.n_treino
+
+    def mascara(self, filtros=None, permitidos=None):
+        """
+        Máscara booleana das linhas que passam nos filtros, ou None se não houver filtro.
+        filtros: {'status': [..], 'categoria': id, 'data_inicio': date, 'data_fim': date}.
+        `permitidos` (ids) restringe a um subconjunto vindo do banco, ex.: itens de uma cor.
+        """
+        filtros = filtros or {}
+        mascara = None
+
+        def aplicar(condicao):
+            nonlocal mascara
+            mascara = condicao if mascara is None else mascara & condicao
+
+        if filtros.get("status"):
+            codigos = [STATUS.index(s) for s in filtros["status"] if s in STATUS]
+            aplicar(np.isin(self.status, codigos))
+        if filtros.get("categoria") is not None:
+            aplicar(self.categorias == int(filtros["categoria"]))
+        if filtros.get("data_inicio"):
+            aplicar(self.datas >= filtros["data_inicio"].toordinal())
+        if filtros.get("data_fim"):
+            aplicar((self.datas <= filtros["data_fim"].toordinal()) & (self.datas > 0))
+        if permitidos is not None:
+            aplicar(np.isin(self.ids, np.fromiter(permitidos, dtype=np.int64)))
+        return mascara
+
+    def distancias_phash(self, bits):
+        """Distância de Hamming (0-256) entre o pHash `bits` e o de cada linha."""
+        return _POPCOUNT[np.bitwise_xor(self.hashes, bits[:BITS_HASH // 8])].sum(axis=1)
+
+    def _distancias_hash(self, bits, linhas=None):
+        """
+        Distância estrutural normalizada (0-1) das linhas até a consulta. `bits` é o
+        pHash (32 bytes) ou a impressão completa; neste caso combina os quatro hashes
+        nas linhas que têm impressão gravada.
+        """
+        selecionar = slice(None) if linhas is None else linhas
+        bytes_phash = BITS_HASH // 8
+        d_phash = _POPCOUNT[np.bitwise_xor(self.hashes[selecionar], bits[:bytes_phash])].sum(axis=1) / BITS_HASH
+        if len(bits) != BYTES_IMPRESSAO:
+            return d_phash
+
+        diferentes = _POPCOUNT[np.bitwise_xor(self.extras[selecionar], bits[bytes_phash:])]
+        combinada = PESOS_IMPRESSAO[IMPRESSAO[0][0]] * d_phash
+        inicio = 0
+        for nome, n_bits in IMPRESSAO[1:]:
+            combinada += PESOS_IMPRESSAO[nome] * diferentes[:, inicio:inicio + n_bits // 8].sum(axis=1) / n_bits
+            inicio += n_bits // 8
+        return np.where(self.tem_extras[selecionar], combinada, d_phash)
+
+    def _candidatos(self, descritor, distancias_hash, limite):
+        """Linhas a pontuar: listas IVF mais próximas + melhores pelo pHash."""
+        if self.listas is None:
+            return np.arange(len(self))
+
+        nprobe = getattr(settings, "INDICE_IVF_NPROBE", 8)
+        proximos = np.argsort(((self.centroides - descritor) ** 2).sum(axis=1))[:nprobe]
+        por_lista = np.isin(self.listas, proximos) & self.tem_descritor
+
+        quantos = min(len(self), limite * 4)
+        por_hash = np.zeros(len(self), dtype=bool)
+        por_hash[np.argpartition(distancias_hash, quantos - 1)[:quantos]] = True
+        return np.flatnonzero(por_lista | por_hash)
+
+    def buscar(self, descritor, bits, limite=20, permitidos=None, filtros=None, rastreio=None):
+        """
+        Retorna [(item_id, similaridade)] ordenado, com similaridade 0-100.
+        `bits` é o pHash da consulta ou a impressão multi-hash completa.
+        Filtros (ver `mascara`) são aplicados antes da pontuação: só as linhas que
+        passam neles têm distância de pHash e descritor calculadas.
+        `rastreio` (busca_visual.Rastreio), se informado, recebe as contagens de linhas.
+        """
+        if not len(self):
+            return []
+
+        mascara = self.mascara(filtros, permitidos)
+        if mascara is None:
+            distancias_hash = self._distancias_hash(bits)
+            linhas = self._candidatos(descritor, distancias_hash, limite)
+        else:
+            distancias_hash = np.ones(len(self))
+            filtradas = np.flatnonzero(mascara)
+            distancias_hash[filtradas] = self._distancias_hash(bits, filtradas)
+            if len(filtradas) < getattr(settings, "INDICE_IVF_MINIMO", 2000):
+                linhas = filtradas  # subconjunto pequeno: varre tudo
+            else:
+                linhas = self._candidatos(descritor, distancias_hash, limite)
+                linhas = linhas[mascara[linhas]]
+            if rastreio is not None:
+                rastreio.anotar(filtradas=int(len(filtradas)))
+            if not len(linhas):
+                return []
+        if rastreio is not None:
+            rastreio.anotar(catalogo=len(self), candidatos=int(len(linhas)), ivf=self.listas is not None,
+                            multihash=len(bits) == BYTES_IMPRESSAO)
+
+        # Similaridade estrutural via pHash (ou impressão multi-hash)
+        sim_hash = np.maximum(0, 100 - distancias_hash[linhas] * 100)
+
+        # Similaridade de aparência via descritor (distância L2 entre vetores unitários)
+        if descritor is not None:
+            dist = np.linalg.norm(self.descritores[linhas] - descritor, axis=1)
+            sim_desc = np.clip(100 * (1 - dist), 0, 100)
+            sim_desc = np.where(self.tem_descritor[linhas], sim_desc, 50.0)  # neutro sem descritor
+        else:
+            sim_desc = np.full(len(linhas), 50.0)
+
+        # Similaridade final combinada: 50% formato + 50% aparência
+        final = sim_hash * 0.5 + sim_desc * 0.5
+        ordem = np.argsort(-final, kind="stable")
+        resultados = []
+        for pos in ordem:
+            if final[pos] < SIMILARIDADE_MINIMA or len(resultados) >= limite:
+                break
+            resultados.append((int(self.ids[linhas[pos]]), round(float(final[pos]), 1)))
+        return resultados
+
+
+# -----------------------------
+# Cache por processo
+# -----------------------------
+_lock = threading.Lock()
+_indice = None
+_marca = None  # (contagem, maior id, último atualizado_em, contador) na última sincronização
+_verificado_em = 0.0
+# contador no cache compartilhado, incrementado a cada save/delete de Item confirmado:
+# muda a versão mesmo quando uma transação confirmada tarde não altera contagem nem máximos
+CHAVE_CONTADOR = "indice_visual:contador"
+
+
+def _com_imagem():
+    from items.models import Item
+
+    return Item.objects.exclude(image_hash__isnull=True).exclude(image_hash='')
+
+
+def _linhas(qs):
+    return qs.values_list(*COLUNAS).iterator()
+
+
+def _estado():
+    agregado = _com_imagem().aggregate(n=Count("id"), maior_id=Max("id"), ultimo=Max("atualizado_em"))
+    return (agregado["n"], agregado["maior_id"], agregado["ultimo"], cache.get(CHAVE_CONTADOR, 0))
+
+
+def obter_indice():
+    """Índice do processo; sincroniza com o banco se passou INDICE_VISUAL_INTERVALO desde a última checagem."""
+    global _indice, _marca, _verificado_em
+    from items.models import Item
+
+    intervalo = getattr(settings, "INDICE_VISUAL_INTERVALO", 5)
+    if _indice is not None and time.monotonic() - _verificado_em < intervalo:
+        return _indice
+
+    with _lock:
+        if _indice is not None and time.monotonic() - _verificado_em < intervalo:
+            return _indice
+        estado = _estado()
+        if _indice is None:
+            _indice = IndiceVisual.construir(_linhas(_com_imagem()))
+        elif estado != _marca:
+            # inclui itens sem pHash: os que perderam a imagem saem do índice. A folga
+            # cobre transações confirmadas depois da última leitura com atualizado_em anterior
+            alterados = Item.objects.all()
+            if _marca[2] is not None:
+                folga = timedelta(seconds=getattr(settings, "INDICE_VISUAL_FOLGA", 60))
+                alterados = alterados.filter(atualizado_em__gte=_marca[2] - folga)
+            indice = _indice.atualizar(_linhas(alterados))
+            if len(indice) + len(indice.ignorados) != estado[0] or indice.precisa_treinar():
+                # remoção feita por outro processo, ou catálogo cresceu demais para o IVF atual
+                indice = IndiceVisual.construir(_linhas(_com_imagem()), anterior=_indice)
+            _indice = indice
+        _marca = estado
+        _verificado_em = time.monotonic()
+    return _indice
+
+
+def versao_catalogo():
+    """Versão do catálogo em que está o índice do processo (sincronizado por obter_indice)."""
+    obter_indice()
+    return _marca
+
+
+def _incrementar_contador():
+    try:
+        cache.incr(CHAVE_CONTADOR)
+    except ValueError:
+        cache.add(CHAVE_CONTADOR, 1, None)
+
+
+def catalogo_alterado(sender=None, **kwargs):
+    """
+    post_save/post_delete do Item: a próxima busca deste processo confere a versão, e
+    os outros processos a veem mudar (contador) quando a transação for confirmada.
+    """
+    global _verificado_em
+    _verificado_em = 0.0
+    transaction.on_commit(_incrementar_contador)
+
+
+def descartar():
+    """Esquece o índice do processo; o próximo obter_indice o reconstrói."""
+    global _indice, _marca
+    with _lock:
+        _indice = _marca = None
+
+
+def similaridade_par(hash_a, descritor_a, hash_b, descritor_b):
+    """
+    Similaridade visual (0-100) entre dois itens a partir dos campos gravados
+    (image_hash hexadecimal e descritor em bytes). Retorna None se faltar hash.
+    """
+    if not hash_a or not hash_b:
+        return None
+    try:
+        bits_a, bits_b = hash_para_bits(hash_a), hash_para_bits(hash_b)
+    except ValueError:
+        return None
+    if len(bits_a) != len(bits_b):
+        return None
+    distancia = int(_POPCOUNT[np.bitwise_xor(bits_a, bits_b)].sum())
+    sim_hash = max(0.0, 100 - distancia / BITS_HASH * 100)
+
+    vetor_a, vetor_b = bytes_para_descritor(descritor_a), bytes_para_descritor(descritor_b)
+    if vetor_a is not None and vetor_b is not None:
+        sim_desc = float(np.clip(100 * (1 - np.linalg.norm(vetor_a - vetor_b)), 0, 100))
+    else:
+        sim_desc = 50.0
+    return sim_hash * 0.5 + sim_desc * 0.5
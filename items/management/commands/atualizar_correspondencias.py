@@ -0,0 +1,25 @@
+"""
+Management command para (re)calcular a tabela de correspondências perdido↔achado.
+Uso: python manage.py atualizar_correspondencias
+
+Normalmente a tabela é mantida pelo Item.save(); este comando serve para preencher
+itens antigos ou aplicar novos pesos/limiares a todo o catálogo.
+"""
+from django.core.management.base import BaseCommand
+
+from items.correspondencia import atualizar_correspondencias
+from items.models import Item
+
+
+class Command(BaseCommand):
+    help = 'Recalcula as correspondências entre itens perdidos e achados'
+
+    def handle(self, *args, **options):
+        itens = Item.objects.exclude(status='devolvido').order_by('id')
+        total = itens.count()
+        encontrados = 0
+        for i, item in enumerate(itens.iterator(chunk_size=200), start=1):
+            encontrados += atualizar_correspondencias(item)
+            if i % 200 == 0:
+                self.stdout.write(f"  [{i}/{total}]")
+        self.stdout.write(self.style.SUCCESS(f"\nConcluído! {total} itens, {encontrados} correspondências."))
@@ -0,0 +1,29 @@
+"""
+Management command para atualizar a tabela de itens parecidos (items/similares.py).
+Uso: python manage.py atualizar_similares [--tudo]
+
+Incremental por padrão: só recompara itens criados ou alterados desde a última
+execução. Agende com --tudo de tempos em tempos (ex.: cron diário) para reconstruir
+todas as listas.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from items.similares import atualizar_similares
+
+
+class Command(BaseCommand):
+    help = 'Atualiza os itens parecidos (texto + imagem) exibidos na página de cada item'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tudo', action='store_true', help='Recalcula as listas de todos os itens')
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        stats = atualizar_similares(tudo=options['tudo'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Concluído! {stats['recalculados']}/{stats['catalogo']} itens recalculados "
+            f"(+{stats['vizinhos']} vizinhos), "
+            f"{stats['pares']} pares em {time.monotonic() - inicio:.1f}s."
+        ))
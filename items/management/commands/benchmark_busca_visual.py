@@ -0,0 +1,184 @@
+"""
+Management command para medir velocidade e qualidade da busca visual.
+Uso: python manage.py benchmark_busca_visual --itens 2000 --consultas 200 --k 1 5 10
+
+Gera (ou carrega de --pasta) um corpus de imagens, cadastra itens temporários,
+cria consultas aumentadas (rotação, recorte, mudança de cor) e reporta, para cada
+estratégia, latência p50/p95/p99, pico de memória e recall@k.
+Tudo roda dentro de uma transação desfeita ao final: nada fica no banco.
+"""
+import time
+import tracemalloc
+from datetime import date
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+ESTRATEGIAS = ["busca_local", "exaustivo", "ivf", "phash", "multihash"]
+
+
+class _Rollback(Exception):
+    pass
+
+
+# -----------------------------
+# Corpus sintético
+# -----------------------------
+def gerar_imagem(rng, lado=256):
+    """Imagem sintética: fundo colorido com algumas formas aleatórias."""
+    from PIL import Image as PILImage, ImageDraw
+
+    fundo = tuple(int(c) for c in rng.integers(0, 256, size=3))
+    img = PILImage.new("RGB", (lado, lado), fundo)
+    desenho = ImageDraw.Draw(img)
+    for _ in range(int(rng.integers(2, 6))):
+        x0, y0 = (int(v) for v in rng.integers(0, lado * 3 // 4, size=2))
+        x1, y1 = x0 + int(rng.integers(lado // 8, lado // 2)), y0 + int(rng.integers(lado // 8, lado // 2))
+        cor = tuple(int(c) for c in rng.integers(0, 256, size=3))
+        if rng.random() < 0.5:
+            desenho.rectangle([x0, y0, x1, y1], fill=cor)
+        else:
+            desenho.ellipse([x0, y0, x1, y1], fill=cor)
+    return img
+
+
+def aumentar(img, rng):
+    """Variante de consulta: rotação leve, recorte e deslocamento de cor."""
+    from PIL import Image as PILImage, ImageEnhance
+
+    largura, altura = img.size
+    img = img.rotate(float(rng.uniform(-15, 15)), resample=PILImage.BILINEAR, fillcolor=img.getpixel((0, 0)))
+    margem = int(min(largura, altura) * rng.uniform(0, 0.12))
+    img = img.crop((margem, margem, largura - margem, altura - margem)).resize((largura, altura))
+    img = ImageEnhance.Color(img).enhance(float(rng.uniform(0.7, 1.3)))
+    return ImageEnhance.Brightness(img).enhance(float(rng.uniform(0.8, 1.2)))
+
+
+def para_jpeg(img):
+    buffer = BytesIO()
+    img.convert("RGB").save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def percentil(valores, p):
+    return float(np.percentile(valores, p)) if valores else 0.0
+
+
+class Command(BaseCommand):
+    help = 'Mede latência, memória e recall@k das estratégias de busca visual'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--itens', type=int, default=1000, help='Tamanho do corpus sintético')
+        parser.add_argument('--consultas', type=int, default=100, help='Número de consultas aumentadas')
+        parser.add_argument('--k', type=int, nargs='+', default=[1, 5, 10], help='Valores de k para recall@k')
+        parser.add_argument('--pasta', type=str, default='', help='Carrega o corpus de uma pasta de imagens')
+        parser.add_argument('--estrategias', nargs='+', choices=ESTRATEGIAS, default=ESTRATEGIAS)
+        parser.add_argument('--semente', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['semente'])
+
+        corpus = self._carregar_corpus(options, rng)
+        n_consultas = min(options['consultas'], len(corpus))
+        alvos = rng.choice(len(corpus), size=n_consultas, replace=False)
+        consultas = [(int(i), para_jpeg(aumentar(corpus[i], rng))) for i in alvos]
+
+        self.stdout.write(f"Corpus: {len(corpus)} imagens | consultas: {n_consultas}")
+        try:
+            with transaction.atomic():
+                ids = self._cadastrar(corpus)
+                for nome in options['estrategias']:
+                    self._medir(nome, ids, consultas, sorted(options['k']))
+                raise _Rollback
+        except _Rollback:
+            pass
+        self.stdout.write(self.style.SUCCESS("\nConcluído! Itens temporários removidos."))
+
+    def _carregar_corpus(self, options, rng):
+        from PIL import Image as PILImage
+
+        if options['pasta']:
+            extensoes = {'.jpg', '.jpeg', '.png', '.webp'}
+            arquivos = sorted(p for p in Path(options['pasta']).iterdir() if p.suffix.lower() in extensoes)
+            return [PILImage.open(p).convert("RGB") for p in arquivos[:options['itens']]]
+        return [gerar_imagem(rng) for _ in range(options['itens'])]
+
+    def _cadastrar(self, corpus):
+        """Cadastra itens já com hash e descritor (sem gravar as imagens no storage)."""
+        import imagehash
+        from django.contrib.auth.models import User
+        from items.descritores import calcular_descritor, calcular_impressao, descritor_para_bytes
+        from items.models import Item
+
+        usuario = User.objects.create(username=f"benchmark_{int(time.time())}")
+        itens = [
+            Item(
+                titulo=f"Benchmark {i}", slug=f"benchmark-{usuario.pk}-{i}", descricao="", status="achado",
+                local="", data=date.today(), usuario=usuario,
+                image_hash=str(imagehash.phash(img, hash_size=16)),
+                impressao=calcular_impressao(img),
+                descritor=descritor_para_bytes(calcular_descritor(img)),
+            )
+            for i, img in enumerate(corpus)
+        ]
+        criados = Item.objects.bulk_create(itens, batch_size=500)
+        return [item.pk for item in criados]
+
+    def _estrategia(self, nome):
+        """Retorna (função (bytes_da_imagem, limite) -> [item_id], índice usado)."""
+        import imagehash
+        from PIL import Image as PILImage
+        from items import indice_visual
+        from items.busca_visual import buscar_local
+        from items.descritores import calcular_descritor, calcular_impressao, hash_para_bits, impressao_para_bits
+        from items.models import Item
+
+        if nome == "busca_local":
+            indice = indice_visual.obter_indice()  # aquece o cache do processo
+            return (lambda dados, limite: [item.pk for item, _ in buscar_local(dados, limite)]), indice
+
+        # só "ivf" monta o IVF (com qualquer tamanho de catálogo); as outras varrem tudo.
+        # phash e multihash: só a parte estrutural (sem descritor)
+        indice = indice_visual.IndiceVisual.construir(
+            Item.objects.exclude(image_hash__isnull=True).values_list(*indice_visual.COLUNAS).iterator(),
+            treinar=nome == "ivf", minimo_ivf=1,
+        )
+
+        def consultar(dados, limite):
+            img = PILImage.open(BytesIO(dados))
+            if nome == "multihash":
+                bits = impressao_para_bits(calcular_impressao(img))
+            else:
+                bits = hash_para_bits(str(imagehash.phash(img, hash_size=16)))
+            descritor = None if nome in ("phash", "multihash") else calcular_descritor(img)
+            return [item_id for item_id, _ in indice.buscar(descritor, bits, limite=limite)]
+        return consultar, indice
+
+    def _medir(self, nome, ids, consultas, ks):
+        consultar, indice = self._estrategia(nome)
+        tamanho_indice = sum(
+            a.nbytes for a in (indice.ids, indice.hashes, indice.descritores, indice.centroides) if a is not None
+        )
+        limite = max(ks)
+        latencias, acertos = [], {k: 0 for k in ks}
+
+        tracemalloc.start()
+        for alvo, dados in consultas:
+            inicio = time.perf_counter()
+            encontrados = consultar(dados, limite)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            for k in ks:
+                if ids[alvo] in encontrados[:k]:
+                    acertos[k] += 1
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        recall = " ".join(f"R@{k}={acertos[k] / len(consultas):.3f}" for k in ks)
+        self.stdout.write(
+            f"  {nome:<12} p50={percentil(latencias, 50):7.2f}ms p95={percentil(latencias, 95):7.2f}ms "
+            f"p99={percentil(latencias, 99):7.2f}ms indice={tamanho_indice / 1024:8.1f}KiB "
+            f"pico_consulta={pico / 1024:8.1f}KiB {recall}"
+        )
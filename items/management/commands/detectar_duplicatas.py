@@ -0,0 +1,27 @@
+"""
+Management command para encontrar itens com fotos quase duplicadas.
+Uso: python manage.py detectar_duplicatas [--tudo]
+
+Por padrão só compara itens novos ou com imagem alterada contra o catálogo.
+Os grupos encontrados aparecem para os bolsistas em /api/bolsista/duplicatas/.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from items.duplicatas import detectar_duplicatas
+
+
+class Command(BaseCommand):
+    help = 'Detecta pares de itens com fotos quase idênticas (pHash + descritor)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tudo', action='store_true', help='Recompara o catálogo inteiro')
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        resultado = detectar_duplicatas(tudo=options['tudo'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Concluído! {resultado['comparados']} itens comparados contra {resultado['catalogo']} "
+            f"em {time.monotonic() - inicio:.2f}s: {resultado['pares']} pares, {resultado['grupos']} grupos pendentes."
+        ))
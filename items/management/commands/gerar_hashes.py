@@ -1,29 +1,140 @@
 """
-Management command para gerar image_hash de todos os itens que têm imagem.
-Uso: python manage.py gerar_hashes
+Management command para gerar image_hash, impressão multi-hash, descritor visual e cores dominantes dos itens que têm imagem.
+Uso: python manage.py gerar_hashes [--workers 4] [--lote 200] [--verificar] [--retomar]
+
+Por padrão só processa itens ainda sem hash/descritor/digest/cores, então rodar a cada
+deploy (start.sh) é praticamente instantâneo. Com --verificar relê os bytes de todas
+as imagens e recalcula apenas as que mudaram desde o último hash (digest SHA-256).
+
+A decodificação roda num pool de processos, os resultados são gravados com
+bulk_update por lote e o último id processado fica num checkpoint para --retomar.
 """
+import hashlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from items.models import Item
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from items.descritores import extrair_caracteristicas_ou_erro
+from items.models import CorItem, Item
+
+CAMPOS = ['image_hash', 'impressao', 'descritor', 'imagem_digest', 'duplicatas_verificadas', 'atualizado_em']
 
 
 class Command(BaseCommand):
-    help = 'Gera hashes visuais (pHash) para itens existentes com imagem'
+    help = 'Gera hashes visuais (pHash) e descritores para itens com imagem nova ou alterada'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processos de decodificação (1 = sem pool)')
+        parser.add_argument('--lote', type=int, default=200, help='Itens por lote de bulk_update')
+        parser.add_argument('--verificar', action='store_true',
+                            help='Relê todas as imagens e recalcula as que mudaram (compara o digest)')
+        parser.add_argument('--retomar', action='store_true', help='Continua a partir do último checkpoint')
+        parser.add_argument('--checkpoint', type=str,
+                            default=str(Path(settings.BASE_DIR) / '.gerar_hashes.checkpoint'))
 
     def handle(self, *args, **options):
+        checkpoint = Path(options['checkpoint'])
+        ultimo_id = 0
+        if options['retomar'] and checkpoint.exists():
+            ultimo_id = int(checkpoint.read_text().strip() or 0)
+            self.stdout.write(f"Retomando após o item #{ultimo_id}")
+
         itens = Item.objects.filter(imagem__isnull=False).exclude(imagem='')
+        if not options['verificar']:
+            itens = itens.filter(
+                Q(image_hash__isnull=True) | Q(image_hash='') |
+                Q(impressao__isnull=True) | Q(descritor__isnull=True) | Q(imagem_digest__isnull=True) |
+                ~Exists(CorItem.objects.filter(item=OuterRef('pk')))
+            )
+        itens = itens.filter(id__gt=ultimo_id).order_by('id')
         total = itens.count()
         self.stdout.write(f"Processando {total} itens com imagem...")
 
-        sucesso = 0
-        for i, item in enumerate(itens, 1):
-            try:
-                item._gerar_image_hash()
-                if item.image_hash:
-                    sucesso += 1
-                    self.stdout.write(f"  [{i}/{total}] ✓ {item.titulo} → {item.image_hash[:16]}...")
+        workers = max(1, options['workers'])
+        pool = None
+        if workers > 1 and total > 1:
+            # spawn: os filhos não herdam a conexão com o banco do processo principal
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        inicio = time.monotonic()
+        lidos = sucesso = inalterados = falhas = bytes_lidos = 0
+
+        try:
+            while True:
+                lote = list(
+                    itens.filter(id__gt=ultimo_id)
+                    .only('id', 'titulo', 'imagem', 'image_hash', 'impressao', 'descritor', 'imagem_digest')[:options['lote']]
+                )
+                if not lote:
+                    break
+
+                com_cores = set(
+                    CorItem.objects.filter(item_id__in=[item.id for item in lote]).values_list('item_id', flat=True)
+                )
+                pendentes, dados_pendentes = [], []
+                for item in lote:
+                    lidos += 1
+                    try:
+                        item.imagem.open('rb')
+                        dados = item.imagem.read()
+                        item.imagem.close()
+                    except Exception as e:
+                        falhas += 1
+                        self.stdout.write(f"  ✗ {item.titulo} → erro ao ler imagem: {e}")
+                        continue
+                    bytes_lidos += len(dados)
+                    digest = hashlib.sha256(dados).hexdigest()
+                    if (digest == item.imagem_digest and item.image_hash and item.impressao and item.descritor
+                            and item.id in com_cores):
+                        inalterados += 1
+                        continue
+                    pendentes.append(item)
+                    dados_pendentes.append(dados)
+
+                if pool is not None:
+                    resultados = pool.map(extrair_caracteristicas_ou_erro, dados_pendentes, chunksize=4)
                 else:
-                    self.stdout.write(f"  [{i}/{total}] ✗ {item.titulo} → sem hash")
-            except Exception as e:
-                self.stdout.write(f"  [{i}/{total}] ✗ {item.titulo} → erro: {e}")
+                    resultados = map(extrair_caracteristicas_ou_erro, dados_pendentes)
+
+                agora = timezone.now()
+                atualizar, cores = [], {}
+                for item, caracteristicas in zip(pendentes, resultados):
+                    if 'erro' in caracteristicas:
+                        falhas += 1
+                        self.stdout.write(f"  ✗ {item.titulo} → erro: {caracteristicas['erro']}")
+                        continue
+                    cores[item.id] = caracteristicas.pop('cores')
+                    for campo, valor in caracteristicas.items():
+                        setattr(item, campo, valor)
+                    item.duplicatas_verificadas = False
+                    item.atualizado_em = agora
+                    atualizar.append(item)
+
+                Item.objects.bulk_update(atualizar, CAMPOS)
+                CorItem.substituir(cores)
+                sucesso += len(atualizar)
+                ultimo_id = lote[-1].id
+                checkpoint.write_text(str(ultimo_id))
+
+                decorrido = max(time.monotonic() - inicio, 1e-6)
+                self.stdout.write(
+                    f"  [{lidos}/{total}] {sucesso} gerados, {inalterados} inalterados, {falhas} falhas "
+                    f"— {lidos / decorrido:.1f} itens/s, {bytes_lidos / decorrido / 1e6:.1f} MB/s"
+                )
+        finally:
+            if pool is not None:
+                pool.shutdown()
 
-        self.stdout.write(self.style.SUCCESS(f"\nConcluído! {sucesso}/{total} hashes gerados."))
+        checkpoint.unlink(missing_ok=True)
+        decorrido = time.monotonic() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"\nConcluído! {sucesso}/{total} hashes gerados, {inalterados} inalterados, "
+            f"{falhas} falhas em {decorrido:.1f}s."
+        ))
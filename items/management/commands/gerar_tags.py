@@ -0,0 +1,59 @@
+"""
+Management command para gerar tags descritivas das fotos dos itens (items/tags.py).
+Uso: python manage.py gerar_tags [--limite 100] [--tudo] [--descritor items.tags.DescritorLocal]
+
+Incremental: só processa itens cuja imagem mudou desde as últimas tags
+(tags_digest diferente de imagem_digest). Rode depois do gerar_hashes, que
+preenche o imagem_digest. Fotos com o mesmo digest reaproveitam o cache.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+
+from items.models import Item
+from items.tags import LimitadorTaxa, gerar_tags_item, obter_descritor
+
+
+class Command(BaseCommand):
+    help = 'Gera tags descritivas para as fotos novas ou alteradas dos itens'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limite', type=int, default=0, help='Máximo de itens nesta execução (0 = todos)')
+        parser.add_argument('--tudo', action='store_true', help='Regera as tags de todos os itens com imagem')
+        parser.add_argument('--descritor', type=str, default='', help='Classe do descritor (padrão: TAGS_DESCRITOR)')
+
+    def handle(self, *args, **options):
+        descritor = obter_descritor(options['descritor'] or None)
+        if not descritor.disponivel():
+            self.stdout.write(self.style.WARNING(f"Descritor '{descritor.nome}' indisponível (sem chave?). Nada feito."))
+            return
+
+        itens = Item.objects.filter(imagem_digest__isnull=False).exclude(imagem='')
+        if not options['tudo']:
+            itens = itens.filter(Q(tags_digest__isnull=True) | ~Q(tags_digest=F('imagem_digest')))
+        itens = itens.only('id', 'titulo', 'imagem', 'imagem_digest').order_by('id')
+        if options['limite']:
+            itens = itens[:options['limite']]
+        itens = list(itens)
+        self.stdout.write(f"Gerando tags de {len(itens)} itens com '{descritor.nome}'...")
+
+        limitador = LimitadorTaxa(getattr(settings, 'TAGS_POR_MINUTO', 30))
+        inicio = time.monotonic()
+        sucesso = do_cache = falhas = 0
+        for item in itens:
+            try:
+                tags, veio_do_cache = gerar_tags_item(item, descritor, limitador)
+            except Exception as e:
+                falhas += 1
+                self.stdout.write(f"  ✗ {item.titulo} → erro: {e}")
+                continue
+            sucesso += 1
+            do_cache += veio_do_cache
+            self.stdout.write(f"  ✓ {item.titulo} → {', '.join(tags)}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"\nConcluído! {sucesso}/{len(itens)} itens ({do_cache} do cache), {falhas} falhas "
+            f"em {time.monotonic() - inicio:.1f}s."
+        ))
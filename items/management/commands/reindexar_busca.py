@@ -0,0 +1,29 @@
+"""
+Management command para reconstruir o índice de busca textual (items/busca_texto.py).
+Uso: python manage.py reindexar_busca
+
+Reconstrói também o texto normalizado e os trigramas (TrigramaItem) da busca
+tolerante a erros. Os índices são mantidos automaticamente a cada criação/edição/
+remoção de item; use este comando depois de importações feitas direto no banco ou
+para compactar o índice.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from items.busca_texto import garantir_gatilhos, obter_backend, reconstruir_trigramas
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o índice full-text da busca de itens (FTS5 no SQLite, FULLTEXT no MySQL)'
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        garantir_gatilhos()
+        backend = obter_backend()
+        total = backend.reconstruir()
+        com_trigramas = reconstruir_trigramas()
+        self.stdout.write(self.style.SUCCESS(
+            f"Concluído! Índice '{backend.nome}' com {total} itens e trigramas de {com_trigramas} itens "
+            f"em {time.monotonic() - inicio:.1f}s."
+        ))
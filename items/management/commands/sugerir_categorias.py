@@ -0,0 +1,50 @@
+"""
+Management command para preencher a categoria dos itens que ficaram sem (items/categorizacao.py).
+Uso: python manage.py sugerir_categorias [--simular] [--minima 0.6]
+
+Cada item sem categoria recebe a categoria votada pelos vizinhos mais parecidos
+(texto + descritor visual) entre os itens já categorizados. Cada item é gravado com
+save (correspondências, caches e índices) e percolado nas buscas salvas, que agora
+podem casar pela categoria.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from items.alertas import percolar
+from items.categorizacao import obter_indice, sugerir_categoria
+from items.models import Categoria, Item
+
+
+class Command(BaseCommand):
+    help = 'Sugere e aplica categorias para itens sem categoria (k-NN sobre texto e imagem)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simular', action='store_true', help='Só mostra as sugestões, sem gravar')
+        parser.add_argument('--minima', type=float, default=None,
+                            help='Confiança mínima (padrão: CATEGORIA_SUGESTAO_MINIMA)')
+
+    def handle(self, *args, **options):
+        minima = options['minima']
+        if minima is None:
+            minima = getattr(settings, 'CATEGORIA_SUGESTAO_MINIMA', 0.6)
+
+        indice = obter_indice()
+        nomes = dict(Categoria.objects.values_list('id', 'nome'))
+        itens = list(Item.objects.filter(categoria__isnull=True))
+        self.stdout.write(f"{len(itens)} itens sem categoria, {len(indice)} categorizados no índice.")
+
+        atualizar = []
+        for item in itens:
+            categoria_id, confianca = sugerir_categoria(item, indice)
+            if categoria_id is None or confianca < minima:
+                continue
+            self.stdout.write(f"  {item.titulo} → {nomes.get(categoria_id)} ({confianca:.0%})")
+            item.categoria_id = categoria_id
+            atualizar.append(item)
+
+        if not options['simular']:
+            for item in atualizar:
+                item.save(update_fields=['categoria', 'atualizado_em'])
+                percolar(item)
+        acao = 'sugeridas' if options['simular'] else 'aplicadas'
+        self.stdout.write(self.style.SUCCESS(f"\nConcluído! {len(atualizar)}/{len(itens)} categorias {acao}."))
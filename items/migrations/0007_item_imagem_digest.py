@@ -0,0 +1,18 @@
+# Generated by Django 6.0.3 on 2026-10-19 10:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0006_item_descritor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='imagem_digest',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+    ]
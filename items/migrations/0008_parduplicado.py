@@ -0,0 +1,37 @@
+# Generated by Django 6.0.3 on 2026-10-19 10:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0007_item_imagem_digest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='duplicatas_verificadas',
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+        migrations.CreateModel(
+            name='ParDuplicado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distancia_hash', models.PositiveSmallIntegerField()),
+                ('similaridade', models.FloatField()),
+                ('grupo', models.PositiveBigIntegerField(db_index=True, default=0)),
+                ('resolvido', models.BooleanField(db_index=True, default=False)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('item_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duplicatas_como_a', to='items.item')),
+                ('item_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duplicatas_como_b', to='items.item')),
+            ],
+            options={
+                'db_table': 'find_parduplicado',
+                'ordering': ['grupo', '-similaridade'],
+                'constraints': [models.UniqueConstraint(fields=('item_a', 'item_b'), name='unique_par_duplicado')],
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 6.0.3 on 2026-10-19 10:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0008_parduplicado'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Correspondencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pontuacao', models.FloatField()),
+                ('detalhes', models.JSONField(blank=True, default=dict)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'find_correspondencia',
+                'ordering': ['-pontuacao'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['status', 'data'], name='item_status_data_idx'),
+        ),
+        migrations.AddField(
+            model_name='correspondencia',
+            name='candidato',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='items.item'),
+        ),
+        migrations.AddField(
+            model_name='correspondencia',
+            name='item',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='correspondencias', to='items.item'),
+        ),
+        migrations.AddIndex(
+            model_name='correspondencia',
+            index=models.Index(fields=['item', '-pontuacao'], name='corresp_item_pontuacao_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='correspondencia',
+            constraint=models.UniqueConstraint(fields=('item', 'candidato'), name='unique_correspondencia'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.3 on 2026-10-19 10:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0009_correspondencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cor', models.CharField(choices=[('preto', 'Preto'), ('branco', 'Branco'), ('cinza', 'Cinza'), ('vermelho', 'Vermelho'), ('laranja', 'Laranja'), ('amarelo', 'Amarelo'), ('verde', 'Verde'), ('azul', 'Azul'), ('roxo', 'Roxo'), ('rosa', 'Rosa'), ('marrom', 'Marrom'), ('bege', 'Bege')], max_length=20)),
+                ('proporcao', models.FloatField()),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cores', to='items.item')),
+            ],
+            options={
+                'db_table': 'find_coritem',
+                'ordering': ['-proporcao'],
+                'indexes': [models.Index(fields=['cor', 'item'], name='coritem_cor_item_idx')],
+                'constraints': [models.UniqueConstraint(fields=('item', 'cor'), name='unique_cor_item')],
+            },
+        ),
+    ]
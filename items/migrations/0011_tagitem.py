@@ -0,0 +1,48 @@
+# Generated by Django 6.0.3 on 2026-10-19 11:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0010_coritem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='tags_digest',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.CreateModel(
+            name='CacheTags',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64)),
+                ('descritor', models.CharField(max_length=20)),
+                ('tags', models.JSONField(default=list)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'find_cachetags',
+                'constraints': [models.UniqueConstraint(fields=('digest', 'descritor'), name='unique_cache_tags')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TagItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.CharField(max_length=40)),
+                ('origem', models.CharField(default='gemini', max_length=20)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tags', to='items.item')),
+            ],
+            options={
+                'db_table': 'find_tagitem',
+                'indexes': [models.Index(fields=['tag', 'item'], name='tagitem_tag_item_idx')],
+                'constraints': [models.UniqueConstraint(fields=('item', 'tag'), name='unique_tag_item')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.0.3 on 2026-10-19 11:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0011_tagitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='similares_em',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='ItemSimilar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pontuacao', models.FloatField()),
+                ('sim_texto', models.FloatField(default=0)),
+                ('sim_imagem', models.FloatField(blank=True, null=True)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similares', to='items.item')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='items.item')),
+            ],
+            options={
+                'db_table': 'find_itemsimilar',
+                'ordering': ['-pontuacao'],
+                'indexes': [models.Index(fields=['item', '-pontuacao'], name='similar_item_pontuacao_idx')],
+                'constraints': [models.UniqueConstraint(fields=('item', 'similar'), name='unique_item_similar')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.3 on 2026-10-19 11:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0012_itemsimilar'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='impressao',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import OperationalError, migrations
+
+FTS5_CRIAR = (
+    "CREATE VIRTUAL TABLE find_item_fts USING fts5("
+    "titulo, descricao, local, tokenize='unicode61 remove_diacritics 2')"
+)
+FULLTEXT_CRIAR = "ALTER TABLE mainpage_item ADD FULLTEXT INDEX item_busca_fulltext (titulo, descricao, local)"
+
+
+def criar_indice(apps, schema_editor):
+    from items.busca_texto import garantir_gatilhos
+
+    conexao = schema_editor.connection
+    if conexao.vendor == "sqlite":
+        try:
+            schema_editor.execute(FTS5_CRIAR)
+        except OperationalError:
+            return  # SQLite compilado sem FTS5: a busca usa icontains (items/busca_texto.py)
+        garantir_gatilhos(conexao)  # cria os gatilhos e preenche o índice
+    elif conexao.vendor == "mysql":
+        schema_editor.execute(FULLTEXT_CRIAR)
+
+
+def remover_indice(apps, schema_editor):
+    conexao = schema_editor.connection
+    if conexao.vendor == "sqlite":
+        for sufixo in ("ai", "ad", "au"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS find_item_fts_{sufixo}")
+        schema_editor.execute("DROP TABLE IF EXISTS find_item_fts")
+    elif conexao.vendor == "mysql":
+        schema_editor.execute("ALTER TABLE mainpage_item DROP INDEX item_busca_fulltext")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0013_item_impressao'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 6.0.3 on 2026-10-19 11:18
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# cópia de items.texto na época desta migração: a migração não deve mudar se o módulo mudar
+_NAO_ALFANUMERICO = re.compile(r"[^a-z0-9]+")
+
+
+def _normalizar(texto):
+    if not texto:
+        return ""
+    sem_acento = unicodedata.normalize("NFKD", str(texto)).encode("ascii", "ignore").decode("ascii")
+    return _NAO_ALFANUMERICO.sub(" ", sem_acento.lower()).strip()
+
+
+def _trigramas(texto_normalizado):
+    saida = set()
+    for palavra in texto_normalizado.split():
+        marcada = f"  {palavra} "
+        saida.update(marcada[i:i + 3] for i in range(len(marcada) - 2))
+    return saida
+
+
+def preencher_trigramas(apps, schema_editor):
+    Item = apps.get_model('items', 'Item')
+    TrigramaItem = apps.get_model('items', 'TrigramaItem')
+    ultimo_id = 0
+    while True:
+        # lotes por id (sem cursor aberto durante as escritas)
+        itens = list(
+            Item.objects.filter(pk__gt=ultimo_id).order_by('pk')
+            .only('id', 'titulo', 'descricao', 'local')[:500]
+        )
+        if not itens:
+            break
+        trigramas = []
+        for item in itens:
+            item.texto_normalizado = _normalizar(f"{item.titulo} {item.descricao} {item.local}")
+            trigramas.extend(TrigramaItem(item_id=item.pk, trigrama=t) for t in _trigramas(item.texto_normalizado))
+        Item.objects.bulk_update(itens, ['texto_normalizado'])
+        TrigramaItem.objects.bulk_create(trigramas, batch_size=1000)
+        ultimo_id = itens[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0014_busca_texto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='texto_normalizado',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.CreateModel(
+            name='TrigramaItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigrama', models.CharField(max_length=3)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigramas', to='items.item')),
+            ],
+            options={
+                'db_table': 'find_trigramaitem',
+                'indexes': [models.Index(fields=['trigrama', 'item'], name='trigramaitem_trigrama_idx')],
+                'constraints': [models.UniqueConstraint(fields=('item', 'trigrama'), name='unique_trigrama_item')],
+            },
+        ),
+        migrations.RunPython(preencher_trigramas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 6.0.3 on 2026-10-19 11:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0015_trigramaitem'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BuscaSalva',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('q', models.CharField(blank=True, max_length=100)),
+                ('cor', models.CharField(blank=True, choices=[('preto', 'Preto'), ('branco', 'Branco'), ('cinza', 'Cinza'), ('vermelho', 'Vermelho'), ('laranja', 'Laranja'), ('amarelo', 'Amarelo'), ('verde', 'Verde'), ('azul', 'Azul'), ('roxo', 'Roxo'), ('rosa', 'Rosa'), ('marrom', 'Marrom'), ('bege', 'Bege')], max_length=20)),
+                ('local', models.CharField(blank=True, max_length=45)),
+                ('status', models.CharField(choices=[('achado', 'Achados'), ('perdido', 'Perdidos')], default='achado', max_length=10)),
+                ('chave', models.CharField(editable=False, max_length=60)),
+                ('ativa', models.BooleanField(default=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('categoria', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='items.categoria')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buscas_salvas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'find_buscasalva',
+                'ordering': ['-criado_em'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AlertaBusca',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lido', models.BooleanField(default=False)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='items.item')),
+                ('busca', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alertas', to='items.buscasalva')),
+            ],
+            options={
+                'db_table': 'find_alertabusca',
+                'ordering': ['-criado_em', '-id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='buscasalva',
+            index=models.Index(fields=['chave', 'status'], name='buscasalva_chave_status_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='alertabusca',
+            constraint=models.UniqueConstraint(fields=('busca', 'item'), name='unique_alerta_busca_item'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.3 on 2026-10-19 11:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('items', '0016_buscasalva_alertabusca'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='item',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
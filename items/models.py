@@ -2,6 +2,10 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.utils.text import slugify
 
+from items import cache_busca
+from items.descritores import CORES
+from items.texto import normalizar, trigramas
+
 
 class ArquivoMidia(models.Model):
     """Armazena arquivos de mídia (imagens) diretamente no banco de dados."""
@@ -48,13 +52,40 @@ class Item(models.Model):
     data = models.DateField()
     imagem = models.ImageField(upload_to='itens/', blank=True, null=True)
     image_hash = models.CharField(max_length=64, blank=True, null=True, db_index=True)
+    # pHash + aHash + dHash + wHash empacotados (items/descritores.py, IMPRESSAO)
+    impressao = models.BinaryField(blank=True, null=True, editable=False)
+    descritor = models.BinaryField(blank=True, null=True, editable=False)
+    imagem_digest = models.CharField(max_length=64, blank=True, null=True, editable=False)
+    duplicatas_verificadas = models.BooleanField(default=False, db_index=True, editable=False)
+    tags_digest = models.CharField(max_length=64, blank=True, null=True, editable=False)
+    similares_em = models.DateTimeField(blank=True, null=True, editable=False)
+    # título + descrição + local sem acentos e em minúsculas (base dos trigramas de busca)
+    texto_normalizado = models.TextField(blank=True, default='', editable=False)
     criado_em = models.DateTimeField(auto_now_add=True)
-    atualizado_em = models.DateTimeField(auto_now=True)
+    # indexado: sincronização incremental dos índices em memória (indice_visual, sugestoes, categorizacao)
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True)
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='itens')
     categoria = models.ForeignKey('Categoria', on_delete=models.SET_NULL, null=True)
 
     class Meta:
         db_table = 'mainpage_item'
+        indexes = [
+            # bloqueio do motor de correspondência: status oposto + janela de datas
+            models.Index(fields=['status', 'data'], name='item_status_data_idx'),
+        ]
+
+    # campos que entram na pontuação das correspondências (items/correspondencia.py)
+    CAMPOS_CORRESPONDENCIA = ('titulo', 'descricao', 'local', 'categoria_id', 'data', 'image_hash', 'status')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._correspondencia_salva = instancia._campos_correspondencia()
+        return instancia
+
+    def _campos_correspondencia(self):
+        # __dict__ em vez de getattr: campos adiados (only/defer) não disparam consulta
+        return tuple(str(self.__dict__.get(campo)) for campo in self.CAMPOS_CORRESPONDENCIA)
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -65,34 +96,89 @@ class Item(models.Model):
                 slug = f"{base_slug}-{contador}"
                 contador += 1
             self.slug = slug
+        texto = normalizar(f"{self.titulo} {self.descricao} {self.local}")
+        texto_mudou = texto != self.texto_normalizado
+        if texto_mudou:
+            self.texto_normalizado = texto
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'texto_normalizado'}
+        novo = self._state.adding
         super().save(*args, **kwargs)
-        self._gerar_image_hash()
+        if texto_mudou:
+            TrigramaItem.substituir({self.pk: texto})
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'imagem' in update_fields:
+            self._gerar_image_hash()
         self._gerar_qrcode()
+        self._atualizar_correspondencias()
+        if novo:
+            self._alertar_buscas_salvas()
 
     def _gerar_image_hash(self):
-        """Gera pHash da imagem para busca visual (compatível com DatabaseStorage)."""
+        """
+        Gera pHash, impressão multi-hash e descritor visual da imagem para busca visual (compatível com DatabaseStorage).
+        Se o digest dos bytes da imagem não mudou desde o último cálculo, nada é decodificado.
+        """
         if not self.imagem:
             return
         try:
-            import imagehash
-            from PIL import Image as PILImage
+            import hashlib
+            from django.utils import timezone
+            from items.descritores import extrair_caracteristicas
 
             self.imagem.open('rb')
-            img = PILImage.open(self.imagem)
-            img.load()  # força leitura completa (importante para storage remoto)
+            dados = self.imagem.read()  # leitura completa (importante para storage remoto)
             self.imagem.close()
 
-            phash = str(imagehash.phash(img, hash_size=16))
-
-            if self.image_hash != phash:
-                Item.objects.filter(pk=self.pk).update(image_hash=phash)
-                self.image_hash = phash
+            digest = hashlib.sha256(dados).hexdigest()
+            if (digest == self.imagem_digest and self.image_hash and self.impressao and self.descritor
+                    and self.cores.exists()):
+                return
+
+            # já calculadas na checagem de duplicatas do cadastro (items/duplicatas.py)
+            prontas = self.__dict__.pop('_caracteristicas', None)
+            if prontas is not None and prontas.get('imagem_digest') == digest:
+                caracteristicas = dict(prontas)
+            else:
+                caracteristicas = extrair_caracteristicas(dados)
+            CorItem.substituir({self.pk: caracteristicas.pop('cores')})
+            # atualizado_em muda junto para invalidar o índice visual em memória
+            # imagem nova: precisa passar de novo pela detecção de duplicatas
+            Item.objects.filter(pk=self.pk).update(
+                atualizado_em=timezone.now(), duplicatas_verificadas=False, **caracteristicas
+            )
+            for campo, valor in caracteristicas.items():
+                setattr(self, campo, valor)
+            self.duplicatas_verificadas = False
         except Exception:
             try:
                 self.imagem.close()
             except Exception:
                 pass
 
+    def _atualizar_correspondencias(self):
+        """
+        Atualiza a tabela de correspondências perdido↔achado (items/correspondencia.py),
+        só se algum campo pontuado mudou desde a leitura ou o último save.
+        """
+        campos = self._campos_correspondencia()
+        if campos == getattr(self, '_correspondencia_salva', None):
+            return
+        self._correspondencia_salva = campos
+        try:
+            from items.correspondencia import atualizar_correspondencias
+            atualizar_correspondencias(self)
+        except Exception:
+            pass
+
+    def _alertar_buscas_salvas(self):
+        """Percola o item novo nas buscas salvas (items/alertas.py), depois das cores calculadas."""
+        try:
+            from items.alertas import percolar
+            percolar(self)
+        except Exception:
+            pass
+
     def _gerar_qrcode(self):
         """Gera o QR Code para o item se ainda não existir e salva no banco de dados."""
         if not self.slug:
@@ -128,139 +214,19 @@ class Item(models.Model):
             pass
 
     @staticmethod
-    def buscar_por_imagem(imagem_file, limite=20):
+    def buscar_por_imagem(imagem_file, limite=20, cor=None, filtros=None, rastreio=None):
         """
         Busca itens visualmente similares a uma imagem enviada.
-        Se GEMINI_API_KEY estiver configurado nas configurações do Django, utiliza a API do Gemini
-        para fazer uma busca semântica de última geração. Caso contrário, utiliza o algoritmo
-        híbrido local (pHash + Histograma HSV).
+        Se GEMINI_API_KEY estiver configurado nas configurações do Django, dispara a busca
+        semântica do Gemini em paralelo com o algoritmo local (pHash + descritor visual
+        em índice na memória) e usa a resposta da IA apenas se ela chegar dentro do orçamento de latência.
+        Com `cor`, só considera itens que têm essa cor entre as dominantes (CorItem);
+        `filtros` ({'status': [...], 'categoria', 'data_inicio', 'data_fim'}) são aplicados
+        no índice antes da pontuação. Um `Rastreio` opcional recebe os tempos por etapa.
+        Veja items/busca_visual.py.
         """
-        from django.conf import settings
-        import requests
-        import base64
-        from django.db.models import Q
-
-        api_key = getattr(settings, 'GEMINI_API_KEY', '')
-
-        # Se houver chave API do Gemini, faz a busca semântica inteligente
-        if api_key:
-            try:
-                # 1. Converter a imagem para base64
-                imagem_file.seek(0)
-                img_base64 = base64.b64encode(imagem_file.read()).decode('utf-8')
-
-                # 2. Chamar a API do Gemini 2.5 Flash
-                url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={api_key}"
-                headers = {'Content-Type': 'application/json'}
-                prompt = (
-                    "Identifique o objeto principal desta imagem. Retorne apenas uma descrição curta "
-                    "com o nome do objeto, cor principal e material em português. Exemplo: 'mochila preta de nylon'."
-                )
-                payload = {
-                    "contents": [{
-                        "parts": [
-                            {"text": prompt},
-                            {"inlineData": {"mimeType": "image/jpeg", "data": img_base64}}
-                        ]
-                    }]
-                }
-
-                response = requests.post(url, headers=headers, json=payload, timeout=10)
-                if response.status_code == 200:
-                    res = response.json()
-                    descricao_ia = res['candidates'][0]['content']['parts'][0]['text'].strip()
-                    
-                    # 3. Fazer a busca de texto baseada nas palavras-chave retornadas pela IA
-                    # Remove palavras curtas (de, com, em, um, uma, o, a)
-                    palavras = [p.lower() for p in descricao_ia.split() if len(p) > 2]
-                    
-                    if palavras:
-                        query = Q()
-                        for palavra in palavras:
-                            query &= (
-                                Q(titulo__icontains=palavra) |
-                                Q(descricao__icontains=palavra) |
-                                Q(local__icontains=palavra)
-                            )
-                        
-                        itens_encontrados = Item.objects.filter(query).select_related('usuario', 'categoria')[:limite]
-                        
-                        # Calcula a similaridade textual baseada em quantas palavras-chave deram match
-                        resultados = []
-                        for item in itens_encontrados:
-                            texto_item = f"{item.titulo} {item.descricao} {item.local}".lower()
-                            matches = sum(1 for palavra in palavras if palavra in texto_item)
-                            sim_txt = (matches / len(palavras)) * 100 if palavras else 100.0
-                            resultados.append((item, round(sim_txt, 1)))
-                        
-                        resultados.sort(key=lambda x: x[1], reverse=True)
-                        return resultados
-            except Exception:
-                pass # Se falhar a API por qualquer motivo, cai no fallback local
-
-        # Fallback Local: Algoritmo Híbrido pHash + Histograma de Cores HSV
-        import imagehash
-        import numpy as np
-        from PIL import Image as PILImage
-
-        try:
-            img_query = PILImage.open(imagem_file)
-            query_hash = imagehash.phash(img_query, hash_size=16)
-            
-            img_query_hsv = img_query.convert('HSV')
-            hist_query = np.array(img_query_hsv.histogram(), dtype=np.float32)
-            sum_query = hist_query.sum()
-            if sum_query > 0:
-                hist_query /= sum_query
-        except Exception:
-            return []
-
-        itens_com_hash = Item.objects.exclude(
-            image_hash__isnull=True
-        ).exclude(image_hash='').select_related('usuario', 'categoria')
-
-        resultados = []
-        for item in itens_com_hash:
-            try:
-                # 2. Calcular similaridade estrutural via pHash
-                item_hash = imagehash.hex_to_hash(item.image_hash)
-                distancia = query_hash - item_hash
-                sim_hash = max(0, 100 - (distancia / 256 * 100))
-                
-                # 3. Calcular similaridade de cores via Histograma HSV
-                if item.imagem:
-                    try:
-                        item.imagem.open('rb')
-                        img_item = PILImage.open(item.imagem)
-                        img_item_hsv = img_item.convert('HSV')
-                        hist_item = np.array(img_item_hsv.histogram(), dtype=np.float32)
-                        item.imagem.close()
-                        
-                        sum_item = hist_item.sum()
-                        if sum_item > 0:
-                            hist_item /= sum_item
-                            
-                        # Intersecção de histograma normalizado (0 a 100%)
-                        sim_cor = float(np.minimum(hist_query, hist_item).sum()) * 100
-                    except Exception:
-                        sim_cor = 50.0  # fallback neutro caso dê erro ao ler imagem
-                else:
-                    sim_cor = 50.0
-                
-                # 4. Similaridade final combinada: 50% formato + 50% cor
-                similaridade_final = (sim_hash * 0.5) + (sim_cor * 0.5)
-                
-                if similaridade_final >= 30:
-                    resultados.append((item, round(similaridade_final, 1)))
-            except Exception:
-                try:
-                    item.imagem.close()
-                except Exception:
-                    pass
-                continue
-
-        resultados.sort(key=lambda x: x[1], reverse=True)
-        return resultados[:limite]
+        from items.busca_visual import buscar
+        return buscar(imagem_file, limite=limite, cor=cor, filtros=filtros, rastreio=rastreio)
 
     def __str__(self):
         return self.titulo
@@ -286,3 +252,227 @@ class AcaoLog(models.Model):
 
     def __str__(self):
         return f"{self.bolsista} → {self.acao} em {self.item} ({self.timestamp})"
+
+
+class ParDuplicado(models.Model):
+    """Par de itens com fotos quase idênticas, encontrado por `detectar_duplicatas`."""
+    item_a = models.ForeignKey('Item', on_delete=models.CASCADE, related_name='duplicatas_como_a')
+    item_b = models.ForeignKey('Item', on_delete=models.CASCADE, related_name='duplicatas_como_b')
+    distancia_hash = models.PositiveSmallIntegerField()
+    similaridade = models.FloatField()
+    # menor id de item do componente conectado: pares com o mesmo grupo formam um grupo de duplicatas
+    grupo = models.PositiveBigIntegerField(db_index=True, default=0)
+    resolvido = models.BooleanField(default=False, db_index=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'find_parduplicado'
+        ordering = ['grupo', '-similaridade']
+        constraints = [
+            models.UniqueConstraint(fields=['item_a', 'item_b'], name='unique_par_duplicado'),
+        ]
+
+    def __str__(self):
+        return f"{self.item_a_id} ≈ {self.item_b_id} ({self.similaridade}%)"
+
+
+class CorItem(models.Model):
+    """Cor dominante (com nome) da foto de um item, extraída ao gravar a imagem."""
+    CORES_CHOICES = [(cor, cor.capitalize()) for cor in CORES]
+
+    item = models.ForeignKey('Item', on_delete=models.CASCADE, related_name='cores')
+    cor = models.CharField(max_length=20, choices=CORES_CHOICES)
+    proporcao = models.FloatField()
+
+    class Meta:
+        db_table = 'find_coritem'
+        ordering = ['-proporcao']
+        indexes = [
+            models.Index(fields=['cor', 'item'], name='coritem_cor_item_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'cor'], name='unique_cor_item'),
+        ]
+
+    def __str__(self):
+        return f"{self.item_id}: {self.cor} ({self.proporcao:.0%})"
+
+    @classmethod
+    def substituir(cls, cores_por_item):
+        """Troca as cores gravadas de vários itens: {item_id: [(cor, proporcao), ...]}."""
+        ids = list(cores_por_item)
+        for inicio in range(0, len(ids), 500):
+            cls.objects.filter(item_id__in=ids[inicio:inicio + 500]).delete()
+        cls.objects.bulk_create(
+            [cls(item_id=item_id, cor=cor, proporcao=proporcao)
+             for item_id, cores in cores_por_item.items() for cor, proporcao in cores],
+            batch_size=500,
+        )
+        cache_busca.invalidar()  # o filtro por cor das buscas em cache mudou
+
+
+class TagItem(models.Model):
+    """Tag descritiva gerada a partir da foto do item (items/tags.py), usada na busca textual."""
+    item = models.ForeignKey('Item', on_delete=models.CASCADE, related_name='tags')
+    tag = models.CharField(max_length=40)
+    origem = models.CharField(max_length=20, default='gemini')
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'find_tagitem'
+        indexes = [
+            models.Index(fields=['tag', 'item'], name='tagitem_tag_item_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'tag'], name='unique_tag_item'),
+        ]
+
+    def __str__(self):
+        return f"{self.item_id}: {self.tag}"
+
+
+class TrigramaItem(models.Model):
+    """Trigrama do texto normalizado de um item (items/busca_texto.py), para busca tolerante a erros."""
+    item = models.ForeignKey('Item', on_delete=models.CASCADE, related_name='trigramas')
+    trigrama = models.CharField(max_length=3)
+
+    class Meta:
+        db_table = 'find_trigramaitem'
+        indexes = [
+            models.Index(fields=['trigrama', 'item'], name='trigramaitem_trigrama_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'trigrama'], name='unique_trigrama_item'),
+        ]
+
+    def __str__(self):
+        return f"{self.item_id}: {self.trigrama!r}"
+
+    @classmethod
+    def substituir(cls, textos_por_item):
+        """Regrava os trigramas de vários itens: {item_id: texto_normalizado}."""
+        ids = list(textos_por_item)
+        for inicio in range(0, len(ids), 500):
+            cls.objects.filter(item_id__in=ids[inicio:inicio + 500]).delete()
+        cls.objects.bulk_create(
+            [cls(item_id=item_id, trigrama=trigrama)
+             for item_id, texto in textos_por_item.items() for trigrama in sorted(trigramas(texto))],
+            batch_size=1000,
+        )
+
+
+class CacheTags(models.Model):
+    """Tags já geradas por digest de imagem: a mesma foto nunca é descrita duas vezes."""
+    digest = models.CharField(max_length=64)
+    descritor = models.CharField(max_length=20)
+    tags = models.JSONField(default=list)
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'find_cachetags'
+        constraints = [
+            models.UniqueConstraint(fields=['digest', 'descritor'], name='unique_cache_tags'),
+        ]
+
+    def __str__(self):
+        return f"{self.digest[:12]} ({self.descritor})"
+
+
+class ItemSimilar(models.Model):
+    """Item parecido (texto + imagem) pré-calculado para a página de detalhe (items/similares.py)."""
+    item = models.ForeignKey('Item', on_delete=models.CASCADE, related_name='similares')
+    similar = models.ForeignKey('Item', on_delete=models.CASCADE, related_name='+')
+    pontuacao = models.FloatField()
+    sim_texto = models.FloatField(default=0)
+    sim_imagem = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'find_itemsimilar'
+        ordering = ['-pontuacao']
+        indexes = [
+            models.Index(fields=['item', '-pontuacao'], name='similar_item_pontuacao_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'similar'], name='unique_item_similar'),
+        ]
+
+    def __str__(self):
+        return f"{self.item_id} ~ {self.similar_id} ({self.pontuacao})"
+
+
+class Correspondencia(models.Model):
+    """Correspondência pré-calculada entre um item e um candidato de status oposto."""
+    item = models.ForeignKey('Item', on_delete=models.CASCADE, related_name='correspondencias')
+    candidato = models.ForeignKey('Item', on_delete=models.CASCADE, related_name='+')
+    pontuacao = models.FloatField()
+    detalhes = models.JSONField(default=dict, blank=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'find_correspondencia'
+        ordering = ['-pontuacao']
+        indexes = [
+            models.Index(fields=['item', '-pontuacao'], name='corresp_item_pontuacao_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'candidato'], name='unique_correspondencia'),
+        ]
+
+    def __str__(self):
+        return f"{self.item_id} → {self.candidato_id} ({self.pontuacao})"
+
+
+class BuscaSalva(models.Model):
+    """
+    Busca salva por um usuário. Cada item novo é casado contra as buscas salvas
+    (percolação, items/alertas.py) e as que casam geram um AlertaBusca. `chave` é o
+    critério mais seletivo da busca, indexado para achar só as candidatas plausíveis.
+    """
+    STATUS_CHOICES = [('achado', 'Achados'), ('perdido', 'Perdidos')]
+    CORES_CHOICES = [(cor, cor.capitalize()) for cor in CORES]
+
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='buscas_salvas')
+    q = models.CharField(max_length=100, blank=True)
+    categoria = models.ForeignKey('Categoria', on_delete=models.CASCADE, null=True, blank=True)
+    cor = models.CharField(max_length=20, choices=CORES_CHOICES, blank=True)
+    local = models.CharField(max_length=45, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='achado')
+    chave = models.CharField(max_length=60, editable=False)
+    ativa = models.BooleanField(default=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'find_buscasalva'
+        ordering = ['-criado_em']
+        indexes = [
+            models.Index(fields=['chave', 'status'], name='buscasalva_chave_status_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        from items.alertas import chave_percolacao
+
+        self.chave = chave_percolacao(self.q, self.local, self.categoria_id, self.cor)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'chave'}
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.usuario_id}: {self.q or self.chave} ({self.status})"
+
+
+class AlertaBusca(models.Model):
+    """Item novo que casou com uma busca salva."""
+    busca = models.ForeignKey('BuscaSalva', on_delete=models.CASCADE, related_name='alertas')
+    item = models.ForeignKey('Item', on_delete=models.CASCADE, related_name='+')
+    lido = models.BooleanField(default=False)
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'find_alertabusca'
+        ordering = ['-criado_em', '-id']
+        constraints = [
+            models.UniqueConstraint(fields=['busca', 'item'], name='unique_alerta_busca_item'),
+        ]
+
+    def __str__(self):
+        return f"{self.busca_id} → {self.item_id}"
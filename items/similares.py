@@ -0,0 +1,168 @@
+"""
+Tabela pré-calculada de "itens parecidos" para as páginas de detalhe.
+
+Combina a similaridade de texto (titulo + descricao, vetores por hashing) com a
+visual (pHash + descritor) em produtos de matrizes por bloco, e grava os melhores
+vizinhos de cada item em ItemSimilar. A página lê a lista com uma consulta indexada.
+
+Incremental: só os itens alterados desde o último cálculo (similares_em anterior
+a atualizado_em) são recomparados, junto com os vizinhos que tinham algum deles na
+lista (a lista do vizinho é recalculada inteira, então um item alterado ou devolvido
+não some nem fica sobrando nela). Os itens alterados também entram nas listas dos
+demais quando superam os similares já gravados. Rodar com --tudo periodicamente
+(cron) reconstrói todas as listas.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from items.descritores import DIMENSAO, bytes_para_descritor, hash_para_bits
+from items.indice_visual import BITS_HASH
+from items.texto import DIMENSAO_TEXTO, vetor_texto
+
+BLOCO = 256
+
+
+class MatrizCatalogo:
+    """Vetores de texto e imagem de todo o catálogo, em arrays alinhados por linha."""
+
+    def __init__(self, linhas):
+        n = len(linhas)
+        self.ids = np.array([linha[0] for linha in linhas], dtype=np.int64)
+        self.ativo = np.array([linha[3] != "devolvido" for linha in linhas], dtype=bool)
+        self.textos = np.zeros((n, DIMENSAO_TEXTO), dtype=np.float32)
+        self.bits = np.zeros((n, BITS_HASH), dtype=np.float32)
+        self.tem_hash = np.zeros(n, dtype=bool)
+        self.descritores = np.zeros((n, DIMENSAO), dtype=np.float32)
+        self.tem_descritor = np.zeros(n, dtype=bool)
+
+        for i, (_, titulo, descricao, _, image_hash, descritor) in enumerate(linhas):
+            self.textos[i] = vetor_texto(f"{titulo} {descricao}")
+            try:
+                bits = hash_para_bits(image_hash) if image_hash else None
+            except ValueError:
+                bits = None
+            if bits is not None and len(bits) == BITS_HASH // 8:
+                self.bits[i] = np.unpackbits(bits)
+                self.tem_hash[i] = True
+            vetor = bytes_para_descritor(descritor)
+            if vetor is not None:
+                self.descritores[i] = vetor
+                self.tem_descritor[i] = True
+        self.contagem_bits = self.bits.sum(axis=1)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def similaridades(self, linhas):
+        """Matriz (len(linhas) x catálogo) com similaridade combinada 0-1 e a parte visual."""
+        sim_texto = self.textos[linhas] @ self.textos.T
+
+        hamming = self.contagem_bits[linhas][:, None] + self.contagem_bits[None, :] - 2 * (self.bits[linhas] @ self.bits.T)
+        sim_hash = np.clip(1 - hamming / BITS_HASH, 0, 1)
+        # vetores unitários: ||a - b||² = 2 - 2·a·b
+        dist_desc = np.sqrt(np.clip(2 - 2 * (self.descritores[linhas] @ self.descritores.T), 0, None))
+        ambos_desc = self.tem_descritor[linhas][:, None] & self.tem_descritor[None, :]
+        sim_desc = np.where(ambos_desc, np.clip(1 - dist_desc, 0, 1), 0.5)
+        sim_imagem = 0.5 * sim_hash + 0.5 * sim_desc
+
+        ambos_foto = self.tem_hash[linhas][:, None] & self.tem_hash[None, :]
+        combinada = np.where(ambos_foto, 0.5 * sim_texto + 0.5 * sim_imagem, sim_texto)
+        return combinada, np.where(ambos_foto, sim_imagem, np.nan), sim_texto
+
+
+def atualizar_similares(tudo=False):
+    """Recalcula as listas de itens parecidos. Retorna um dicionário com estatísticas."""
+    from items.models import Item, ItemSimilar
+
+    top = getattr(settings, "SIMILARES_TOP", 8)
+    minima = getattr(settings, "SIMILARES_MINIMA", 0.3)
+    # marcado antes da leitura: alterações feitas durante o cálculo entram na próxima execução
+    agora = timezone.now()
+
+    linhas_db = list(Item.objects.order_by("id").values_list(
+        "id", "titulo", "descricao", "status", "image_hash", "descritor"
+    ))
+    catalogo = MatrizCatalogo(linhas_db)
+    if tudo:
+        alterado = np.ones(len(catalogo), dtype=bool)
+        recalcular = np.arange(len(catalogo))
+    else:
+        ids_alterados = list(
+            Item.objects.filter(Q(similares_em__isnull=True) | Q(similares_em__lt=F("atualizado_em")))
+            .values_list("id", flat=True)
+        )
+        # vizinhos que tinham um item alterado na lista também são recalculados
+        afetados = set(ids_alterados)
+        for inicio in range(0, len(ids_alterados), 500):
+            afetados.update(ItemSimilar.objects.filter(
+                similar_id__in=ids_alterados[inicio:inicio + 500]
+            ).values_list("item_id", flat=True))
+        alterado = np.isin(catalogo.ids, ids_alterados)
+        recalcular = np.flatnonzero(np.isin(catalogo.ids, list(afetados)))
+    recalculado = np.zeros(len(catalogo), dtype=bool)
+    recalculado[recalcular] = True
+    ids_recalculados = [int(x) for x in catalogo.ids[recalcular]]
+
+    novos, reversos = [], []
+    for inicio in range(0, len(recalcular), BLOCO):
+        bloco = recalcular[inicio:inicio + BLOCO]
+        combinada, sim_imagem, sim_texto = catalogo.similaridades(bloco)
+        combinada[np.arange(len(bloco)), bloco] = -1  # o próprio item
+        combinada[:, ~catalogo.ativo] = -1  # devolvidos não aparecem como parecidos
+
+        k = min(top, len(catalogo))
+        melhores = np.argpartition(-combinada, k - 1, axis=1)[:, :k]
+        for pos, linha in enumerate(bloco):
+            for vizinho in melhores[pos]:
+                if combinada[pos, vizinho] < minima:
+                    continue
+                dados = {
+                    "pontuacao": round(float(combinada[pos, vizinho]) * 100, 1),
+                    "sim_texto": round(float(sim_texto[pos, vizinho]) * 100, 1),
+                    "sim_imagem": None if np.isnan(sim_imagem[pos, vizinho])
+                    else round(float(sim_imagem[pos, vizinho]) * 100, 1),
+                }
+                item_id, similar_id = int(catalogo.ids[linha]), int(catalogo.ids[vizinho])
+                novos.append(ItemSimilar(item_id=item_id, similar_id=similar_id, **dados))
+                # listas recalculadas aqui não precisam da entrada reversa; vizinhos só
+                # recalculados (não alterados) não mudaram de similaridade com ninguém
+                if catalogo.ativo[linha] and alterado[linha] and not recalculado[vizinho]:
+                    reversos.append(ItemSimilar(item_id=similar_id, similar_id=item_id, **dados))
+
+    with transaction.atomic():
+        for inicio in range(0, len(ids_recalculados), 500):
+            lote = ids_recalculados[inicio:inicio + 500]
+            ItemSimilar.objects.filter(item_id__in=lote).delete()
+            Item.objects.filter(id__in=lote).update(similares_em=agora)
+        ItemSimilar.objects.bulk_create(novos, batch_size=500, ignore_conflicts=True)
+        ItemSimilar.objects.bulk_create(reversos, batch_size=500, ignore_conflicts=True)
+        aparados = _aparar({r.item_id for r in reversos}, top)
+
+    return {
+        "catalogo": len(catalogo), "recalculados": int(alterado.sum()),
+        "vizinhos": len(ids_recalculados) - int(alterado.sum()), "pares": len(novos), "aparados": aparados,
+    }
+
+
+def _aparar(item_ids, top):
+    """Mantém só os `top` mais parecidos na lista de cada item afetado pelas entradas reversas."""
+    from items.models import ItemSimilar
+
+    item_ids = list(item_ids)
+    excedentes = []
+    for inicio in range(0, len(item_ids), 500):
+        vistos = {}
+        linhas = (
+            ItemSimilar.objects.filter(item_id__in=item_ids[inicio:inicio + 500])
+            .order_by("item_id", "-pontuacao", "id").values_list("id", "item_id")
+        )
+        for similar_pk, item_id in linhas:
+            vistos[item_id] = vistos.get(item_id, 0) + 1
+            if vistos[item_id] > top:
+                excedentes.append(similar_pk)
+    for inicio in range(0, len(excedentes), 500):
+        ItemSimilar.objects.filter(id__in=excedentes[inicio:inicio + 500]).delete()
+    return len(excedentes)
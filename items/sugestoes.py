@@ -0,0 +1,179 @@
+"""
+Índice de prefixos em memória (por processo) para as sugestões da busca do menu.
+
+Para cada item gera uma chave por palavra do título, do local e da categoria: o
+texto normalizado a partir daquela palavra ("guarda chuva preto", "chuva preto",
+"preto"). Os primeiros TAMANHO_PREFIXO caracteres de cada chave (e os prefixos
+mais curtos deles) apontam para a lista dos itens que os têm, ordenada do mais novo
+para o mais antigo. Uma sugestão percorre a lista do prefixo digitado em ordem de
+recência e para ao juntar `limite` itens (consultas mais longas conferem as chaves
+de cada candidato), sem consultar o banco e sem cortar candidatos.
+
+O índice deste processo é atualizado na hora pelos sinais de save/delete do Item.
+Para enxergar mudanças feitas por outros processos, no máximo a cada
+SUGESTOES_INTERVALO segundos uma consulta agregada compara contagem, maior id e
+último `atualizado_em`; itens alterados são trazidos de forma incremental e remoções
+(contagem divergente) reconstroem o índice.
+"""
+import bisect
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from items.texto import normalizar
+
+TAMANHO_PREFIXO = 4
+
+
+def _chaves(*textos):
+    chaves = set()
+    for texto in textos:
+        palavras = normalizar(texto).split()
+        chaves.update(" ".join(palavras[i:]) for i in range(len(palavras)))
+    return chaves
+
+
+def _prefixos(chaves):
+    return {chave[:tamanho] for chave in chaves for tamanho in range(1, min(len(chave), TAMANHO_PREFIXO) + 1)}
+
+
+class IndicePrefixos:
+    """Prefixo curto -> [-item_id] em ordem (mais novos primeiro) + dados de exibição de cada item."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.por_prefixo = {}
+        self.itens = {}  # item_id -> (titulo, subtitulo, slug, chaves)
+
+    def __len__(self):
+        return len(self.itens)
+
+    @classmethod
+    def construir(cls, linhas):
+        """linhas: (id, titulo, local, slug, nome da categoria ou None)."""
+        indice = cls()
+        for linha in linhas:
+            indice._guardar(*linha)
+        for lista in indice.por_prefixo.values():
+            lista.sort()
+        return indice
+
+    def _guardar(self, item_id, titulo, local, slug, categoria, ordenar=False):
+        chaves = _chaves(titulo, local, categoria or "")
+        self.itens[item_id] = (titulo, local or categoria or "", slug, chaves)
+        for prefixo in _prefixos(chaves):
+            lista = self.por_prefixo.setdefault(prefixo, [])
+            if ordenar:
+                bisect.insort(lista, -item_id)
+            else:
+                lista.append(-item_id)
+
+    def _descartar(self, item_id):
+        antigo = self.itens.pop(item_id, None)
+        if antigo is None:
+            return
+        for prefixo in _prefixos(antigo[3]):
+            lista = self.por_prefixo.get(prefixo, [])
+            pos = bisect.bisect_left(lista, -item_id)
+            if pos < len(lista) and lista[pos] == -item_id:
+                del lista[pos]
+            if not lista:
+                self.por_prefixo.pop(prefixo, None)
+
+    def atualizar(self, item_id, titulo, local, slug, categoria):
+        with self._lock:
+            self._descartar(item_id)
+            self._guardar(item_id, titulo, local, slug, categoria, ordenar=True)
+
+    def remover(self, item_id):
+        with self._lock:
+            self._descartar(item_id)
+
+    def sugerir(self, q, limite=8):
+        """[(item_id, titulo, subtitulo, slug)] dos itens com alguma chave começando por `q`, mais novos primeiro."""
+        prefixo = normalizar(q)
+        if not prefixo:
+            return []
+        melhores = []
+        with self._lock:
+            for negativo in self.por_prefixo.get(prefixo[:TAMANHO_PREFIXO], ()):
+                chaves = self.itens[-negativo][3]
+                if len(prefixo) <= TAMANHO_PREFIXO or any(chave.startswith(prefixo) for chave in chaves):
+                    melhores.append(-negativo)
+                    if len(melhores) == limite:
+                        break
+            return [(item_id, *self.itens[item_id][:3]) for item_id in melhores]
+
+
+# -----------------------------
+# Cache por processo
+# -----------------------------
+_lock = threading.Lock()
+_indice = None
+_marca = None  # (contagem, maior id, último atualizado_em) na última sincronização
+_verificado_em = 0.0
+
+
+def _linhas(qs):
+    return qs.values_list("id", "titulo", "local", "slug", "categoria__nome").iterator()
+
+
+def _estado():
+    from items.models import Item
+
+    agregado = Item.objects.aggregate(n=Count("id"), maior_id=Max("id"), ultimo=Max("atualizado_em"))
+    return (agregado["n"], agregado["maior_id"], agregado["ultimo"])
+
+
+def obter_indice():
+    """Índice do processo; sincroniza com o banco se passou SUGESTOES_INTERVALO desde a última checagem."""
+    global _indice, _marca, _verificado_em
+    from items.models import Item
+
+    intervalo = getattr(settings, "SUGESTOES_INTERVALO", 5)
+    if _indice is not None and time.monotonic() - _verificado_em < intervalo:
+        return _indice
+
+    with _lock:
+        if _indice is not None and time.monotonic() - _verificado_em < intervalo:
+            return _indice
+        estado = _estado()
+        if _indice is None:
+            _indice = IndicePrefixos.construir(_linhas(Item.objects.all()))
+        elif estado != _marca:
+            alterados = Item.objects.all()
+            if _marca[2] is not None:
+                alterados = alterados.filter(atualizado_em__gte=_marca[2])
+            for linha in _linhas(alterados):
+                _indice.atualizar(*linha)
+            if len(_indice) != estado[0]:
+                # houve remoções feitas por outro processo: reconstrói
+                _indice = IndicePrefixos.construir(_linhas(Item.objects.all()))
+        _marca = estado
+        _verificado_em = time.monotonic()
+    return _indice
+
+
+def item_salvo(sender, instance, **kwargs):
+    """post_save do Item: atualiza o índice deste processo, se já carregado."""
+    if _indice is not None:
+        categoria = instance.categoria.nome if instance.categoria_id else None
+        _indice.atualizar(instance.pk, instance.titulo, instance.local, instance.slug, categoria)
+
+
+def item_removido(sender, instance, **kwargs):
+    if _indice is not None:
+        _indice.remover(instance.pk)
+
+
+def descartar(sender=None, **kwargs):
+    """Categoria alterada/removida: o índice é recriado na próxima sugestão."""
+    global _indice
+    with _lock:
+        _indice = None
+
+
+def sugerir(q, limite=8):
+    return obter_indice().sugerir(q, limite)
@@ -0,0 +1,164 @@
+"""
+Enriquecimento do catálogo com tags descritivas geradas a partir das fotos.
+
+O texto dos itens (titulo/descricao) é escrito pelo usuário; as tags descrevem o que
+aparece na imagem (objeto, cor, material...) e ficam em TagItem, indexada por tag,
+para a busca textual e a busca visual casarem por consulta indexada.
+
+O "descritor" é plugável (TAGS_DESCRITOR): DescritorGemini chama a API, DescritorLocal
+usa só as cores dominantes (offline, para testes e ambientes sem chave). As chamadas
+passam por limite de taxa e novas tentativas, e o resultado fica em cache por digest
+da imagem (CacheTags): fotos repetidas ou reprocessadas não chamam a API de novo.
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from io import BytesIO
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from items import cache_busca
+from items.texto import STOPWORDS, normalizar
+
+TAGS_PROMPT = (
+    "Liste de 5 a 10 palavras-chave em português que descrevam o objeto principal desta imagem: "
+    "tipo de objeto, cores, material, marca e detalhes marcantes. Responda só as palavras, separadas por vírgula."
+)
+
+
+class DescritorTags(ABC):
+    """Interface dos descritores: recebe a imagem PIL e devolve uma lista de tags (texto livre)."""
+    nome = "base"
+
+    @abstractmethod
+    def disponivel(self):
+        """O descritor pode ser usado neste ambiente (ex.: há chave da API)?"""
+
+    @abstractmethod
+    def descrever(self, img):
+        """Lista de tags (texto livre) para a imagem PIL."""
+
+
+class DescritorGemini(DescritorTags):
+    nome = "gemini"
+
+    def __init__(self):
+        self.api_key = getattr(settings, "GEMINI_API_KEY", "")
+
+    def disponivel(self):
+        return bool(self.api_key)
+
+    def descrever(self, img):
+        from items.busca_visual import descrever_com_gemini
+        from items.descritores import reduzir_para_jpeg
+
+        jpeg = reduzir_para_jpeg(img, getattr(settings, "GEMINI_MAX_LADO", 768))
+        texto = descrever_com_gemini(jpeg, self.api_key, prompt=TAGS_PROMPT,
+                                     timeout=getattr(settings, "TAGS_TIMEOUT", 15.0))
+        return [parte for parte in texto.replace("\n", ",").split(",")]
+
+
+class DescritorLocal(DescritorTags):
+    """Descritor offline: as cores dominantes da foto viram tags."""
+    nome = "local"
+
+    def disponivel(self):
+        return True
+
+    def descrever(self, img):
+        from items.descritores import cores_dominantes
+        return [cor for cor, _ in cores_dominantes(img)]
+
+
+def obter_descritor(caminho=None):
+    return import_string(caminho or getattr(settings, "TAGS_DESCRITOR", "items.tags.DescritorGemini"))()
+
+
+def normalizar_tags(brutas, maximo=None):
+    """Normaliza (sem acento, minúsculo), separa em palavras e remove repetidas e stopwords."""
+    maximo = maximo or getattr(settings, "TAGS_MAXIMO", 12)
+    tags = []
+    for bruta in brutas:
+        for palavra in normalizar(bruta).split():
+            if len(palavra) > 2 and palavra not in STOPWORDS and palavra not in tags:
+                tags.append(palavra)
+    return tags[:maximo]
+
+
+class LimitadorTaxa:
+    """Limita as chamadas a `por_minuto` espaçando-as igualmente (thread-safe)."""
+
+    def __init__(self, por_minuto, dormir=time.sleep):
+        self.intervalo = 60.0 / por_minuto if por_minuto > 0 else 0.0
+        self._proxima = 0.0
+        self._lock = threading.Lock()
+        self._dormir = dormir
+
+    def esperar(self):
+        with self._lock:
+            agora = time.monotonic()
+            espera = max(0.0, self._proxima - agora)
+            self._proxima = max(agora, self._proxima) + self.intervalo
+        if espera:
+            self._dormir(espera)
+
+
+def descrever_com_tentativas(descritor, img, limitador=None, tentativas=None, espera_base=None, dormir=time.sleep):
+    """
+    Chama o descritor com novas tentativas e espera exponencial (1s, 2s, 4s...).
+    Cada tentativa, não só a primeira, passa pelo `limitador` de taxa.
+    """
+    tentativas = tentativas or getattr(settings, "TAGS_TENTATIVAS", 3)
+    espera_base = getattr(settings, "TAGS_ESPERA_BASE", 1.0) if espera_base is None else espera_base
+    for tentativa in range(tentativas):
+        if limitador is not None:
+            limitador.esperar()
+        try:
+            return descritor.descrever(img)
+        except Exception:
+            if tentativa == tentativas - 1:
+                raise
+            dormir(espera_base * 2 ** tentativa)
+
+
+def gerar_tags_item(item, descritor, limitador):
+    """
+    Gera (ou reaproveita do cache por digest) as tags de um item e grava em TagItem.
+    Retorna (tags, veio_do_cache).
+    """
+    from PIL import Image as PILImage
+    from items.models import CacheTags, Item, TagItem
+
+    digest = item.imagem_digest
+    cache = CacheTags.objects.filter(digest=digest, descritor=descritor.nome).first()
+    if cache is not None:
+        tags, do_cache = cache.tags, True
+    else:
+        item.imagem.open("rb")
+        dados = item.imagem.read()
+        item.imagem.close()
+        img = PILImage.open(BytesIO(dados))
+        img.load()
+
+        tags = normalizar_tags(descrever_com_tentativas(descritor, img, limitador))
+        CacheTags.objects.update_or_create(digest=digest, descritor=descritor.nome, defaults={"tags": tags})
+        do_cache = False
+
+    TagItem.objects.filter(item_id=item.pk).delete()
+    TagItem.objects.bulk_create([TagItem(item_id=item.pk, tag=tag, origem=descritor.nome) for tag in tags])
+    Item.objects.filter(pk=item.pk).update(tags_digest=digest)
+    cache_busca.invalidar()  # buscas em cache também casam por tag
+    return tags, do_cache
+
+
+def filtro_tags(texto):
+    """Q que casa itens com alguma tag igual a uma palavra de `texto` (índice tag+item)."""
+    from django.db.models import Q
+    from items.models import TagItem
+    from items.texto import tokens
+
+    palavras = tokens(texto)
+    if not palavras:
+        return Q(pk__in=[])
+    return Q(pk__in=TagItem.objects.filter(tag__in=palavras).values('item_id'))
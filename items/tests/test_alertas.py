@@ -0,0 +1,101 @@
+"""Testes para buscas salvas e alertas por percolação (items/alertas.py)."""
+from datetime import date
+
+import pytest
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+
+from items.alertas import chave_percolacao, chaves_do_item
+from items.models import AlertaBusca, BuscaSalva, Categoria, Item
+
+
+@pytest.fixture
+def dono(db):
+    return User.objects.create_user(username="perdeu", password="Str0ngP@ss!")
+
+
+@pytest.fixture
+def achador(db):
+    return User.objects.create_user(username="achou", password="Str0ngP@ss!")
+
+
+@pytest.fixture
+def api(dono):
+    client = APIClient()
+    client.force_authenticate(dono)
+    return client
+
+
+def _achado(usuario, titulo, **extra):
+    dados = dict(titulo=titulo, descricao="", local="Bloco A", status="achado", data=date.today(), usuario=usuario)
+    dados.update(extra)
+    return Item.objects.create(**dados)
+
+
+class TestPercolacao:
+
+    def test_chave_e_o_criterio_mais_seletivo(self):
+        assert chave_percolacao("Carteira de couro") == "t:carteira"
+        assert chave_percolacao("", "Bloco A", categoria_id=3) == "t:bloco"
+        assert chave_percolacao("", "", categoria_id=3, cor="azul") == "categoria:3"
+        assert chave_percolacao("", "", None, "azul") == "cor:azul"
+        assert chave_percolacao("  !! ") == ""
+        assert "t:cart" in chaves_do_item({"carteira"}, None, set())
+
+    def test_alerta_so_quando_todos_os_criterios_casam(self, dono, achador):
+        docs = Categoria.objects.create(nome="Documentos")
+        busca = BuscaSalva.objects.create(usuario=dono, q="carteira cour", categoria=docs)
+        BuscaSalva.objects.create(usuario=dono, q="carteira", status="perdido")
+        BuscaSalva.objects.create(usuario=dono, q="mochila")
+
+        _achado(achador, "Carteira de couro")  # categoria errada
+        _achado(achador, "Carteira de pano", categoria=docs)  # falta "cour"
+        certo = _achado(achador, "Carteira de couro marrom", categoria=docs)
+
+        assert list(AlertaBusca.objects.values_list("busca_id", "item_id")) == [(busca.id, certo.id)]
+
+    def test_sem_alerta_para_o_proprio_item_nem_para_edicao(self, dono, achador):
+        BuscaSalva.objects.create(usuario=dono, q="chave")
+        _achado(dono, "Chave do carro")
+        item = _achado(achador, "Guarda-chuva")
+        item.titulo = "Chave de casa"
+        item.save()
+        assert not AlertaBusca.objects.exists()
+
+    def test_consulta_so_as_buscas_plausiveis(self, dono, achador, django_assert_max_num_queries):
+        BuscaSalva.objects.bulk_create([
+            BuscaSalva(usuario=dono, q=f"objeto{i}", chave=f"t:objeto{i}") for i in range(200)
+        ])
+        BuscaSalva.objects.create(usuario=dono, q="garrafa")
+        from items.alertas import percolar
+
+        item = _achado(achador, "Garrafa azul")
+        AlertaBusca.objects.all().delete()
+        with django_assert_max_num_queries(2):
+            alertas = percolar(item)
+        assert [a.busca.q for a in alertas] == ["garrafa"]
+
+
+class TestApiBuscasSalvas:
+
+    def test_criar_listar_alertas_e_marcar_lidos(self, api, achador):
+        resp = api.post("/api/buscas-salvas/", {"q": "celular", "local": "biblioteca"}, format="json")
+        assert resp.status_code == 201
+        assert api.get("/api/buscas-salvas/").data["results"][0]["q"] == "celular"
+
+        _achado(achador, "Celular Samsung", local="Biblioteca central")
+        _achado(achador, "Celular Motorola", local="Bloco B")
+        resp = api.get("/api/alertas/")
+        assert resp.data["nao_lidos"] == 1
+        assert resp.data["results"][0]["item"]["titulo"] == "Celular Samsung"
+
+        assert api.post("/api/alertas/lidos/", {}, format="json").data["marcados"] == 1
+        assert api.get("/api/alertas/", {"nao_lidos": 1}).data["results"] == []
+
+    def test_validacao_e_remocao(self, api, dono):
+        assert api.post("/api/buscas-salvas/", {"q": " "}, format="json").status_code == 400
+        assert api.post("/api/buscas-salvas/", {"cor": "roxo-neon"}, format="json").status_code == 400
+        busca = BuscaSalva.objects.create(usuario=dono, cor="azul")
+        assert busca.chave == "cor:azul"
+        assert api.delete(f"/api/buscas-salvas/{busca.id}/deletar/").status_code == 200
+        assert not BuscaSalva.objects.exists()
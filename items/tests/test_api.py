@@ -116,6 +116,36 @@ class TestApiListItems:
         assert resp.data["has_more"] is True
 
 
+    def test_facetas_da_busca(self, api_client, item, user, categoria):
+        outra = Categoria.objects.create(nome="Garrafas")
+        Item.objects.create(titulo="Notebook Acer", descricao="", status="achado", local="Bloco A",
+                            data=date(2025, 3, 10), usuario=user, categoria=outra)
+        Item.objects.create(titulo="Mochila", descricao="", status="achado", local="Bloco A",
+                            data=date.today(), usuario=user, categoria=outra)
+
+        resp = api_client.get("/api/items/?q=notebook&status=achado")
+        facetas = resp.data["facetas"]
+        assert facetas["total"] == len(resp.data["results"]) == 1
+        # a faceta de status ignora o próprio filtro; as demais o respeitam
+        assert [(f["valor"], f["total"], f["ativo"]) for f in facetas["status"]] == [
+            ("achado", 1, True), ("perdido", 1, False)
+        ]
+        assert [(f["nome"], f["total"]) for f in facetas["categoria"]] == [("Garrafas", 1)]
+        assert [(f["valor"], f["rotulo"]) for f in facetas["mes"]] == [("2025-03", "03/2025")]
+
+        resp = api_client.get("/api/items/?mes=2025-03&page=2")
+        assert resp.data["facetas"] is None
+        resp = api_client.get("/api/items/?mes=2025-03")
+        assert [i["titulo"] for i in resp.data["results"]] == ["Notebook Acer"]
+
+    def test_facetas_em_uma_consulta(self, item, django_assert_num_queries):
+        from items.facetas import contar_facetas
+
+        with django_assert_num_queries(1):
+            facetas = contar_facetas(Item.objects.all(), categoria_id=item.categoria_id)
+        assert facetas["total"] == 1
+
+
 # ──────────────────────────────────────────────────────────────
 # Detalhe de item (público)
 # ──────────────────────────────────────────────────────────────
@@ -173,6 +203,115 @@ class TestApiCreateItem:
         assert resp.status_code == 201
         assert resp.data["data"]["status"] == "perdido"
 
+    def test_criar_item_sem_categoria_recebe_sugestao(self, auth_client, user, categoria):
+        for titulo in ["Celular Samsung preto", "Celular iPhone branco", "Fone bluetooth Samsung"]:
+            Item.objects.create(titulo=titulo, status="achado", data=date.today(), usuario=user, categoria=categoria)
+        resp = auth_client.post("/api/items/criar/", {
+            "titulo": "Celular Samsung azul",
+            "status": "perdido",
+            "data": str(date.today()),
+        }, format="json")
+        assert resp.status_code == 201
+        assert resp.data["data"]["categoria_id"] == categoria.id
+        assert resp.data["data"]["categoria_sugerida"] is True
+
+    def test_sem_vizinhos_parecidos_nao_sugere(self, auth_client, user, categoria):
+        Item.objects.create(titulo="Celular Samsung", status="achado", data=date.today(), usuario=user, categoria=categoria)
+        resp = auth_client.post("/api/items/criar/", {
+            "titulo": "Guarda-chuva xadrez",
+            "status": "perdido",
+            "data": str(date.today()),
+        }, format="json")
+        assert resp.data["data"]["categoria_id"] is None
+        assert resp.data["data"]["categoria_sugerida"] is False
+
+    def test_comando_preenche_itens_sem_categoria(self, user, categoria):
+        from io import StringIO
+        from django.core.management import call_command
+
+        Item.objects.create(titulo="Notebook Lenovo", status="achado", data=date.today(), usuario=user, categoria=categoria)
+        sem = Item.objects.create(titulo="Notebook Acer", status="achado", data=date.today(), usuario=user)
+        saida = StringIO()
+        call_command("sugerir_categorias", stdout=saida)
+        sem.refresh_from_db()
+        assert sem.categoria_id == categoria.id
+        assert "1/1 categorias aplicadas" in saida.getvalue()
+
+    def test_indice_de_categorias_incremental(self, user, categoria):
+        from unittest.mock import patch
+
+        from items import categorizacao
+
+        for titulo in ["Notebook Lenovo", "Notebook Acer", "Mouse sem fio"]:
+            Item.objects.create(titulo=titulo, status="achado", data=date.today(), usuario=user, categoria=categoria)
+        categorizacao.descartar()
+        assert len(categorizacao.obter_indice()) == 3
+
+        construir = categorizacao.IndiceCategorias.construir
+        vetorizadas = []
+
+        def espiao(linhas):
+            linhas = list(linhas)
+            vetorizadas.append(len(linhas))
+            return construir(linhas)
+
+        with patch.object(categorizacao.IndiceCategorias, "construir", side_effect=espiao):
+            Item.objects.create(titulo="Caneta azul", status="achado", data=date.today(), usuario=user)
+            categorizacao.obter_indice()
+            assert vetorizadas == []  # item sem categoria não muda o índice
+            Item.objects.create(titulo="Notebook Dell", status="achado", data=date.today(), usuario=user,
+                                categoria=categoria)
+            indice = categorizacao.obter_indice()
+        assert len(indice) == 4
+        # sem reconstruir: só a linha nova (e a mais recente da versão anterior, pelo __gte)
+        assert vetorizadas == [2]
+
+    def test_indice_de_categorias_confere_versao_por_intervalo(self, user, categoria, django_assert_num_queries):
+        from items import categorizacao
+
+        Item.objects.create(titulo="Notebook Lenovo", status="achado", data=date.today(), usuario=user, categoria=categoria)
+        categorizacao.obter_indice()
+        with django_assert_num_queries(0):
+            categorizacao.obter_indice()
+        Item.objects.filter(titulo="Notebook Lenovo").update(categoria=None)  # outro processo, sem sinal
+        assert len(categorizacao.obter_indice()) == 1
+        categorizacao.item_alterado()
+        assert len(categorizacao.obter_indice()) == 0
+
+    def test_comando_invalida_buscas_em_cache(self, user, categoria):
+        from io import StringIO
+        from django.core.management import call_command
+
+        from items import cache_busca
+
+        Item.objects.create(titulo="Notebook Lenovo", status="achado", data=date.today(), usuario=user, categoria=categoria)
+        Item.objects.create(titulo="Notebook Acer", status="achado", data=date.today(), usuario=user)
+        antes = cache_busca.versao()
+        call_command("sugerir_categorias", stdout=StringIO())
+        assert cache_busca.versao() != antes
+
+    def test_categoria_aplicada_alerta_buscas_salvas(self, auth_client, user, categoria):
+        from io import StringIO
+        from django.core.management import call_command
+
+        from items.models import AlertaBusca, BuscaSalva
+
+        outro = User.objects.create_user(username="outro", password="Str0ngP@ss!")
+        busca = BuscaSalva.objects.create(usuario=outro, categoria=categoria)
+        Item.objects.create(titulo="Notebook Lenovo", status="achado", data=date.today(), usuario=outro,
+                            categoria=categoria)
+        sem = Item.objects.create(titulo="Notebook Acer", status="achado", data=date.today(), usuario=user)
+        assert not AlertaBusca.objects.exists()  # cadastrado sem categoria: a busca não casou
+
+        call_command("sugerir_categorias", stdout=StringIO())
+        assert list(AlertaBusca.objects.values_list("busca_id", "item_id")) == [(busca.id, sem.id)]
+
+        resp = auth_client.post("/api/items/criar/", {
+            "titulo": "Notebook Dell", "status": "achado", "data": str(date.today()),
+        }, format="json")
+        assert resp.data["data"]["categoria_sugerida"] is True
+        assert AlertaBusca.objects.filter(busca=busca, item_id=resp.data["data"]["id"]).exists()
+
 
 # ──────────────────────────────────────────────────────────────
 # Editar item (dono)
@@ -0,0 +1,300 @@
+"""Testes para a busca textual com índice full-text (items/busca_texto.py)."""
+from datetime import date
+from io import StringIO
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.utils import timezone
+
+from items import busca_texto
+from items.busca_texto import filtro_texto
+from items.models import Item
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(username="buscatexto", password="Str0ngP@ss!")
+
+
+@pytest.fixture
+def itens(user):
+    dados = [
+        ("Guarda-chuva preto", "Cabo de madeira", "Bloco A"),
+        ("Garrafa Térmica", "Inox, adesivo da UFC", "Biblioteca"),
+        ("Notebook Dell", "Prateado", "Laboratório 3"),
+    ]
+    return [
+        Item.objects.create(titulo=t, descricao=d, local=l, status="achado", data=date.today(), usuario=user)
+        for t, d, l in dados
+    ]
+
+
+def _buscar(q, filtro=filtro_texto):
+    return list(Item.objects.filter(filtro(q)).order_by("id").values_list("titulo", flat=True))
+
+
+def _buscar_fts(q):
+    return _buscar(q, lambda termo: busca_texto.obter_backend().filtro(termo))
+
+
+class TestIndiceFullText:
+
+    def test_backend_fts5_no_sqlite(self, db):
+        assert busca_texto.obter_backend().nome == "fts5"
+
+    def test_prefixo_sem_acento_e_em_qualquer_campo(self, itens):
+        assert _buscar("guarda chu") == ["Guarda-chuva preto"]
+        assert _buscar("garrafa termica") == ["Garrafa Térmica"]
+        assert _buscar("laboratorio") == ["Notebook Dell"]
+        assert _buscar("preto inox") == []
+        assert _buscar("!!") == []
+
+    def test_indice_acompanha_edicao_e_remocao(self, itens):
+        guarda_chuva, garrafa, _ = itens
+        guarda_chuva.titulo = "Sombrinha preta"
+        guarda_chuva.save()
+        garrafa.delete()
+        assert _buscar("guarda") == []
+        assert _buscar("sombrinha") == ["Sombrinha preta"]
+        assert _buscar("garrafa") == []
+
+    def test_gatilhos_recriados_apos_migracao(self, itens):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TRIGGER {busca_texto.TABELA_FTS}_ai")
+        Item.objects.create(titulo="Carteira marrom", status="perdido", data=date.today(), usuario=itens[0].usuario)
+        assert _buscar_fts("carteira") == []
+
+        assert busca_texto.garantir_gatilhos() is True
+        assert _buscar_fts("carteira") == ["Carteira marrom"]
+        assert busca_texto.garantir_gatilhos() is False
+
+    def test_ausencia_da_tabela_fts5_fica_memorizada(self, db, django_assert_num_queries):
+        assert busca_texto.tem_fts5(tabela="tabela_inexistente") is False
+        with django_assert_num_queries(0):
+            assert busca_texto.tem_fts5(tabela="tabela_inexistente") is False
+        busca_texto.sincronizar_apos_migrate()
+        assert "tabela_inexistente" not in {tabela for _, tabela in busca_texto._fts5_por_banco}
+
+    @override_settings(BUSCA_TEXTO_BACKEND="items.busca_texto.BuscaTextoBackend")
+    def test_backend_configuravel(self, itens):
+        assert busca_texto.obter_backend().nome == "icontains"
+        assert _buscar("book") == ["Notebook Dell"]
+
+    def test_api_e_comando(self, itens, client):
+        resp = client.get("/api/items/", {"q": "termica"})
+        assert [i["titulo"] for i in resp.json()["results"]] == ["Garrafa Térmica"]
+
+        saida = StringIO()
+        call_command("reindexar_busca", stdout=saida)
+        assert "com 3 itens e trigramas de 3 itens" in saida.getvalue()
+
+
+class TestTrigramas:
+
+    def test_trigramas_com_bordas(self):
+        from items.texto import trigramas
+
+        assert trigramas("Gár") == {"  g", " ga", "gar", "ar "}
+        assert trigramas("guarda-chuva") == trigramas("Guarda Chuva")
+
+    def test_tolera_erro_de_digitacao_e_junta_palavras(self, itens):
+        assert _buscar("garafa termica") == ["Garrafa Térmica"]
+        assert _buscar("guardachuva") == ["Guarda-chuva preto"]
+        assert _buscar("notbook") == ["Notebook Dell"]
+        assert _buscar("mochila azul") == []
+
+    def test_trigramas_acompanham_edicao(self, itens):
+        from items.models import TrigramaItem
+
+        notebook = itens[2]
+        notebook.descricao = "Cinza"
+        notebook.save(update_fields=["descricao"])
+        notebook.refresh_from_db()
+        assert notebook.texto_normalizado == "notebook dell cinza laboratorio 3"
+        assert TrigramaItem.objects.filter(item=notebook, trigrama="cin").exists()
+        assert not TrigramaItem.objects.filter(item=notebook, trigrama="pra").exists()
+
+    def test_ordem_por_similaridade(self, itens, client):
+        user = itens[0].usuario
+        Item.objects.create(titulo="Garrafa de vidro", status="achado", data=date.today(), usuario=user)
+        resp = client.get("/api/items/", {"q": "garrafa termica"})
+        assert [i["titulo"] for i in resp.json()["results"]] == ["Garrafa Térmica"]
+        ordenados = busca_texto.ordenar_por_similaridade(Item.objects.all(), "garrafa")
+        assert ordenados[0].similaridade_texto == 1.0
+        assert ordenados[0].titulo == "Garrafa de vidro"  # empate: mais recente primeiro
+
+
+class TestSugestoesMenu:
+
+    @pytest.fixture(autouse=True)
+    def indice_limpo(self, monkeypatch):
+        from items import sugestoes
+
+        monkeypatch.setattr(sugestoes, "_indice", None)
+        monkeypatch.setattr(sugestoes, "_marca", None)
+        monkeypatch.setattr(sugestoes, "_verificado_em", 0.0)
+
+    def _sugerir(self, q):
+        from items import sugestoes
+
+        return [titulo for _, titulo, _, _ in sugestoes.sugerir(q)]
+
+    def test_prefixo_de_qualquer_palavra(self, itens):
+        assert self._sugerir("guarda chu") == ["Guarda-chuva preto"]
+        assert self._sugerir("LABORAT") == ["Notebook Dell"]
+        assert self._sugerir("chuva p") == ["Guarda-chuva preto"]
+        assert self._sugerir("prateado") == []  # descrição fica de fora
+
+    def test_mais_novos_primeiro_mesmo_com_muitos_candidatos(self):
+        from items.sugestoes import IndicePrefixos
+
+        # 3000 itens antigos com chaves que vêm antes, em ordem alfabética, das dos novos
+        linhas = [(i, f"Caderno {i}", "", f"caderno-{i}", None) for i in range(1, 3001)]
+        linhas += [(5000, "Cuia", "", "cuia", None), (5001, "Cachecol azul", "", "cachecol", None)]
+        indice = IndicePrefixos.construir(linhas)
+        assert [item_id for item_id, *_ in indice.sugerir("c", limite=2)] == [5001, 5000]
+        assert [item_id for item_id, *_ in indice.sugerir("cachec")] == [5001]
+        assert [item_id for item_id, *_ in indice.sugerir("cader", limite=2)] == [3000, 2999]
+
+        indice.remover(5001)
+        indice.atualizar(5002, "Chapéu", "Bloco A", "chapeu", None)
+        assert [item_id for item_id, *_ in indice.sugerir("c", limite=2)] == [5002, 5000]
+        assert indice.sugerir("cachec") == []
+
+    def test_sem_consultas_depois_de_carregado(self, itens, django_assert_num_queries):
+        self._sugerir("garrafa")
+        with django_assert_num_queries(0):
+            assert self._sugerir("garr") == ["Garrafa Térmica"]
+
+    def test_acompanha_save_e_delete(self, itens):
+        guarda_chuva, garrafa, _ = itens
+        self._sugerir("x")
+        guarda_chuva.titulo = "Sombrinha preta"
+        guarda_chuva.save()
+        garrafa.delete()
+        assert self._sugerir("guarda") == []
+        assert self._sugerir("somb") == ["Sombrinha preta"]
+        assert self._sugerir("garrafa") == []
+
+    @override_settings(SUGESTOES_INTERVALO=0)
+    def test_enxerga_alteracoes_de_outros_processos(self, itens):
+        self._sugerir("x")
+        # outro processo: sem sinais neste
+        Item.objects.filter(pk=itens[2].pk).update(titulo="Notebook Lenovo", atualizado_em=timezone.now())
+        Item.objects.filter(pk=itens[1].pk).delete()
+        assert self._sugerir("notebook") == ["Notebook Lenovo"]
+        assert self._sugerir("garrafa") == []
+
+    def test_endpoint_do_menu(self, itens, client):
+        client.force_login(itens[0].usuario)
+        resp = client.get("/menu/suggestions/", {"q": "garr"})
+        assert resp.json() == [
+            {"titulo": "Garrafa Térmica", "subtitulo": "Biblioteca", "url": f"/item/{itens[1].slug}/"}
+        ]
+
+
+class TestRanking:
+
+    def _criar(self, user, titulo, descricao="", local="", status="achado", dias=0):
+        from datetime import timedelta
+
+        return Item.objects.create(titulo=titulo, descricao=descricao, local=local, status=status,
+                                   data=date.today() - timedelta(days=dias), usuario=user)
+
+    def _ranquear(self, q, inicio=0, quantidade=10):
+        itens, tem_mais = busca_texto.ranquear(Item.objects.filter(filtro_texto(q)), q, inicio, quantidade)
+        return [i.titulo for i in itens], tem_mais
+
+    def test_titulo_antes_de_descricao_e_local(self, user):
+        self._criar(user, "Mochila", local="Sala da carteira")
+        self._criar(user, "Bolsa", descricao="Tinha uma carteira dentro")
+        self._criar(user, "Carteira de couro")
+        assert self._ranquear("carteira")[0] == ["Carteira de couro", "Bolsa", "Mochila"]
+
+    def test_recencia_e_status_aberto(self, user):
+        self._criar(user, "Chave antiga", dias=365)
+        self._criar(user, "Chave nova")
+        self._criar(user, "Chave devolvida", status="devolvido")
+        assert self._ranquear("chave")[0] == ["Chave nova", "Chave devolvida", "Chave antiga"]
+
+    @override_settings(BUSCA_RANKING_CANDIDATOS=2)
+    def test_paginas_alem_dos_candidatos(self, user):
+        for i in range(4):
+            self._criar(user, f"Caneta {i}")
+        primeira, tem_mais = self._ranquear("caneta", 0, 2)
+        segunda, fim = self._ranquear("caneta", 2, 2)
+        assert tem_mais and not fim
+        assert sorted(primeira + segunda) == [f"Caneta {i}" for i in range(4)]
+
+    def test_api_devolve_relevancia(self, itens, client):
+        resp = client.get("/api/items/", {"q": "garrafa"})
+        resultado, = resp.json()["results"]
+        assert resultado["titulo"] == "Garrafa Térmica"
+        assert 0 < resultado["relevancia"] <= 100
+
+
+class TestCacheBusca:
+
+    def test_acerto_e_so_uma_consulta_por_pk(self, itens, client, django_assert_num_queries):
+        primeira = client.get("/api/items/", {"q": "Garrafa"}).json()
+        with django_assert_num_queries(1):  # facetas também vêm do cache
+            repetida = client.get("/api/items/", {"q": "GARRAFA "}).json()
+        assert repetida == primeira
+        assert repetida["results"][0]["relevancia"] is not None
+
+    def test_invalida_em_criacao_edicao_status_e_remocao(self, itens, client):
+        def titulos():
+            return [i["titulo"] for i in client.get("/api/items/", {"q": "caneta"}).json()["results"]]
+
+        assert titulos() == []
+        caneta = Item.objects.create(titulo="Caneta azul", status="perdido", data=date.today(),
+                                     usuario=itens[0].usuario)
+        assert titulos() == ["Caneta azul"]
+        caneta.titulo = "Caneta preta"
+        caneta.save()
+        assert titulos() == ["Caneta preta"]
+
+        resp = client.get("/api/items/", {"q": "caneta", "status": "perdido"}).json()
+        assert len(resp["results"]) == 1
+        caneta.status = "devolvido"
+        caneta.save(update_fields=["status"])
+        resp = client.get("/api/items/", {"q": "caneta", "status": "perdido"}).json()
+        assert resp["results"] == [] and resp["facetas"]["status"][0]["valor"] == "devolvido"
+
+        caneta.delete()
+        assert titulos() == []
+
+    def test_listagem_usa_o_cache(self, itens, client):
+        from django.test.utils import CaptureQueriesContext
+
+        client.force_login(itens[0].usuario)
+        with CaptureQueriesContext(connection) as primeira:
+            client.get("/itens/", {"q": "notebook"})
+        with CaptureQueriesContext(connection) as repetida:
+            resp = client.get("/itens/", {"q": "notebook"})
+        assert [i.titulo for i in resp.context["itens"]] == ["Notebook Dell"]
+        assert len(repetida) < len(primeira)
+        assert not any(busca_texto.TABELA_FTS in q["sql"] for q in repetida.captured_queries)
+
+    def test_versao_vista_por_outro_processo(self, db):
+        """Com o cache do banco (produção), a invalidação de um worker vale para os outros."""
+        from unittest.mock import patch
+
+        from django.core.cache.backends.db import DatabaseCache
+
+        from items import cache_busca
+
+        with override_settings(CACHES={"default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "find_cache_teste",
+        }}):
+            call_command("createcachetable")
+        worker_a = DatabaseCache("find_cache_teste", {})
+        worker_b = DatabaseCache("find_cache_teste", {})
+        with patch.object(cache_busca, "cache", worker_a):
+            antes = cache_busca.versao()
+            cache_busca.invalidar()
+        with patch.object(cache_busca, "cache", worker_b):
+            assert cache_busca.versao() == antes + 1
@@ -0,0 +1,829 @@
+"""Testes para a busca visual (items/busca_visual.py)."""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from io import BytesIO
+from unittest.mock import patch
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.utils import timezone
+from PIL import Image as PILImage
+
+from items import busca_visual
+from items.models import Item
+
+
+def _imagem(cor=(200, 30, 30), tamanho=(64, 64), nome="foto.jpg"):
+    img = PILImage.new("RGB", tamanho, cor)
+    # um quadrado para dar estrutura ao pHash
+    for x in range(tamanho[0] // 4, tamanho[0] // 2):
+        for y in range(tamanho[1] // 4, tamanho[1] // 2):
+            img.putpixel((x, y), (255, 255, 255))
+    buffer = BytesIO()
+    img.save(buffer, format="JPEG")
+    return SimpleUploadedFile(nome, buffer.getvalue(), content_type="image/jpeg")
+
+
+# ──────────────────────────────────────────────────────────────
+# Fixtures
+# ──────────────────────────────────────────────────────────────
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(username="visual", email="visual@example.com", password="Str0ngP@ss!")
+
+
+@pytest.fixture
+def item_com_imagem(user):
+    return Item.objects.create(
+        titulo="Mochila vermelha",
+        descricao="Mochila de nylon",
+        status="achado",
+        local="Bloco A",
+        data=date.today(),
+        usuario=user,
+        imagem=_imagem(),
+    )
+
+
+@pytest.fixture(autouse=True)
+def media_temporaria(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+
+
+@pytest.fixture(autouse=True)
+def disjuntor_limpo():
+    busca_visual.disjuntor.registrar_sucesso()
+    yield
+    busca_visual.disjuntor.registrar_sucesso()
+
+
+@pytest.fixture(autouse=True)
+def cache_limpo():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+# ──────────────────────────────────────────────────────────────
+# Gemini: payload e disjuntor
+# ──────────────────────────────────────────────────────────────
+class TestPreparacaoGemini:
+
+    @override_settings(GEMINI_MAX_LADO=128)
+    def test_imagem_reduzida_antes_do_envio(self):
+        grande = _imagem(tamanho=(1024, 768)).read()
+        _, _, reduzida, _ = busca_visual.analisar_consulta(grande, com_gemini=True)
+        img = PILImage.open(BytesIO(reduzida))
+        assert max(img.size) <= 128
+        assert img.format == "JPEG"
+
+    def test_sessao_http_reaproveitada(self):
+        assert busca_visual._sessao_http() is busca_visual._sessao_http()
+
+
+class TestDisjuntor:
+
+    @override_settings(GEMINI_DISJUNTOR_FALHAS=2, GEMINI_DISJUNTOR_PAUSA=60)
+    def test_abre_apos_falhas_consecutivas(self):
+        d = busca_visual.DisjuntorGemini()
+        d.registrar_falha()
+        assert d.permite()
+        d.registrar_falha()
+        assert not d.permite()
+
+    @override_settings(GEMINI_DISJUNTOR_FALHAS=2)
+    def test_sucesso_zera_falhas(self):
+        d = busca_visual.DisjuntorGemini()
+        d.registrar_falha()
+        d.registrar_sucesso()
+        d.registrar_falha()
+        assert d.permite()
+
+
+# ──────────────────────────────────────────────────────────────
+# Orquestração com orçamento de latência
+# ──────────────────────────────────────────────────────────────
+class TestBuscaComOrcamento:
+
+    @override_settings(GEMINI_API_KEY="")
+    def test_sem_chave_usa_busca_local(self, item_com_imagem):
+        resultados = Item.buscar_por_imagem(_imagem())
+        assert resultados
+        assert resultados[0][0] == item_com_imagem
+
+    @override_settings(GEMINI_API_KEY="chave", BUSCA_VISUAL_ORCAMENTO=0.2)
+    def test_gemini_lento_responde_com_local(self, item_com_imagem):
+        def lento(dados, api_key):
+            time.sleep(1)
+            return "guarda-chuva azul"
+
+        with patch.object(busca_visual, "descrever_com_gemini", side_effect=lento):
+            inicio = time.monotonic()
+            resultados = Item.buscar_por_imagem(_imagem())
+            assert time.monotonic() - inicio < 0.9
+        assert resultados[0][0] == item_com_imagem
+
+    @override_settings(GEMINI_API_KEY="chave", BUSCA_VISUAL_ORCAMENTO=2)
+    def test_gemini_dentro_do_orcamento_tem_prioridade(self, item_com_imagem):
+        with patch.object(busca_visual, "descrever_com_gemini", return_value="mochila vermelha"):
+            resultados = Item.buscar_por_imagem(_imagem(cor=(10, 200, 10)))
+        assert resultados == [(item_com_imagem, 100.0)]
+
+    @override_settings(GEMINI_API_KEY="chave", GEMINI_DISJUNTOR_FALHAS=1)
+    def test_disjuntor_aberto_nao_chama_gemini(self, item_com_imagem):
+        busca_visual.disjuntor.registrar_falha()
+        with patch.object(busca_visual, "descrever_com_gemini") as gemini:
+            Item.buscar_por_imagem(_imagem())
+        gemini.assert_not_called()
+
+
+# ──────────────────────────────────────────────────────────────
+# Cache de resultados e agrupamento de consultas
+# ──────────────────────────────────────────────────────────────
+class TestCacheBusca:
+
+    @override_settings(GEMINI_API_KEY="")
+    def test_consulta_repetida_usa_cache(self, item_com_imagem):
+        with patch.object(busca_visual, "_calcular", wraps=busca_visual._calcular) as calcular:
+            primeira = Item.buscar_por_imagem(_imagem())
+            segunda = Item.buscar_por_imagem(_imagem())
+        assert calcular.call_count == 1
+        assert primeira == segunda
+
+    @override_settings(GEMINI_API_KEY="")
+    def test_catalogo_alterado_invalida_cache(self, item_com_imagem, user):
+        with patch.object(busca_visual, "_calcular", wraps=busca_visual._calcular) as calcular:
+            Item.buscar_por_imagem(_imagem())
+            Item.objects.create(titulo="Outro", status="achado", data=date.today(), usuario=user)
+            Item.buscar_por_imagem(_imagem())  # item sem foto não muda a busca visual
+            item_com_imagem.status = "devolvido"
+            item_com_imagem.save()
+            Item.buscar_por_imagem(_imagem())
+        assert calcular.call_count == 2
+
+    def test_consultas_simultaneas_sao_agrupadas(self):
+        chamadas = []
+
+        def calcular():
+            chamadas.append(1)
+            time.sleep(0.2)
+            return [(1, 99.0)]
+
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            resultados = list(pool.map(lambda _: busca_visual._agrupar("k", calcular, 5), range(5)))
+        assert len(chamadas) == 1
+        assert resultados == [[(1, 99.0)]] * 5
+        assert not busca_visual._em_andamento
+
+    @override_settings(GEMINI_API_KEY="")
+    def test_mesma_foto_sai_do_cache_sem_decodificar_nem_admissao(self, item_com_imagem):
+        foto = _imagem().read()
+        with patch.object(busca_visual, "analisar_consulta", wraps=busca_visual.analisar_consulta) as analisar:
+            primeira = busca_visual.buscar(SimpleUploadedFile("a.jpg", foto))
+            with patch.object(busca_visual.admissao, "limite", return_value=0):
+                segunda = busca_visual.buscar(SimpleUploadedFile("b.jpg", foto))
+            # bytes diferentes com o mesmo pHash: decodifica, mas reaproveita o cache do pHash
+            with patch.object(busca_visual, "_calcular", wraps=busca_visual._calcular) as calcular:
+                reenviada = busca_visual.buscar(SimpleUploadedFile("c.jpg", foto + b"\0"))
+        assert analisar.call_count == 2
+        assert calcular.call_count == 0
+        assert primeira == segunda == reenviada
+
+    @override_settings(GEMINI_API_KEY="")
+    def test_so_quem_calcula_ocupa_vaga(self, db):
+        from items.indice_visual import versao_catalogo
+
+        versao_catalogo()  # índice carregado nesta thread: as outras não consultam o banco
+        foto = _imagem().read()
+
+        def lento(*args, **kwargs):
+            time.sleep(0.3)
+            return []
+
+        with patch.object(busca_visual.admissao, "limite", return_value=1), \
+                patch.object(busca_visual, "_calcular", side_effect=lento) as calcular:
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                paginas = list(pool.map(lambda _: busca_visual.buscar_pagina(SimpleUploadedFile("f.jpg", foto)), range(4)))
+        assert paginas == [([], False)] * 4
+        assert calcular.call_count == 1
+        assert busca_visual.admissao.ativas == 0
+
+    @override_settings(GEMINI_API_KEY="")
+    def test_espera_por_consulta_agrupada_estourada_vira_503(self, item_com_imagem):
+        from concurrent.futures import TimeoutError as FuturesTimeout
+
+        with patch.object(busca_visual, "_agrupar", side_effect=FuturesTimeout()):
+            with pytest.raises(busca_visual.BuscaVisualSaturada):
+                Item.buscar_por_imagem(_imagem())
+
+    @override_settings(GEMINI_API_KEY="")
+    def test_cor_dos_filtros_nao_e_apagada(self, item_com_imagem):
+        with patch.object(busca_visual, "buscar_pagina", return_value=([], False)) as pagina:
+            busca_visual.buscar(_imagem(), filtros={"cor": "azul"})
+            busca_visual.buscar(_imagem(), cor="vermelho", filtros={"cor": "azul"})
+        assert pagina.call_args_list[0].kwargs["filtros"] == {"cor": "azul"}
+        assert pagina.call_args_list[1].kwargs["filtros"] == {"cor": "vermelho"}
+
+
+# ──────────────────────────────────────────────────────────────
+# Modo trace
+# ──────────────────────────────────────────────────────────────
+class TestRastreio:
+
+    @override_settings(GEMINI_API_KEY="")
+    def test_admin_recebe_etapas_e_estrategia(self, user, item_com_imagem):
+        from rest_framework.test import APIClient
+
+        user.is_staff = True
+        user.save()
+        client = APIClient()
+        client.force_authenticate(user)
+        client.post("/api/items/busca-visual/", {"imagem": _imagem()})  # aquece o cache
+
+        trace = client.post("/api/items/busca-visual/?trace=1", {"imagem": _imagem()}).data["trace"]
+        assert {"leitura", "fila", "decodificacao", "indice", "pontuacao", "hidratacao"} <= set(trace["etapas_ms"])
+        assert (trace["estrategia"], trace["gemini"], trace["cache"]) == ("local", "desligado", "ignorado")
+        assert trace["catalogo"] == trace["candidatos"] == 1 and trace["bytes_lidos"] > 0
+        assert trace["multihash"] is True
+
+    @override_settings(GEMINI_API_KEY="chave", BUSCA_VISUAL_ORCAMENTO=2)
+    def test_registra_gemini(self, item_com_imagem):
+        rastreio = busca_visual.Rastreio()
+        with patch.object(busca_visual, "descrever_com_gemini", return_value="mochila vermelha"):
+            busca_visual.buscar_pagina(_imagem(), filtros={}, rastreio=rastreio)
+        resumo = rastreio.resumo()
+        assert (resumo["estrategia"], resumo["gemini"]) == ("gemini", "ok")
+        assert "gemini_espera" in resumo["etapas_ms"]
+
+    def test_usuario_comum_nao_recebe_trace(self, item_com_imagem, client):
+        resp = client.post("/api/items/busca-visual/?trace=1", {"imagem": _imagem()}, HTTP_X_BUSCA_TRACE="1")
+        assert "trace" not in resp.json()
+
+    @override_settings(GEMINI_API_KEY="")
+    def test_pagina_html_mostra_trace_so_para_admin(self, user, item_com_imagem, client):
+        client.force_login(user)
+        resp = client.post("/itens/busca-visual/?trace=1", {"imagem_busca": _imagem()})
+        assert resp.context["trace"] is None
+
+        user.is_staff = True
+        user.save()
+        resp = client.post("/itens/busca-visual/?trace=1", {"imagem_busca": _imagem()})
+        assert {"fila", "pontuacao", "hidratacao"} <= set(resp.context["trace"]["etapas_ms"])
+        assert b'id="traceBusca"' in resp.content
+
+
+# ──────────────────────────────────────────────────────────────
+# Pool de processos e controle de admissão
+# ──────────────────────────────────────────────────────────────
+class TestAdmissao:
+
+    @override_settings(BUSCA_VISUAL_WORKERS=1, BUSCA_VISUAL_FILA=1)
+    def test_rejeita_acima_do_limite(self):
+        controle = busca_visual.ControleAdmissao()
+        controle.entrar()
+        controle.entrar()
+        with pytest.raises(busca_visual.BuscaVisualSaturada):
+            controle.entrar()
+        controle.sair()
+        controle.entrar()
+        assert controle.metricas()["rejeitadas"] == 1
+
+    @override_settings(BUSCA_VISUAL_WORKERS=2, BUSCA_VISUAL_FILA=2, BUSCA_VISUAL_LIMITE_GLOBAL=5)
+    def test_limite_global_somado_entre_processos(self):
+        processo_a, processo_b = busca_visual.ControleAdmissao(), busca_visual.ControleAdmissao()
+        processo_a.entrar(4)
+        processo_b.entrar()
+        with pytest.raises(busca_visual.BuscaVisualSaturada):
+            processo_b.entrar()  # cabe no processo b, mas não no total
+        processo_a.sair(4)
+        processo_b.entrar(3)
+        assert processo_b.metricas()["ativas_global"] == 4
+
+    @override_settings(BUSCA_VISUAL_RETRY_AFTER=7)
+    def test_api_responde_503_quando_saturada(self, db, client):
+        with patch.object(busca_visual.admissao, "entrar", side_effect=busca_visual.BuscaVisualSaturada(7)):
+            resp = client.post("/api/items/busca-visual/", {"imagem": _imagem()})
+        assert resp.status_code == 503
+        assert resp["Retry-After"] == "7"
+
+    @override_settings(BUSCA_VISUAL_WORKERS=1)
+    def test_analise_no_pool_de_processos(self):
+        try:
+            phash, descritor, jpeg, impressao = busca_visual.analisar_consulta(_imagem().read())
+        finally:
+            busca_visual._descartar_pool()
+        assert len(phash) == 64 and descritor.shape == (89,) and jpeg is None
+        assert impressao[:32] == bytes.fromhex(phash)
+        assert busca_visual.admissao.metricas()["espera_fila_max_ms"] >= 0
+
+
+# ──────────────────────────────────────────────────────────────
+# Descritores e índice visual
+# ──────────────────────────────────────────────────────────────
+class TestDescritorEIndice:
+
+    def test_descritor_compacto_e_normalizado(self):
+        from items.descritores import DIMENSAO, bytes_para_descritor, calcular_descritor, descritor_para_bytes
+
+        vetor = calcular_descritor(PILImage.open(_imagem()))
+        assert vetor.shape == (DIMENSAO,)
+        assert abs(float((vetor ** 2).sum()) - 1) < 1e-3
+        assert len(descritor_para_bytes(vetor)) == DIMENSAO * 2
+        assert bytes_para_descritor(descritor_para_bytes(vetor)).shape == (DIMENSAO,)
+
+    def test_indice_atualizado_de_forma_incremental(self, item_com_imagem, user):
+        from items import indice_visual
+
+        assert len(indice_visual.obter_indice()) == 1
+        with patch.object(indice_visual.IndiceVisual, "construir", wraps=indice_visual.IndiceVisual.construir) as construir:
+            novo = Item.objects.create(titulo="Mochila azul", status="perdido", data=date.today(), usuario=user,
+                                       imagem=_imagem(cor=(20, 20, 200)))
+            indice = indice_visual.obter_indice()
+        assert sorted(indice.ids.tolist()) == [item_com_imagem.pk, novo.pk]
+        assert construir.call_args.kwargs == {"treinar": False}  # só as linhas alteradas, sem reconstruir
+
+        novo.status = "devolvido"
+        novo.save()
+        indice = indice_visual.obter_indice()
+        assert indice.mascara({"status": ["perdido"]}).sum() == 0 and len(indice) == 2
+
+    @override_settings(INDICE_VISUAL_INTERVALO=60)
+    def test_versao_conferida_no_maximo_a_cada_intervalo(self, item_com_imagem, django_assert_num_queries):
+        from items import indice_visual
+
+        indice_visual.obter_indice()
+        with django_assert_num_queries(0):
+            indice_visual.obter_indice()
+        # mudança feita por outro processo (sem sinal neste): só vale depois do intervalo
+        Item.objects.filter(pk=item_com_imagem.pk).update(status="devolvido", atualizado_em=timezone.now())
+        assert indice_visual.obter_indice().mascara({"status": ["achado"]}).sum() == 1
+        indice_visual.catalogo_alterado()
+        assert indice_visual.obter_indice().mascara({"status": ["achado"]}).sum() == 0
+
+    @override_settings(INDICE_VISUAL_INTERVALO=0)
+    def test_transacao_confirmada_tarde_entra_no_indice(self, item_com_imagem, user):
+        from datetime import timedelta
+
+        from items import indice_visual
+
+        Item.objects.create(titulo="Mochila azul", status="perdido", data=date.today(), usuario=user,
+                            imagem=_imagem(cor=(20, 20, 200)))
+        indice_visual.obter_indice()
+        # outro processo confirma uma edição com atualizado_em anterior à última leitura:
+        # contagem e máximos não mudam, só o contador compartilhado
+        antes = indice_visual._marca[2] - timedelta(seconds=10)
+        Item.objects.filter(pk=item_com_imagem.pk).update(status="devolvido", atualizado_em=antes)
+        indice_visual._incrementar_contador()
+        assert indice_visual.obter_indice().mascara({"status": ["achado"]}).sum() == 0
+
+    def test_item_salvo_ganha_descritor(self, item_com_imagem):
+        item_com_imagem.refresh_from_db()
+        assert item_com_imagem.image_hash
+        assert item_com_imagem.descritor
+
+    def test_impressao_empacota_phash_e_hashes_extras(self, item_com_imagem):
+        from items.descritores import BYTES_IMPRESSAO
+
+        item_com_imagem.refresh_from_db()
+        impressao = bytes(item_com_imagem.impressao)
+        assert len(impressao) == BYTES_IMPRESSAO == 56
+        # o pHash fica no início, idêntico ao image_hash
+        assert impressao[:32] == bytes.fromhex(item_com_imagem.image_hash)
+
+    def test_impressao_combinada_e_fallback_para_phash(self):
+        from PIL import ImageEnhance
+        from items.descritores import calcular_impressao, impressao_para_bits
+        from items.indice_visual import IndiceVisual
+
+        original = PILImage.open(_imagem())
+        outra = PILImage.open(_imagem(cor=(20, 20, 200), tamanho=(64, 48)))
+        clara = ImageEnhance.Brightness(original).enhance(1.4)
+        linhas = []
+        for item_id, img in ((1, original), (2, outra)):
+            impressao = calcular_impressao(img)
+            linhas.append((item_id, impressao[:32].hex(), None, "achado", None, None, impressao))
+        linhas.append((3, linhas[0][1], None))  # item antigo, ainda sem impressão
+
+        indice = IndiceVisual.construir(linhas)
+        assert indice.tem_extras.tolist() == [True, True, False]
+        bits = impressao_para_bits(calcular_impressao(clara))
+        distancias = indice._distancias_hash(bits)
+        assert distancias[0] < distancias[1]
+        # sem impressão gravada a distância é só a do pHash
+        assert distancias[2] == indice._distancias_hash(bits[:32])[2]
+        assert indice.buscar(None, bits, limite=1)[0][0] in (1, 3)
+
+    def test_ivf_encontra_vizinho_exato(self):
+        import numpy as np
+        from items.descritores import DIMENSAO
+        from items.indice_visual import IndiceVisual
+
+        rng = np.random.default_rng(0)
+        vetores = rng.random((500, DIMENSAO), dtype=np.float32)
+        vetores /= np.linalg.norm(vetores, axis=1, keepdims=True)
+        hashes = rng.integers(0, 256, size=(500, 32), dtype=np.uint8)
+        linhas = [
+            (i + 1, hashes[i].tobytes().hex(), vetores[i].astype(np.float16).tobytes())
+            for i in range(500)
+        ]
+        with override_settings(INDICE_IVF_MINIMO=100, INDICE_IVF_NPROBE=4):
+            indice = IndiceVisual.construir(linhas)
+            assert indice.listas is not None
+            resultados = indice.buscar(vetores[42], hashes[42], limite=5)
+        assert resultados[0][0] == 43
+        assert IndiceVisual.construir(linhas, minimo_ivf=100).listas is not None
+        assert IndiceVisual.construir(linhas, minimo_ivf=1000).listas is None
+
+    def test_indice_recarrega_quando_catalogo_muda(self, user, item_com_imagem):
+        from items.indice_visual import obter_indice
+
+        assert len(obter_indice()) == 1
+        Item.objects.create(
+            titulo="Garrafa", descricao="", status="achado", local="Pátio",
+            data=date.today(), usuario=user, imagem=_imagem(cor=(20, 20, 200)),
+        )
+        assert len(obter_indice()) == 2
+
+
+class TestBenchmark:
+
+    def test_benchmark_reporta_recall_e_nao_deixa_itens(self, db):
+        from django.core.management import call_command
+        from io import StringIO
+
+        saida = StringIO()
+        call_command("benchmark_busca_visual", itens=30, consultas=5, k=[1, 5], stdout=saida)
+        texto = saida.getvalue()
+        for estrategia in ("busca_local", "exaustivo", "ivf", "phash"):
+            assert estrategia in texto
+        assert "R@5=" in texto and "p99=" in texto
+        assert not Item.objects.exists()
+
+
+class TestGerarHashes:
+
+    def _rodar(self, tmp_path, **opcoes):
+        from django.core.management import call_command
+        from io import StringIO
+
+        saida = StringIO()
+        call_command("gerar_hashes", checkpoint=str(tmp_path / "ckpt"), stdout=saida, **opcoes)
+        return saida.getvalue()
+
+    def test_processa_apenas_itens_sem_hash(self, tmp_path, item_com_imagem):
+        Item.objects.filter(pk=item_com_imagem.pk).update(image_hash=None, descritor=None, imagem_digest=None)
+        assert "1/1 hashes gerados" in self._rodar(tmp_path, workers=1)
+        item_com_imagem.refresh_from_db()
+        assert item_com_imagem.image_hash and item_com_imagem.descritor and item_com_imagem.imagem_digest
+
+        assert "Processando 0 itens" in self._rodar(tmp_path, workers=1)
+        assert not (tmp_path / "ckpt").exists()
+
+    def test_verificar_pula_imagens_inalteradas(self, tmp_path, item_com_imagem):
+        saida = self._rodar(tmp_path, workers=1, verificar=True)
+        assert "0/1 hashes gerados, 1 inalterados" in saida
+
+    def test_pool_de_processos(self, tmp_path, user, item_com_imagem):
+        outro = Item.objects.create(
+            titulo="Caderno", descricao="", status="achado", local="Sala 3",
+            data=date.today(), usuario=user, imagem=_imagem(cor=(0, 90, 200)),
+        )
+        Item.objects.update(image_hash=None)
+        assert "2/2 hashes gerados" in self._rodar(tmp_path, workers=2)
+        outro.refresh_from_db()
+        assert outro.image_hash
+
+    def test_preenche_cores_faltando(self, tmp_path, item_com_imagem):
+        from items.models import CorItem
+
+        CorItem.objects.all().delete()
+        assert "1/1 hashes gerados" in self._rodar(tmp_path, workers=1)
+        assert item_com_imagem.cores.exists()
+
+    def test_retomar_do_checkpoint(self, tmp_path, item_com_imagem):
+        Item.objects.update(image_hash=None)
+        (tmp_path / "ckpt").write_text(str(item_com_imagem.pk))
+        saida = self._rodar(tmp_path, workers=1, retomar=True)
+        assert "Processando 0 itens" in saida
+
+
+# ──────────────────────────────────────────────────────────────
+# Filtros no índice e paginação
+# ──────────────────────────────────────────────────────────────
+class TestFiltrosBusca:
+
+    def test_mascara_do_indice(self):
+        from datetime import date as d
+        from items.indice_visual import IndiceVisual
+
+        hash_zero = "00" * 32
+        indice = IndiceVisual.construir([
+            (1, hash_zero, None, "achado", 5, d(2025, 1, 10)),
+            (2, hash_zero, None, "devolvido", 5, d(2025, 1, 10)),
+            (3, hash_zero, None, "achado", None, d(2024, 6, 1)),
+        ])
+        ids = lambda filtros: [int(i) for i in indice.ids[indice.mascara(filtros)]]
+        assert indice.mascara({}) is None
+        assert ids({"status": ["achado"]}) == [1, 3]
+        assert ids({"categoria": 5}) == [1, 2]
+        assert ids({"data_inicio": d(2025, 1, 1)}) == [1, 2]
+        assert ids({"status": ["achado"], "data_fim": d(2024, 12, 31)}) == [3]
+
+    @override_settings(GEMINI_API_KEY="")
+    def test_api_aplica_filtros(self, item_com_imagem, client):
+        url = "/api/items/busca-visual/"
+        achados = client.post(url, {"imagem": _imagem(), "status": "abertos"}).json()
+        assert [i["id"] for i in achados["results"]] == [item_com_imagem.pk]
+        assert client.post(url, {"imagem": _imagem(), "status": "perdido"}).json()["results"] == []
+        assert client.post(url, {"imagem": _imagem(), "data_fim": "2000-01-01"}).json()["results"] == []
+        assert client.post(url, {"imagem": _imagem(), "data_inicio": "ontem"}).status_code == 400
+
+    @override_settings(GEMINI_API_KEY="")
+    def test_api_paginada(self, user, item_com_imagem, client):
+        for i in range(2):
+            Item.objects.create(titulo=f"Mochila {i}", descricao="", status="achado", local="",
+                                data=date.today(), usuario=user, imagem=_imagem(nome=f"m{i}.jpg"))
+        url = "/api/items/busca-visual/"
+        primeira = client.post(url, {"imagem": _imagem(), "per_page": 2}).json()
+        segunda = client.post(url, {"imagem": _imagem(), "per_page": 2, "page": 2}).json()
+        assert (primeira["total"], primeira["has_more"]) == (2, True)
+        assert (segunda["total"], segunda["has_more"]) == (1, False)
+        ids = [i["id"] for i in primeira["results"] + segunda["results"]]
+        assert len(set(ids)) == 3
+
+
+# ──────────────────────────────────────────────────────────────
+# Busca em lote (triagem)
+# ──────────────────────────────────────────────────────────────
+class TestBuscaLote:
+
+    @pytest.fixture
+    def cliente_bolsista(self, db):
+        from django.contrib.auth.models import Group
+        from rest_framework.test import APIClient
+
+        bolsista = User.objects.create_user(username="triagem", password="Str0ngP@ss!")
+        bolsista.groups.add(Group.objects.get_or_create(name="Bolsistas")[0])
+        client = APIClient()
+        client.force_authenticate(bolsista)
+        return client
+
+    def test_resultados_por_foto(self, item_com_imagem, cliente_bolsista):
+        fotos = [_imagem(nome="a.jpg"), SimpleUploadedFile("b.jpg", b"nao e imagem", content_type="image/jpeg")]
+        resp = cliente_bolsista.post("/api/items/busca-visual/lote/", {"imagens": fotos, "limite": 3})
+        assert resp.status_code == 200
+        primeira, segunda = resp.data["results"]
+        assert (primeira["nome"], primeira["ok"]) == ("a.jpg", True)
+        assert primeira["results"][0]["id"] == item_com_imagem.pk
+        assert (segunda["ok"], segunda["results"]) == (False, [])
+
+    def test_um_snapshot_do_indice_por_lote(self, item_com_imagem):
+        from items import indice_visual
+
+        with patch.object(indice_visual, "obter_indice", wraps=indice_visual.obter_indice) as obter:
+            resultados = busca_visual.buscar_lote([_imagem(), _imagem(cor=(20, 20, 200)), _imagem()])
+        assert obter.call_count == 1
+        assert len(resultados) == 3 and resultados[0] == resultados[2]
+
+    @override_settings(BUSCA_VISUAL_WORKERS=4, BUSCA_VISUAL_FILA=2, BUSCA_VISUAL_LOTE_PARALELO=2)
+    def test_lote_reserva_vagas_e_limita_fotos_no_pool(self):
+        from concurrent.futures import Future
+
+        no_pool, maximo = [], []
+
+        class PoolFalso:
+            def submit(self, funcao, *args):
+                futuro = Future()
+                futuro.set_result((time.time(), "consulta"))
+                no_pool.append(futuro)
+                maximo.append(len(no_pool) - len(lidos))  # enviadas e ainda não lidas
+                return futuro
+
+        lidos = []
+        original = busca_visual._resultado_lote
+
+        def ler(futuro, enviado, prazo):
+            lidos.append(futuro)
+            return original(futuro, enviado, prazo)
+
+        with patch.object(busca_visual, "_pool_processos", return_value=PoolFalso()), \
+                patch.object(busca_visual, "_resultado_lote", side_effect=ler):
+            assert busca_visual.analisar_lote([b"x"] * 7) == ["consulta"] * 7
+        assert max(maximo) == 2
+
+        controle = busca_visual.ControleAdmissao()
+        controle.entrar(busca_visual.vagas_lote(20))  # 2 das 6 vagas (4 workers + 2 na fila)
+        controle.entrar(4)
+        with pytest.raises(busca_visual.BuscaVisualSaturada):
+            controle.entrar()
+        controle.sair(4)
+        controle.entrar()
+
+    @override_settings(BUSCA_VISUAL_WORKERS=2, BUSCA_VISUAL_LOTE_PARALELO=1, BUSCA_VISUAL_LOTE_ORCAMENTO=0.2)
+    def test_lote_inteiro_respeita_o_proprio_orcamento(self):
+        from concurrent.futures import Future
+
+        class PoolParado:
+            def submit(self, funcao, *args):
+                return Future()  # nunca termina
+
+        inicio = time.monotonic()
+        with patch.object(busca_visual, "_pool_processos", return_value=PoolParado()):
+            with pytest.raises(busca_visual.BuscaVisualSaturada):
+                busca_visual.analisar_lote([b"x"] * 20)
+        assert time.monotonic() - inicio < 1.0
+
+    @override_settings(BUSCA_VISUAL_LOTE_MAX=2)
+    def test_limites_e_permissao(self, user, cliente_bolsista):
+        from rest_framework.test import APIClient
+
+        url = "/api/items/busca-visual/lote/"
+        assert cliente_bolsista.post(url, {"imagens": [_imagem() for _ in range(3)]}).status_code == 400
+        assert cliente_bolsista.post(url, {}).status_code == 400
+        client = APIClient()
+        client.force_authenticate(user)
+        assert client.post(url, {"imagens": [_imagem()]}).status_code == 403
+
+
+# ──────────────────────────────────────────────────────────────
+# Cores dominantes
+# ──────────────────────────────────────────────────────────────
+class TestCoresDominantes:
+
+    def test_centro_pesa_mais_que_o_fundo(self):
+        from items.descritores import cores_dominantes
+
+        img = PILImage.new("RGB", (100, 100), (255, 255, 255))
+        img.paste((20, 60, 200), (25, 25, 75, 75))
+        assert cores_dominantes(img)[0][0] == "azul"
+
+    def test_cores_gravadas_ao_salvar_imagem(self, item_com_imagem):
+        assert item_com_imagem.cores.first().cor == "vermelho"
+
+    def test_filtro_cor_na_api(self, item_com_imagem, client):
+        resp = client.get("/api/items/", {"cor": "vermelho"})
+        assert [i["id"] for i in resp.json()["results"]] == [item_com_imagem.pk]
+        resp = client.get("/api/items/", {"cor": "azul"})
+        assert resp.json()["results"] == []
+
+    @override_settings(GEMINI_API_KEY="")
+    def test_busca_visual_pre_filtrada_por_cor(self, item_com_imagem):
+        assert Item.buscar_por_imagem(_imagem(), cor="vermelho")[0][0] == item_com_imagem
+        assert Item.buscar_por_imagem(_imagem(), cor="azul") == []
+
+
+# ──────────────────────────────────────────────────────────────
+# Duplicatas
+# ──────────────────────────────────────────────────────────────
+class TestDuplicatas:
+
+    @pytest.fixture
+    def par_repetido(self, user, item_com_imagem):
+        repetido = Item.objects.create(
+            titulo="Mochila achada", descricao="", status="achado", local="Cantina",
+            data=date.today(), usuario=user, imagem=_imagem(),
+        )
+        diferente = PILImage.new("RGB", (64, 64), (0, 0, 0))
+        for x in range(32, 64):
+            for y in range(0, 64, 2):
+                diferente.putpixel((x, y), (250, 250, 0))
+        buffer = BytesIO()
+        diferente.save(buffer, format="JPEG")
+        Item.objects.create(
+            titulo="Outro", descricao="", status="achado", local="Pátio", data=date.today(), usuario=user,
+            imagem=SimpleUploadedFile("outro.jpg", buffer.getvalue(), content_type="image/jpeg"),
+        )
+        return item_com_imagem, repetido
+
+    def test_detecta_par_e_agrupa(self, par_repetido):
+        from items.duplicatas import detectar_duplicatas
+        from items.models import ParDuplicado
+
+        resultado = detectar_duplicatas()
+        assert resultado["comparados"] == 3
+        par = ParDuplicado.objects.get()
+        assert (par.item_a, par.item_b) == par_repetido
+        assert par.grupo == par_repetido[0].id
+
+        # incremental: nada novo para comparar
+        assert detectar_duplicatas()["comparados"] == 0
+        assert ParDuplicado.objects.count() == 1
+
+    def test_par_resolvido_nao_volta(self, par_repetido):
+        from items.duplicatas import detectar_duplicatas
+        from items.models import ParDuplicado
+
+        detectar_duplicatas()
+        ParDuplicado.objects.update(resolvido=True)
+        detectar_duplicatas(tudo=True)
+        assert ParDuplicado.objects.filter(resolvido=False).count() == 0
+
+    def test_resolver_par_divide_so_o_proprio_grupo(self, user):
+        from items.duplicatas import reagrupar, resolver_par
+        from items.models import ParDuplicado
+
+        a, b, c, d, e = [
+            Item.objects.create(titulo=f"Item {n}", descricao="", status="achado", local="Pátio",
+                                data=date.today(), usuario=user)
+            for n in range(5)
+        ]
+        meio = ParDuplicado.objects.create(item_a=a, item_b=b, distancia_hash=1, similaridade=99)
+        ParDuplicado.objects.create(item_a=b, item_b=c, distancia_hash=1, similaridade=99)
+        outro = ParDuplicado.objects.create(item_a=d, item_b=e, distancia_hash=1, similaridade=99)
+        assert reagrupar() == 2
+
+        ParDuplicado.objects.filter(pk=outro.pk).update(grupo=0)  # fora do componente: não pode ser tocado
+        resolver_par(ParDuplicado.objects.get(pk=meio.pk))
+        grupos = dict(ParDuplicado.objects.filter(resolvido=False).values_list("item_a_id", "grupo"))
+        assert grupos == {b.id: b.id, d.id: 0}
+
+    def test_painel_ignora_par_id_invalido(self, client, par_repetido):
+        from django.contrib.auth.models import Group
+        from items.duplicatas import detectar_duplicatas
+        from items.models import ParDuplicado
+
+        detectar_duplicatas()
+        bolsista = User.objects.create_user(username="bolsista", password="Str0ngP@ss!")
+        bolsista.groups.add(Group.objects.get_or_create(name="Bolsistas")[0])
+        client.force_login(bolsista)
+
+        resp = client.post("/painel/bolsista/", {"action": "resolver_duplicata", "par_id": "abc"})
+        assert resp.status_code == 302
+        assert client.post("/painel/bolsista/", {"action": "resolver_duplicata", "par_id": "999999"}).status_code == 404
+        par = ParDuplicado.objects.get()
+        client.post("/painel/bolsista/", {"action": "resolver_duplicata", "par_id": str(par.id)})
+        par.refresh_from_db()
+        assert par.resolvido
+
+    def test_api_bolsista_lista_e_resolve(self, par_repetido):
+        from django.contrib.auth.models import Group
+        from rest_framework.test import APIClient
+        from items.duplicatas import detectar_duplicatas
+
+        detectar_duplicatas()
+        bolsista = User.objects.create_user(username="bolsista", password="Str0ngP@ss!")
+        bolsista.groups.add(Group.objects.get_or_create(name="Bolsistas")[0])
+        client = APIClient()
+        client.force_authenticate(bolsista)
+
+        resp = client.get("/api/bolsista/duplicatas/")
+        assert resp.status_code == 200
+        grupo = resp.data["results"][0]
+        assert [i["id"] for i in grupo["itens"]] == [item.id for item in par_repetido]
+
+        resp = client.post(f"/api/bolsista/duplicatas/{grupo['pares'][0]['id']}/resolver/")
+        assert resp.status_code == 200
+        assert client.get("/api/bolsista/duplicatas/").data["results"] == []
+
+    def test_cadastro_avisa_foto_repetida(self, user, item_com_imagem):
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        client.force_authenticate(user)
+        dados = {"titulo": "Mochila", "status": "achado", "data": str(date.today())}
+
+        resp = client.post("/api/items/criar/", {**dados, "imagem": _imagem(), "exigir_confirmacao": "1"})
+        assert resp.status_code == 409
+        assert [i["id"] for i in resp.data["possiveis_duplicatas"]] == [item_com_imagem.pk]
+        assert Item.objects.count() == 1
+
+        resp = client.post("/api/items/criar/", {**dados, "imagem": _imagem(), "confirmar_duplicata": "1"})
+        assert resp.status_code == 201 and len(resp.data["possiveis_duplicatas"]) == 1
+        outra = client.post("/api/items/criar/", {**dados, "imagem": _imagem(cor=(20, 20, 200), tamanho=(64, 48))})
+        assert outra.data["possiveis_duplicatas"] == []
+
+    def test_cadastro_decodifica_a_foto_uma_vez(self, user, item_com_imagem):
+        from rest_framework.test import APIClient
+        from items import descritores
+
+        client = APIClient()
+        client.force_authenticate(user)
+        with patch.object(descritores, "extrair_caracteristicas", wraps=descritores.extrair_caracteristicas) as extrair:
+            resp = client.post("/api/items/criar/", {"titulo": "Mochila", "status": "achado",
+                                                     "data": str(date.today()), "imagem": _imagem()})
+        assert extrair.call_count == 1
+        novo = Item.objects.get(pk=resp.data["data"]["id"])
+        assert novo.impressao and novo.cores.exists()
+
+    def test_cadastro_com_pool_lotado_segue_sem_aviso(self, user, item_com_imagem):
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        client.force_authenticate(user)
+        with patch.object(busca_visual.admissao, "limite", return_value=0):
+            resp = client.post("/api/items/criar/", {"titulo": "Mochila", "status": "achado",
+                                                     "data": str(date.today()), "imagem": _imagem()})
+        assert resp.status_code == 201
+        assert resp.data["possiveis_duplicatas"] == []
+        assert Item.objects.get(pk=resp.data["data"]["id"]).image_hash == item_com_imagem.image_hash
+
+    def test_api_exige_bolsista(self, user):
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        client.force_authenticate(user)
+        assert client.get("/api/bolsista/duplicatas/").status_code == 403
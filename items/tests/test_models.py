@@ -169,3 +169,175 @@ class TestItemModel:
     def test_item_image_hash_vazio_sem_imagem(self, item):
         """Sem imagem, image_hash deve permanecer vazio."""
         assert not item.image_hash
+
+
+# ──────────────────────────────────────────────────────────────
+# Correspondência perdido↔achado
+# ──────────────────────────────────────────────────────────────
+class TestCorrespondencia:
+
+    @pytest.fixture
+    def achado(self, categoria):
+        outro = User.objects.create_user(username="achador", password="Str0ngP@ss!")
+        return Item.objects.create(
+            titulo="Celular Samsung preto", descricao="Galaxy encontrado no banheiro",
+            status="achado", local="Shopping Iguatemi", data=date.today(),
+            usuario=outro, categoria=categoria,
+        )
+
+    def test_correspondencia_nos_dois_sentidos(self, item, achado):
+        assert list(item.correspondencias.values_list("candidato_id", flat=True)) == [achado.pk]
+        assert list(achado.correspondencias.values_list("candidato_id", flat=True)) == [item.pk]
+        corresp = item.correspondencias.get()
+        assert corresp.pontuacao >= 35
+        assert set(corresp.detalhes) >= {"texto", "local", "categoria", "data"}
+
+    def test_ignora_itens_do_mesmo_status_e_sem_relacao(self, item, user):
+        Item.objects.create(titulo="Celular Samsung", status="perdido", data=date.today(), usuario=user)
+        outro = User.objects.create_user(username="outro", password="Str0ngP@ss!")
+        Item.objects.create(titulo="Guarda-chuva azul", status="achado", local="Biblioteca",
+                            data=date(2020, 1, 1), usuario=outro)
+        assert not item.correspondencias.exists()
+
+    def test_devolvido_remove_correspondencias(self, item, achado):
+        achado.status = "devolvido"
+        achado.save(update_fields=["status", "atualizado_em"])
+        assert not achado.correspondencias.exists()
+        assert not item.correspondencias.exists()
+
+    def test_api_detail_inclui_correspondencias(self, item, achado, client):
+        resp = client.get(f"/api/items/{item.pk}/")
+        assert resp.status_code == 200
+        corresp = resp.json()["data"]["correspondencias"]
+        assert [c["id"] for c in corresp] == [achado.pk]
+        assert "pontuacao" in corresp[0]
+
+    def test_resalvar_nao_tira_o_item_da_lista_de_outro_candidato(self, item, achado, settings):
+        settings.CORRESPONDENCIA_TOP = 1
+        outro = User.objects.create_user(username="achador2", password="Str0ngP@ss!")
+        parecido = Item.objects.create(titulo="Celular preto", status="achado", local="Shopping Iguatemi",
+                                       data=date.today(), usuario=outro, categoria=item.categoria)
+        item.save()
+        # o perdido só guarda a melhor, mas continua na lista do achado menos parecido
+        assert list(item.correspondencias.values_list("candidato_id", flat=True)) == [achado.pk]
+        assert list(parecido.correspondencias.values_list("candidato_id", flat=True)) == [item.pk]
+
+    def test_lista_cheia_do_candidato_perde_a_pior(self, item, achado, user, settings):
+        settings.CORRESPONDENCIA_TOP = 1
+        fraco = Item.objects.create(titulo="Celular", status="perdido", data=date.today(), usuario=user)
+        assert list(achado.correspondencias.values_list("candidato_id", flat=True)) == [item.pk]
+        fraco.titulo = "Celular Samsung preto"
+        fraco.descricao = "Galaxy encontrado no banheiro"
+        fraco.local = "Shopping Iguatemi"
+        fraco.categoria = item.categoria
+        fraco.save()
+        assert list(achado.correspondencias.values_list("candidato_id", flat=True)) == [fraco.pk]
+
+    def test_save_sem_mudanca_pontuada_nao_recalcula(self, item, achado):
+        from unittest.mock import patch
+
+        item = Item.objects.get(pk=item.pk)
+        with patch("items.correspondencia.atualizar_correspondencias") as atualizar:
+            item.save(update_fields=["atualizado_em"])
+            item.qrcode_gerado = True  # atributo qualquer, fora da pontuação
+            item.save()
+            assert atualizar.call_count == 0
+            item.status = "achado"
+            item.save(update_fields=["status"])
+            assert atualizar.call_count == 1
+
+    def test_candidato_que_perde_o_item_tem_a_lista_recalculada(self, item, achado, user, settings):
+        settings.CORRESPONDENCIA_TOP = 1
+        segundo = Item.objects.create(titulo="Celular Samsung", descricao="Galaxy preto", status="perdido",
+                                      local="Shopping", data=date.today(), usuario=user, categoria=item.categoria)
+        achado.save()
+        assert list(achado.correspondencias.values_list("candidato_id", flat=True)) == [item.pk]
+        item.titulo = "Guarda-chuva xadrez"
+        item.descricao = "Cabo de madeira"
+        item.local = "Biblioteca"
+        item.categoria = None
+        item.save()
+        assert list(achado.correspondencias.values_list("candidato_id", flat=True)) == [segundo.pk]
+
+    def test_candidatos_mais_proximos_em_data(self, item, settings):
+        from datetime import timedelta
+
+        settings.CORRESPONDENCIA_MAX_CANDIDATOS = 1
+        outro = User.objects.create_user(username="achador2", password="Str0ngP@ss!")
+        criar = lambda data: Item.objects.create(titulo="Celular Samsung", status="achado", data=data,
+                                                 usuario=outro, categoria=item.categoria)
+        proximo = criar(date.today() - timedelta(days=20))
+        criar(date.today() + timedelta(days=10))  # mais novo, porém mais longe
+        item.data = date.today() - timedelta(days=18)
+        item.save()
+        assert list(item.correspondencias.values_list("candidato_id", flat=True)) == [proximo.pk]
+
+
+# ──────────────────────────────────────────────────────────────
+# Itens parecidos (tabela pré-calculada)
+# ──────────────────────────────────────────────────────────────
+class TestItensParecidos:
+
+    @pytest.fixture
+    def itens(self, user):
+        criar = lambda titulo, status="achado": Item.objects.create(
+            titulo=titulo, descricao="", status=status, local="", data=date.today(), usuario=user
+        )
+        return criar("Celular Samsung preto"), criar("Celular Samsung azul", "perdido"), criar("Guarda-chuva xadrez")
+
+    def test_calcula_nos_dois_sentidos(self, itens):
+        from items.similares import atualizar_similares
+
+        celular_a, celular_b, guarda_chuva = itens
+        assert atualizar_similares()["recalculados"] == 3
+        assert list(celular_a.similares.values_list("similar_id", flat=True)) == [celular_b.pk]
+        assert list(celular_b.similares.values_list("similar_id", flat=True)) == [celular_a.pk]
+        assert not guarda_chuva.similares.exists()
+
+    def test_incremental_e_vizinhos_atualizados(self, itens):
+        from items.similares import atualizar_similares
+
+        celular_a, _, guarda_chuva = itens
+        atualizar_similares()
+        assert atualizar_similares()["recalculados"] == 0
+
+        guarda_chuva.titulo = "Celular Samsung preto"
+        guarda_chuva.save()
+        assert atualizar_similares()["recalculados"] == 1
+        assert guarda_chuva.pk in set(celular_a.similares.values_list("similar_id", flat=True))
+
+    def test_vizinhos_do_item_alterado_sao_recalculados(self, user, settings):
+        from items.similares import atualizar_similares
+
+        settings.SIMILARES_TOP = 1
+        criar = lambda titulo: Item.objects.create(titulo=titulo, descricao="", status="achado", local="",
+                                                   data=date.today(), usuario=user)
+        x, y, n = criar("Celular Samsung preto"), criar("Celular Samsung preto azul"), criar("Celular preto")
+        atualizar_similares()
+        assert list(x.similares.values_list("similar_id", flat=True)) == [y.pk]
+        assert list(n.similares.values_list("similar_id", flat=True)) == [x.pk]
+
+        x.save()  # n não está na lista de x, mas x continua na de n
+        assert atualizar_similares()["vizinhos"] == 2
+        assert list(n.similares.values_list("similar_id", flat=True)) == [x.pk]
+
+        x.status = "devolvido"
+        x.save()
+        atualizar_similares()
+        assert list(n.similares.values_list("similar_id", flat=True)) == [y.pk]
+
+    def test_devolvidos_nao_aparecem(self, itens):
+        from items.similares import atualizar_similares
+
+        celular_a, celular_b, _ = itens
+        celular_b.status = "devolvido"
+        celular_b.save()
+        atualizar_similares()
+        assert not celular_a.similares.exists()
+
+    def test_api_detail_inclui_similares(self, itens, client):
+        from items.similares import atualizar_similares
+
+        atualizar_similares()
+        resp = client.get(f"/api/items/{itens[0].pk}/")
+        assert [s["id"] for s in resp.json()["data"]["similares"]] == [itens[1].pk]
@@ -0,0 +1,121 @@
+"""Testes para o enriquecimento de itens com tags das fotos (items/tags.py)."""
+from datetime import date
+from io import BytesIO, StringIO
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import override_settings
+from PIL import Image as PILImage
+
+from items import tags
+from items.models import CacheTags, Item, TagItem
+
+
+def _imagem(cor=(200, 30, 30), nome="foto.jpg"):
+    buffer = BytesIO()
+    PILImage.new("RGB", (64, 64), cor).save(buffer, format="JPEG")
+    return SimpleUploadedFile(nome, buffer.getvalue(), content_type="image/jpeg")
+
+
+class DescritorContador(tags.DescritorLocal):
+    """Descritor local que conta as chamadas e falha nas primeiras `falhas`."""
+    nome = "contador"
+    chamadas = 0
+    falhas = 0
+
+    def descrever(self, img):
+        DescritorContador.chamadas += 1
+        if DescritorContador.chamadas <= DescritorContador.falhas:
+            raise RuntimeError("429 Too Many Requests")
+        return ["Mochila de Nylon"] + super().descrever(img)
+
+
+@pytest.fixture(autouse=True)
+def media_temporaria(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    settings.TAGS_POR_MINUTO = 0
+    settings.TAGS_ESPERA_BASE = 0
+    DescritorContador.chamadas = 0
+    DescritorContador.falhas = 0
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(username="tags", password="Str0ngP@ss!")
+
+
+@pytest.fixture
+def item(user):
+    return Item.objects.create(titulo="Mochila", descricao="", status="achado", local="Bloco A",
+                               data=date.today(), usuario=user, imagem=_imagem())
+
+
+def _rodar(**opcoes):
+    saida = StringIO()
+    call_command("gerar_tags", descritor="items.tests.test_tags.DescritorContador", stdout=saida, **opcoes)
+    return saida.getvalue()
+
+
+class TestUtilitarios:
+
+    def test_normalizar_tags(self):
+        assert tags.normalizar_tags(["Mochila Preta", " nylon ", "preta", "de"]) == ["mochila", "preta", "nylon"]
+
+    def test_descritor_precisa_implementar_a_interface(self):
+        class SoDescreve(tags.DescritorTags):
+            def descrever(self, img):
+                return []
+
+        with pytest.raises(TypeError):
+            SoDescreve()
+        assert tags.DescritorLocal().disponivel()
+
+    def test_limitador_espaca_chamadas(self):
+        esperas = []
+        limitador = tags.LimitadorTaxa(60, dormir=esperas.append)
+        limitador.esperar()
+        limitador.esperar()
+        assert esperas and 0.9 < esperas[0] <= 1.0
+
+    def test_novas_tentativas(self):
+        DescritorContador.falhas = 2
+        assert tags.descrever_com_tentativas(DescritorContador(), PILImage.new("RGB", (8, 8)), tentativas=3,
+                                             espera_base=0)
+        assert DescritorContador.chamadas == 3
+
+    def test_novas_tentativas_respeitam_o_limitador(self):
+        DescritorContador.falhas = 2
+        esperas = []
+        limitador = tags.LimitadorTaxa(60, dormir=esperas.append)
+        tags.descrever_com_tentativas(DescritorContador(), PILImage.new("RGB", (8, 8)), limitador,
+                                      tentativas=3, espera_base=0)
+        assert len(esperas) == 2  # a 2ª e a 3ª chamada esperaram a vez no limitador
+
+
+class TestGerarTags:
+
+    def test_gera_tags_incrementalmente(self, item):
+        assert "1/1 itens (0 do cache)" in _rodar()
+        assert set(item.tags.values_list("tag", flat=True)) == {"mochila", "nylon", "vermelho"}
+        assert "Gerando tags de 0 itens" in _rodar()
+
+    def test_mesma_foto_usa_cache(self, item, user):
+        Item.objects.create(titulo="Outra", descricao="", status="achado", local="", data=date.today(),
+                            usuario=user, imagem=_imagem(nome="copia.jpg"))
+        assert "2/2 itens (1 do cache)" in _rodar()
+        assert DescritorContador.chamadas == 1
+        assert CacheTags.objects.count() == 1
+
+    def test_tags_entram_na_busca_textual(self, item, client):
+        _rodar()
+        resp = client.get("/api/items/", {"q": "nylon"})
+        assert [i["id"] for i in resp.json()["results"]] == [item.pk]
+
+    @override_settings(GEMINI_API_KEY="")
+    def test_gemini_sem_chave_nao_faz_nada(self, item):
+        saida = StringIO()
+        call_command("gerar_tags", descritor="items.tags.DescritorGemini", stdout=saida)
+        assert "indisponível" in saida.getvalue()
+        assert not TagItem.objects.exists()
@@ -0,0 +1,54 @@
+"""Normalização de texto em português para comparação e busca (sem acentos, minúsculo)."""
+import re
+import unicodedata
+import zlib
+
+import numpy as np
+
+STOPWORDS = {
+    "a", "o", "as", "os", "um", "uma", "uns", "umas", "de", "da", "do", "das", "dos",
+    "em", "na", "no", "nas", "nos", "com", "sem", "por", "para", "pra", "e", "ou",
+    "que", "se", "ao", "aos", "meu", "minha", "seu", "sua", "perto", "cor",
+}
+
+_NAO_ALFANUMERICO = re.compile(r"[^a-z0-9]+")
+
+
+def normalizar(texto):
+    """'Guarda-Chuva Térmico' -> 'guarda chuva termico'."""
+    if not texto:
+        return ""
+    sem_acento = unicodedata.normalize("NFKD", str(texto)).encode("ascii", "ignore").decode("ascii")
+    return _NAO_ALFANUMERICO.sub(" ", sem_acento.lower()).strip()
+
+
+def tokens(texto):
+    """Conjunto de palavras significativas (sem stopwords e com 3+ letras)."""
+    return {p for p in normalizar(texto).split() if len(p) > 2 and p not in STOPWORDS}
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def trigramas(texto):
+    """Trigramas de cada palavra normalizada, com bordas: 'gar' -> {'  g', ' ga', 'gar', 'ar '}."""
+    saida = set()
+    for palavra in normalizar(texto).split():
+        marcada = f"  {palavra} "
+        saida.update(marcada[i:i + 3] for i in range(len(marcada) - 2))
+    return saida
+
+
+DIMENSAO_TEXTO = 1024
+
+
+def vetor_texto(texto):
+    """Bag-of-words por hashing, normalizado (crc32 é estável entre processos, ao contrário de hash())."""
+    vetor = np.zeros(DIMENSAO_TEXTO, dtype=np.float32)
+    for palavra in tokens(texto):
+        vetor[zlib.crc32(palavra.encode()) % DIMENSAO_TEXTO] += 1
+    norma = np.linalg.norm(vetor)
+    return vetor / norma if norma > 0 else vetor
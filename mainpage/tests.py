@@ -294,6 +294,12 @@ class TestItemListViews:
         resp = auth_client.get("/itens/")
         assert resp.status_code == 200
 
+    def test_list_item_com_facetas(self, auth_client, item):
+        resp = auth_client.get("/itens/", {"status": "achado"})
+        assert resp.context["facetas"]["status"][0]["valor"] == "perdido"
+        assert resp.context["total_itens"] == 0
+        assert b"?status=perdido" in resp.content
+
     def test_items_perdidos(self, auth_client, item):
         resp = auth_client.get("/itens/perdidos/")
         assert resp.status_code == 200
@@ -13,6 +13,13 @@ from django.views.decorators.http import require_POST
 
 from .forms import ProfileupdateForm
 from .models import Categoria, Item, Profile, Chat, Mensagem
+from items.busca_texto import filtro_texto, ordenar_por_similaridade, ranquear
+from items import cache_busca, sugestoes
+from items.categorizacao import aplicar_sugestao
+from items.descritores import CORES
+from items.duplicatas import verificar_foto
+from items.facetas import contar_facetas, filtro_mes
+from items.tags import filtro_tags
 
 
 # -----------------------------
@@ -29,13 +36,10 @@ def _get_int(request, key, default=1):
         return default
 
 
-def _apply_item_filters(itens_qs, q="", status="todos", categoria="todas"):
+def _apply_item_filters(itens_qs, q="", status="todos", categoria="todas", cor="", mes="", ordenar=True):
     if q:
-        itens_qs = itens_qs.filter(
-            Q(titulo__icontains=q) |
-            Q(descricao__icontains=q) |
-            Q(local__icontains=q)
-        )
+        # índice full-text (items/busca_texto.py) + tags das fotos
+        itens_qs = itens_qs.filter(filtro_texto(q) | filtro_tags(q))
 
     # suporta perdido, achado e devolvido
     if status in ["perdido", "achado", "devolvido"]:
@@ -44,9 +48,41 @@ def _apply_item_filters(itens_qs, q="", status="todos", categoria="todas"):
     if categoria.isdigit():
         itens_qs = itens_qs.filter(categoria_id=int(categoria))
 
+    # cor dominante da foto (tabela CorItem, indexada por cor)
+    if cor in CORES:
+        itens_qs = itens_qs.filter(cores__cor=cor)
+
+    # mês da data do item ("AAAA-MM"), vindo da faceta de mês
+    itens_qs = itens_qs.filter(filtro_mes(mes))
+
+    if q and ordenar:
+        # mais parecidos com a busca primeiro (trigramas em comum)
+        itens_qs = ordenar_por_similaridade(itens_qs, q)
+
     return itens_qs
 
 
+def _filtros_da_busca(status="todos", categoria="todas", cor="", mes=""):
+    """Filtros efetivos da listagem: chave do cache de buscas (items/cache_busca.py)."""
+    return {
+        "status": status if status in ["perdido", "achado", "devolvido"] else "",
+        "categoria": int(categoria) if categoria.isdigit() else None,
+        "cor": cor if cor in CORES else "",
+        "mes": mes,
+    }
+
+
+def _facetas_da_busca(q="", status="todos", categoria="todas", cor="", mes=""):
+    """Contagens por status, categoria e mês da busca atual numa consulta agrupada (items/facetas.py)."""
+    filtros = _filtros_da_busca(status, categoria, cor, mes)
+
+    def calcular():
+        base = _apply_item_filters(Item.objects.all(), q=q, cor=cor, ordenar=False)
+        return contar_facetas(base, status=filtros["status"], categoria_id=filtros["categoria"], mes=mes)
+
+    return cache_busca.lembrar("lista_facetas", q, filtros, calcular)
+
+
 def _paginate_has_more(qs, page, per_page):
     start = (page - 1) * per_page
     end = start + per_page
@@ -55,6 +91,21 @@ def _paginate_has_more(qs, page, per_page):
     return itens_list[:per_page], has_more
 
 
+def _paginar_busca(qs, q, page, per_page, filtros):
+    """
+    Página da listagem, em cache pela busca + filtros (items/cache_busca.py). Com
+    busca, vem ordenada por relevância (items/busca_texto.ranquear).
+    """
+    inicio = (page - 1) * per_page
+
+    def calcular():
+        if not q:
+            return _paginate_has_more(qs, page, per_page)
+        return ranquear(qs, q, inicio, per_page)
+
+    return cache_busca.paginar("lista", q, filtros, inicio, per_page, calcular)
+
+
 def _system_counts():
     total = Item.objects.count()
     perdidos = Item.objects.filter(status="perdido").count()
@@ -183,19 +234,14 @@ def menu_search_suggestions(request):
     if not q:
         return JsonResponse([], safe=False)
 
-    itens = Item.objects.filter(
-        Q(titulo__icontains=q) |
-        Q(descricao__icontains=q) |
-        Q(local__icontains=q)
-    ).order_by("-id")[:8]
-
+    # índice de prefixos em memória (items/sugestoes.py): não consulta o banco a cada tecla
     suggestions = [
         {
-            "titulo": item.titulo,
-            "subtitulo": item.local or (item.categoria.nome if item.categoria else ""),
-            "url": reverse("item_detail", args=[item.slug])
+            "titulo": titulo,
+            "subtitulo": subtitulo,
+            "url": reverse("item_detail", args=[slug])
         }
-        for item in itens
+        for _, titulo, subtitulo, slug in sugestoes.sugerir(q, limite=8)
     ]
     return JsonResponse(suggestions, safe=False)
 
@@ -206,11 +252,12 @@ def menu_view(request):
     q = _get_stripped(request, "q", "")
     status = _get_stripped(request, "status", "todos")
     categoria = _get_stripped(request, "categoria", "todas")
+    cor = _get_stripped(request, "cor", "")
 
     base_qs = Item.objects.all().order_by("-id")
 
     # lista principal (com filtros)
-    itens = _apply_item_filters(base_qs, q=q, status=status, categoria=categoria)
+    itens = _apply_item_filters(base_qs, q=q, status=status, categoria=categoria, cor=cor)
 
     # lista específica para seção devolvidos
     itens_devolvidos = Item.objects.filter(status="devolvido").order_by("-id")[:10]
@@ -219,6 +266,7 @@ def menu_view(request):
 
     return render(request, "mainpage/menu.html", {
         "categorias": categorias,
+        "cores": CORES,
         "itens": itens,
         "itens_devolvidos": itens_devolvidos,
         "total_itens": total_itens,
@@ -228,6 +276,7 @@ def menu_view(request):
         "q": q,
         "status": status,
         "categoria": categoria,
+        "cor": cor,
     })
 
 @login_required(login_url="login")
@@ -314,8 +363,9 @@ def register_item(request):
         return redirect(next_url)
 
     categoria = Categoria.objects.filter(id=categoria_id).first() if categoria_id else None
+    caracteristicas, duplicatas = verificar_foto(imagem)
 
-    Item.objects.create(
+    item = Item(
         titulo=titulo,
         descricao=descricao,
         categoria=categoria,
@@ -325,8 +375,18 @@ def register_item(request):
         local=local,
         imagem=imagem,
     )
+    item._caracteristicas = caracteristicas  # evita decodificar a foto de novo no save
+    item.save()
 
     messages.success(request, "Item cadastrado com sucesso!")
+    if duplicatas:
+        titulos = ", ".join(f"\"{outro.titulo}\" (#{outro.id})" for outro, _ in duplicatas)
+        messages.warning(request, f"Atenção: a foto é muito parecida com a de itens já cadastrados: {titulos}. "
+                                  "Se for o mesmo objeto, considere excluir este cadastro.")
+    if categoria is None:
+        sugerida = aplicar_sugestao(item)
+        if sugerida is not None:
+            messages.info(request, f"Categoria sugerida automaticamente: {sugerida.nome}. Você pode alterá-la editando o item.")
     return redirect(next_url)
 
 
@@ -387,26 +447,34 @@ def list_item(request):
     q = _get_stripped(request, "q", "")
     status = _get_stripped(request, "status", "todos")
     categoria = _get_stripped(request, "categoria", "todas")
+    cor = _get_stripped(request, "cor", "")
+    mes = _get_stripped(request, "mes", "")
     page = _get_int(request, "page", 1)
 
     itens = Item.objects.all().order_by("-id")
-    itens = _apply_item_filters(itens, q=q, status=status, categoria=categoria)
+    itens = _apply_item_filters(itens, q=q, status=status, categoria=categoria, cor=cor, mes=mes)
 
     per_page = 8
-    itens_page, has_more = _paginate_has_more(itens, page=page, per_page=per_page)
+    filtros = _filtros_da_busca(status, categoria, cor, mes)
+    itens_page, has_more = _paginar_busca(itens, q, page=page, per_page=per_page, filtros=filtros)
 
-    total_itens, perdidos, encontrados, devolvidos = _system_counts()
+    # contagens da busca atual (não do sistema todo), numa consulta só
+    facetas = _facetas_da_busca(q=q, status=status, categoria=categoria, cor=cor, mes=mes)
+    por_status = {f["valor"]: f["total"] for f in facetas["status"]}
 
     return render(request, "mainpage/item_list.html", {
         "categorias": categorias,
         "itens": itens_page,
-        "total_itens": total_itens,
-        "perdidos": perdidos,
-        "encontrados": encontrados,
-        "devolvidos": devolvidos,
+        "facetas": facetas,
+        "total_itens": facetas["total"],
+        "perdidos": por_status.get("perdido", 0),
+        "encontrados": por_status.get("achado", 0),
+        "devolvidos": por_status.get("devolvido", 0),
         "q": q,
         "status": status,
         "categoria": categoria,
+        "cor": cor,
+        "mes": mes,
         "page_title": "Todos os itens",
         "has_more": has_more,
         "next_page": page + 1,
@@ -422,11 +490,7 @@ def my_itens(request):
     itens = Item.objects.filter(usuario=request.user).order_by("-id")
 
     if q:
-        itens = itens.filter(
-            Q(titulo__icontains=q) |
-            Q(descricao__icontains=q) |
-            Q(local__icontains=q)
-        )
+        itens = itens.filter(filtro_texto(q))
 
     if status in ["perdido", "achado", "devolvido"]:
         itens = itens.filter(status=status)
@@ -450,13 +514,15 @@ def items_perdidos(request):
 
     q = _get_stripped(request, "q", "")
     categoria = _get_stripped(request, "categoria", "todas")
+    cor = _get_stripped(request, "cor", "")
     page = _get_int(request, "page", 1)
 
     itens = Item.objects.filter(status="perdido").order_by("-id")
-    itens = _apply_item_filters(itens, q=q, status="perdido", categoria=categoria)
+    itens = _apply_item_filters(itens, q=q, status="perdido", categoria=categoria, cor=cor)
 
     per_page = 8
-    itens_page, has_more = _paginate_has_more(itens, page=page, per_page=per_page)
+    filtros = _filtros_da_busca("perdido", categoria, cor)
+    itens_page, has_more = _paginar_busca(itens, q, page=page, per_page=per_page, filtros=filtros)
 
     total_itens, perdidos, encontrados, devolvidos = _system_counts()
 
@@ -470,6 +536,7 @@ def items_perdidos(request):
         "q": q,
         "status": "perdido",
         "categoria": categoria,
+        "cor": cor,
         "page_title": "Itens Perdidos",
         "has_more": has_more,
         "next_page": page + 1,
@@ -482,13 +549,15 @@ def items_encontrados(request):
 
     q = _get_stripped(request, "q", "")
     categoria = _get_stripped(request, "categoria", "todas")
+    cor = _get_stripped(request, "cor", "")
     page = _get_int(request, "page", 1)
 
     itens = Item.objects.filter(status="achado").order_by("-id")
-    itens = _apply_item_filters(itens, q=q, status="achado", categoria=categoria)
+    itens = _apply_item_filters(itens, q=q, status="achado", categoria=categoria, cor=cor)
 
     per_page = 8
-    itens_page, has_more = _paginate_has_more(itens, page=page, per_page=per_page)
+    filtros = _filtros_da_busca("achado", categoria, cor)
+    itens_page, has_more = _paginar_busca(itens, q, page=page, per_page=per_page, filtros=filtros)
 
     total_itens, perdidos, encontrados, devolvidos = _system_counts()
 
@@ -502,6 +571,7 @@ def items_encontrados(request):
         "q": q,
         "status": "achado",
         "categoria": categoria,
+        "cor": cor,
         "page_title": "Itens Encontrados",
         "has_more": has_more,
         "next_page": page + 1,
@@ -514,13 +584,15 @@ def items_devolvidos(request):
 
     q = _get_stripped(request, "q", "")
     categoria = _get_stripped(request, "categoria", "todas")
+    cor = _get_stripped(request, "cor", "")
     page = _get_int(request, "page", 1)
 
     itens = Item.objects.filter(status="devolvido").order_by("-id")
-    itens = _apply_item_filters(itens, q=q, status="devolvido", categoria=categoria)
+    itens = _apply_item_filters(itens, q=q, status="devolvido", categoria=categoria, cor=cor)
 
     per_page = 8
-    itens_page, has_more = _paginate_has_more(itens, page=page, per_page=per_page)
+    filtros = _filtros_da_busca("devolvido", categoria, cor)
+    itens_page, has_more = _paginar_busca(itens, q, page=page, per_page=per_page, filtros=filtros)
 
     total_itens, perdidos, encontrados, devolvidos = _system_counts()
 
@@ -534,6 +606,7 @@ def items_devolvidos(request):
         "q": q,
         "status": "devolvido",
         "categoria": categoria,
+        "cor": cor,
         "page_title": "Itens Devolvidos",
         "has_more": has_more,
         "next_page": page + 1,
@@ -586,12 +659,24 @@ def marcar_perdido(request, id):
 # -----------------------------
 # Detalhe do item
 # -----------------------------
+def _correspondencias(item, limite=5):
+    """Melhores correspondências pré-calculadas (items/correspondencia.py), numa só consulta."""
+    return list(item.correspondencias.select_related("candidato")[:limite])
+
+
+def _similares(item, limite=6):
+    """Itens parecidos pré-calculados (items/similares.py), numa só consulta."""
+    return list(item.similares.select_related("similar")[:limite])
+
+
 def item_detail(request, slug):
     item = get_object_or_404(Item, slug=slug)
     next_url = request.GET.get("next") or ""
     return render(request, "mainpage/item_detail.html", {
         "item": item,
         "next": next_url,
+        "correspondencias": _correspondencias(item),
+        "similares": _similares(item),
     })
 
 
@@ -603,11 +688,7 @@ def recent_items(request):
     itens = Item.objects.all().order_by("-id")
 
     if q:
-        itens = itens.filter(
-            Q(titulo__icontains=q) |
-            Q(descricao__icontains=q) |
-            Q(local__icontains=q)
-        )
+        itens = itens.filter(filtro_texto(q))
 
     per_page = 8
     itens_page, has_more = _paginate_has_more(itens, page=page, per_page=per_page)
@@ -628,6 +709,8 @@ def view_item(request, id):
     return render(request, "mainpage/item_detail.html", {
         "item": item,
         "next": next_url,
+        "correspondencias": _correspondencias(item),
+        "similares": _similares(item),
     })
 
 
@@ -782,28 +865,57 @@ def chat_close(request, chat_id):
     return redirect("chat_detail", chat_id=chat.id)
 
 
+# filtro de status da busca visual: "achado" cobre todos os itens encontrados ainda não devolvidos
+STATUS_BUSCA_VISUAL = {
+    "achado": ["achado", "pendente_confirmacao", "confirmado"],
+    "perdido": ["perdido"],
+}
+
+
 @login_required(login_url="login")
 def busca_visual(request):
+    from accounts.permissoes import check_admin
+    from items.busca_visual import BuscaVisualSaturada, Rastreio
+
     resultados = []
     imagem_base64 = None
-    
+    trace = None
+    # modo trace (só admin): tempos por etapa da busca, como no ?trace=1 da API
+    pediu_trace = request.GET.get("trace") == "1" or request.POST.get("trace") == "1"
+    rastreio = Rastreio() if pediu_trace and check_admin(request.user) else None
+
     if request.method == "POST" and request.FILES.get("imagem_busca"):
         imagem_file = request.FILES["imagem_busca"]
         try:
             # Executa a busca
-            resultados = Item.buscar_por_imagem(imagem_file)
+            cor = request.POST.get("cor", "")
+            status = STATUS_BUSCA_VISUAL.get(request.POST.get("status", ""), [])
+            resultados = Item.buscar_por_imagem(imagem_file, cor=cor if cor in CORES else None,
+                                                filtros={"status": status}, rastreio=rastreio)
+            if rastreio is not None:
+                trace = rastreio.resumo()
             
             # Converte a imagem enviada para base64 para exibir como preview
             import base64
             imagem_file.seek(0)
             encoded = base64.b64encode(imagem_file.read()).decode("utf-8")
             imagem_base64 = f"data:{imagem_file.content_type};base64,{encoded}"
+        except BuscaVisualSaturada as e:
+            messages.error(request, str(e))
+            resposta = render(request, "mainpage/visual_search.html", {"resultados": [], "imagem_preview": None},
+                              status=503)
+            resposta["Retry-After"] = str(e.retry_after)
+            return resposta
         except Exception as e:
             messages.error(request, f"Erro ao processar imagem: {str(e)}")
 
     return render(request, "mainpage/visual_search.html", {
         "resultados": resultados,
         "imagem_preview": imagem_base64,
+        "cores": CORES,
+        "cor": request.POST.get("cor", ""),
+        "status": request.POST.get("status", ""),
+        "trace": trace,
     })
 
 
@@ -864,14 +976,29 @@ def bolsista_dashboard(request):
                 messages.success(request, f"Item '{item.titulo}' devolvido para {nome_recebedor}!")
                 return redirect("bolsista_dashboard")
 
+        elif action == "resolver_duplicata":
+            from items.duplicatas import resolver_par
+            from items.models import ParDuplicado
+            par_id = request.POST.get("par_id", "")
+            if not par_id.isdigit():
+                messages.error(request, "Par de duplicatas inválido.")
+                return redirect("bolsista_dashboard")
+            resolver_par(get_object_or_404(ParDuplicado, id=par_id))
+            messages.success(request, "Par de duplicatas marcado como resolvido.")
+            return redirect("bolsista_dashboard")
+
     pendentes = Item.objects.filter(status__in=["achado", "pendente_confirmacao"]).order_by("-criado_em")
     recent_actions = AcaoLog.objects.filter(bolsista=request.user).select_related("item").order_by("-timestamp")[:50]
     todos_itens = Item.objects.all().order_by("-criado_em")
+
+    from items.duplicatas import grupos_pendentes
+    grupos_duplicados, _ = grupos_pendentes(limite=20)
     
     return render(request, "mainpage/bolsista_dashboard.html", {
         "pendentes": pendentes,
         "recent_actions": recent_actions,
         "todos_itens": todos_itens,
+        "grupos_duplicados": grupos_duplicados,
     })
 
 
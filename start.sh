@@ -8,11 +8,28 @@ python manage.py collectstatic --noinput
 echo "==> Running Django Database Migrations..."
 python manage.py migrate
 
+echo "==> Creating Cache Table..."
+python manage.py createcachetable
+
 echo "==> Seeding Default Categories..."
 python manage.py criar_categorias
 
 echo "==> Generating Image Hashes..."
 python manage.py gerar_hashes
 
+# Duplicatas e itens similares são incrementais e só alimentam o painel dos bolsistas
+# e a página do item: rodam em segundo plano (um depois do outro) para não atrasar o
+# gunicorn, e também podem ser agendados num cron job em vez de rodar aqui.
+echo "==> Detecting Duplicate Photos and Updating Similar Items (background)..."
+(python manage.py detectar_duplicatas && python manage.py atualizar_similares) &
+
+# Tags das fotos: chamadas à API limitadas por TAGS_POR_MINUTO (minutos para 200 itens).
+# Rodam em segundo plano para não atrasar o gunicorn; o comando é incremental, então
+# também pode ser agendado num cron job (ex.: a cada hora) em vez de rodar aqui.
+echo "==> Generating Photo Tags (background)..."
+python manage.py gerar_tags --limite 200 &
+
+# gthread: a busca visual espera o pool de decodificação numa thread, sem travar o
+# processo inteiro; o limite de buscas simultâneas é global (items/busca_visual.py)
 echo "==> Starting Gunicorn Web Server..."
-gunicorn find.wsgi:application
+gunicorn find.wsgi:application --worker-class gthread --threads "${GUNICORN_THREADS:-4}"